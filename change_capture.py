@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+Change Capture: which 1C sales documents changed since the last sync
+═══════════════════════════════════════════════════════════════════════════════
+
+Staff can re-post old documents, which rewrites their _AccumRg53715 rows
+under the same _RecorderRRef in a past _Period, so a _Period watermark is
+not enough. Every write of a document bumps its `_Version`, so we track
+document versions instead:
+
+  1. Document tables come from the register itself: the distinct
+     _RecorderTRef values map to _Document<N> (TRef = N as 4 bytes).
+  2. Per table and day (_Date_Time), one SQL aggregate gives a digest
+     (count, Σ first 32 bits of md5(id:version)) — no rows are shipped.
+  3. Only days whose digest differs from the stored one are fetched as
+     (id, version) pairs and compared per document.
+
+Result: changed/new recorders (re-extract + upsert) and removed recorders
+(delete), whatever their period. State is kept in SYNC_STATE_DIR as
+`sales_documents.json.gz`:
+
+  {tref_hex: {day: {"digest": [count, hash], "versions": {id_hex: version}}}}
+
+Without state everything counts as changed (first run = baseline).
+
+Next to it, `sales_document_lines.json.gz` keeps a digest of each synced
+document's line set ({id_hex: "count:Σcrc32"}, see LineDigests): a
+re-posted document whose lines are the same set again cannot have stale
+rows in Supabase, so only documents that existed before AND whose digest
+changed need a stale-line DELETE.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+import zlib
+import logging
+from collections import defaultdict
+
+from sync_state import load_state, save_state, clear_state
+from onec_metadata import table
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONFIGURATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+STATE_NAME = 'sales_documents'
+PENDING_STATE_NAME = 'sales_documents_pending'   # baseline of a full scan in progress
+LINES_STATE_NAME = 'sales_document_lines'        # id_hex → line-set digest
+SALES_REGISTER = table('sales')
+
+log = logging.getLogger(__name__)
+
+# Order-independent digest of (document id, version) pairs
+VERSION_DIGEST = """
+        COUNT(*) AS doc_count,
+        SUM(('x' || substr(md5(encode(_IDRRef, 'hex') || ':' || _Version::text), 1, 8))::bit(32)::bigint) AS doc_hash"""
+
+
+def load_documents_state():
+    return load_state(STATE_NAME, compressed=True)
+
+
+def save_documents_state(state):
+    save_state(STATE_NAME, state, compressed=True)
+
+
+def load_pending_documents_state():
+    return load_state(PENDING_STATE_NAME, compressed=True)
+
+
+def save_pending_documents_state(state):
+    if state is None:
+        clear_pending_documents_state()
+    else:
+        save_state(PENDING_STATE_NAME, state, compressed=True)
+
+
+def clear_pending_documents_state():
+    clear_state(PENDING_STATE_NAME, compressed=True)
+
+
+def load_lines_state():
+    return load_state(LINES_STATE_NAME, compressed=True)
+
+
+def save_lines_state(state):
+    save_state(LINES_STATE_NAME, state, compressed=True)
+
+
+def known_documents(state):
+    """Every document id in a documents `state`."""
+    return {doc for days in (state or {}).values() for entry in days.values()
+            for doc in entry.get('versions', {})}
+
+
+class LineDigests:
+    """Order-independent digest of each recorder's line keys (recorder_ids)."""
+
+    def __init__(self):
+        self._acc = defaultdict(lambda: [0, 0])
+
+    def add(self, recorder_hex, recorder_id):
+        acc = self._acc[recorder_hex]
+        acc[0] += 1
+        acc[1] = (acc[1] + zlib.crc32(recorder_id.encode())) & 0xFFFFFFFF
+
+    def digests(self):
+        return {h: f"{n}:{s}" for h, (n, s) in self._acc.items()}
+
+
+def document_days(state, doc_ids):
+    """Days (`_Date_Time`) the given documents had in `state`."""
+    doc_ids = set(doc_ids)
+    return {day for days in (state or {}).values() for day, entry in days.items()
+            if doc_ids.intersection(entry.get('versions', {}))}
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# DOCUMENT TABLES
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def recorder_types(cursor):
+    """Distinct _RecorderTRef of the sales register (loose index scan)."""
+    cursor.execute(f"""
+    WITH RECURSIVE t AS (
+        (SELECT _RecorderTRef AS tref FROM {SALES_REGISTER} ORDER BY 1 LIMIT 1)
+        UNION ALL
+        SELECT (SELECT _RecorderTRef FROM {SALES_REGISTER}
+                WHERE _RecorderTRef > t.tref ORDER BY 1 LIMIT 1)
+        FROM t WHERE t.tref IS NOT NULL
+    )
+    SELECT encode(tref, 'hex') FROM t WHERE tref IS NOT NULL
+    """)
+    return [r[0] for r in cursor.fetchall()]
+
+
+def document_tables(cursor):
+    """Map recorder TRef (hex) → existing _Document<N> table name."""
+    tables = {}
+    for tref in recorder_types(cursor):
+        name = f"_document{int(tref, 16)}"
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (name,))
+        if cursor.fetchone()[0]:
+            tables[tref] = name
+        else:
+            log.warning(f"  No document table {name} for recorder type {tref}")
+    return tables
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# DIGESTS / VERSIONS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def day_digests(cursor, table, since):
+    cursor.execute(f"""
+    SELECT _Date_Time::date AS day, {VERSION_DIGEST}
+    FROM {table}
+    WHERE _Date_Time >= %s
+    GROUP BY 1
+    """, (since,))
+    return {r[0].isoformat(): [int(r[1]), int(r[2] or 0)] for r in cursor.fetchall()}
+
+
+def day_versions(cursor, table, days):
+    """{day: {id_hex: version}} for the given days only."""
+    cursor.execute(f"""
+    SELECT _Date_Time::date, encode(_IDRRef, 'hex'), _Version::text
+    FROM {table}
+    WHERE _Date_Time::date = ANY(%s::date[])
+    """, (sorted(days),))
+    result = {day: {} for day in days}
+    for day, doc_id, version in cursor.fetchall():
+        result[day.isoformat()][doc_id] = version
+    return result
+
+
+def detect_changes(cursor, state, since):
+    """
+    Compare current document versions against `state`.
+
+    Returns (changed, removed, new_state): recorder hexes to re-extract,
+    recorder hexes no longer present, and the state to save once both have
+    been applied to Supabase.
+    """
+    state = state or {}
+    new_state = {}
+    changed, removed = set(), set()
+
+    for tref, table in document_tables(cursor).items():
+        old_days = state.get(tref, {})
+        digests = day_digests(cursor, table, since)
+        stale = {d for d in set(digests) | set(old_days)
+                 if old_days.get(d, {}).get('digest') != digests.get(d)}
+
+        fresh = day_versions(cursor, table, [d for d in stale if d in digests]) if stale else {}
+
+        # Compare across all stale days together: a re-dated document
+        # leaves one day and enters another without being removed
+        before, after = {}, {}
+        for d in stale:
+            before.update(old_days.get(d, {}).get('versions', {}))
+            after.update(fresh.get(d, {}))
+        changed.update(k for k, v in after.items() if before.get(k) != v)
+        removed.update(k for k in before if k not in after)
+
+        new_state[tref] = {d: old_days[d] for d in digests if d not in stale}
+        for d in stale:
+            if d in digests:
+                new_state[tref][d] = {'digest': digests[d], 'versions': fresh[d]}
+
+        log.info(f"  {table}: {len(digests)} days, {len(stale)} changed")
+
+    # Recorder types that disappeared from the register entirely
+    for tref in set(state) - set(new_state):
+        for day in state[tref].values():
+            removed.update(day.get('versions', {}))
+
+    return changed, removed, new_state
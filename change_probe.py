@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+Change Probe: skip sync runs when nothing changed in 1C
+═══════════════════════════════════════════════════════════════════════════════
+
+The hourly cron fires whether or not anything happened in 1C. Each job first
+runs ONE aggregate query over its source register:
+
+  (max _Period, row count since the job's start date,
+   row count + checksum of the last PROBE_RECENT_DAYS days)
+
+where the checksum is Σ first 32 bits of md5(recorder:line:values), so a
+re-posted recent document with new amounts changes it. If the fingerprint
+equals the one saved after the last successful run, the job exits early and
+records status "skipped".
+
+Edits that keep an old period's row count (re-posting an old document with
+different amounts) are invisible to the probe, so a job never skips for
+longer than PROBE_MAX_SKIP_HOURS. SYNC_PROBE=0 disables skipping.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+import os
+import logging
+import threading
+from datetime import date, datetime, timedelta
+
+from sync_state import load_state, save_state
+from onec_metadata import table, column
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONFIGURATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+PROBE_ENABLED = os.getenv('SYNC_PROBE', '1') != '0'
+PROBE_RECENT_DAYS = int(os.getenv('PROBE_RECENT_DAYS', 7))
+PROBE_MAX_SKIP_HOURS = float(os.getenv('PROBE_MAX_SKIP_HOURS', 6))
+
+STATE_NAME = 'probes'
+
+# job: (register table, value columns in the checksum)
+REGISTERS = {
+    'sales':     (table('sales'), [column('sales', r) for r in ('quantity', 'revenue')]),
+    'visitors':  (table('visitors'), [column('visitors', r) for r in ('checks', 'buyers', 'visitors')]),
+    'inventory': (table('stock'), [column('stock', r) for r in ('record_kind', 'quantity')]),
+}
+
+log = logging.getLogger(__name__)
+
+# The scheduler runs jobs in parallel; mark_synced() read-modify-writes one file
+_state_lock = threading.Lock()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# PROBE
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def probe(cursor, job, since=None, until=None):
+    """Return the register fingerprint of `job` for periods in [since, until]."""
+    table, columns = REGISTERS[job]
+    row_text = " || ':' || ".join(
+        ["encode(_RecorderRRef, 'hex')", "_LineNo::int::text"] + [f"coalesce({c}::text, '')" for c in columns])
+    until = until or datetime.now() + timedelta(days=1)
+    # Day-aligned, so the window does not slide between hourly runs
+    recent = date.today() - timedelta(days=PROBE_RECENT_DAYS)
+
+    cursor.execute(f"""
+    SELECT
+        max(_Period),
+        count(*),
+        count(*) FILTER (WHERE _Period >= %(recent)s),
+        coalesce(sum(('x' || substr(md5({row_text}), 1, 8))::bit(32)::bigint)
+                 FILTER (WHERE _Period >= %(recent)s), 0)
+    FROM {table}
+    WHERE _Period <= %(until)s {'AND _Period >= %(since)s' if since else ''}
+    """, {'since': since, 'until': until, 'recent': recent})
+    max_period, total, recent_rows, recent_hash = cursor.fetchone()
+    return [max_period.isoformat() if max_period else None, int(total), int(recent_rows), int(recent_hash)]
+
+
+def check(job, cursor, since=None, until=None, **extra):
+    """
+    Probe `job` and decide whether the run can be skipped.
+
+    `extra` is part of the fingerprint (e.g. the inventory snapshot date).
+    Returns (skip, fingerprint); pass the fingerprint to mark_synced() once
+    the run has succeeded.
+    """
+    fingerprint = {'register': probe(cursor, job, since, until), **extra}
+    last = (load_state(STATE_NAME) or {}).get(job)
+
+    if not PROBE_ENABLED or not last or last.get('fingerprint') != fingerprint:
+        return False, fingerprint
+
+    age = datetime.now() - datetime.fromisoformat(last['synced_at'])
+    if age > timedelta(hours=PROBE_MAX_SKIP_HOURS):
+        log.info(f"🔎 [{job}] No changes, but last full run was {age} ago — running anyway")
+        return False, fingerprint
+
+    log.info(f"⏭  [{job}] No changes in 1C since {last['synced_at']} — skipping")
+    return True, fingerprint
+
+
+def last_fingerprint(job):
+    """Fingerprint of the last successful run of `job` (None before the first)."""
+    return ((load_state(STATE_NAME) or {}).get(job) or {}).get('fingerprint')
+
+
+def mark_synced(job, fingerprint):
+    """Remember `fingerprint` as the state Supabase now reflects."""
+    with _state_lock:
+        state = load_state(STATE_NAME) or {}
+        state[job] = {'fingerprint': fingerprint, 'synced_at': datetime.now().isoformat(timespec='seconds')}
+        save_state(STATE_NAME, state)
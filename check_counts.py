@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+Check Counts: distinct receipts per day × store (× product group)
+═══════════════════════════════════════════════════════════════════════════════
+
+A check is a distinct recorder (_RecorderRRef). Counting them with sets or
+`nunique` over 32-char hex strings was the slowest step of aggregating a
+long period, and distinct counts cannot be re-added across product groups,
+so the dashboard rebuilt them from every recorder_id.
+
+Recorders are factorized once per extract into dense integer codes
+(CheckCounter.code); each grain then only keeps a set of small ints:
+
+  (day, store, product_group)   checks of the group in the store that day
+  (day, store, '')              all checks of the store that day
+
+A recorder's lines share one _Period, so daily counts add up across days
+(not across groups: that is what the '' row is for).
+
+Shipped to Supabase `sales_checks_daily` (migration_check_counts.sql)
+through replace_sales_checks(p_days, p_rows), which rewrites whole days
+atomically, so groups or stores that lost all their checks disappear too.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+import requests
+
+from onec_metadata import table, column
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONFIGURATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+STORE_TOTAL = ''           # product_group of the all-groups row
+RPC_DAYS = 31              # days per replace_sales_checks call
+
+log = logging.getLogger(__name__)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# COUNTER
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class CheckCounter:
+    """Distinct recorders per grain, kept as dense integer codes."""
+
+    def __init__(self):
+        self.codes = {}                    # recorder → code (0, 1, 2, ...)
+        self.grains = defaultdict(set)     # (day, store, group) → {codes}
+
+    def code(self, recorder):
+        code = self.codes.get(recorder)
+        if code is None:
+            code = self.codes[recorder] = len(self.codes)
+        return code
+
+    def add(self, day, store, product_group, recorder):
+        code = self.code(recorder)
+        self.grains[(day, store, product_group)].add(code)
+        self.grains[(day, store, STORE_TOTAL)].add(code)
+
+    def add_records(self, records):
+        """Feed SaleRecords (sync_to_supabase.transform_row output)."""
+        for r in records:
+            self.add(r.sale_date.date(), r.store, r.product_group, r.recorder_hex)
+
+    def days(self):
+        return {day for day, _, _ in self.grains}
+
+    def rows(self, days=None):
+        return [{'sale_date': day.isoformat(), 'store': store,
+                 'product_group': group, 'checks': len(codes)}
+                for (day, store, group), codes in self.grains.items()
+                if days is None or day in days]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# EXTRACTION (days not covered by the streamed records)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def count_days(cursor, days, product_group, stores):
+    """
+    Recount `days` (set of dates) straight from the register.
+
+    Only distinct (day, warehouse, product, recorder) tuples leave the
+    database; `stores` maps a warehouse ref to its Placement (see store_tree),
+    `product_group` a product name to its group (extract_product_group).
+    """
+    counter = CheckCounter()
+    if not days:
+        return counter
+    cursor.execute(f"""
+    SELECT s._Period::date, s.{column('sales', 'warehouse')}, n._Description, s.{column('sales', 'recorder')}
+    FROM {table('sales')} s
+    LEFT JOIN {table('nomenclature')} n ON s.{column('sales', 'nomenclature')} = n._IDRRef
+    WHERE s._Period >= %s AND s._Period < %s
+      AND s._Period::date = ANY(%s::date[])
+    GROUP BY 1, 2, 3, 4
+    """, (min(days), max(days) + timedelta(days=1), sorted(days)))
+    for day, warehouse_ref, product, recorder in cursor.fetchall():
+        placement = stores.get(bytes(warehouse_ref))
+        if placement:
+            counter.add(day, placement.store, product_group(product), bytes(recorder))
+    return counter
+
+
+def date_range(start, end):
+    """Days start..end inclusive."""
+    return {start + timedelta(days=i) for i in range((end - start).days + 1)}
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# SUPABASE
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def ship(counter, days, base_url, headers):
+    """Replace `days` in sales_checks_daily with the counter's rows."""
+    days = sorted(days)
+    stats = {'days': len(days), 'rows': 0, 'errors': 0}
+    for i in range(0, len(days), RPC_DAYS):
+        chunk = set(days[i:i + RPC_DAYS])
+        rows = counter.rows(chunk)
+        try:
+            r = requests.post(f"{base_url}/rest/v1/rpc/replace_sales_checks", headers=headers,
+                              json={'p_days': [d.isoformat() for d in sorted(chunk)], 'p_rows': rows},
+                              timeout=60)
+            r.raise_for_status()
+            stats['rows'] += len(rows)
+        except requests.RequestException as e:
+            stats['errors'] += 1
+            log.error(f"  Check counts for {min(chunk)} … {max(chunk)} failed: {e}")
+    log.info(f"🧾 Check counts: {stats['rows']:,} rows for {stats['days']} days"
+             + (f", {stats['errors']} errors" if stats['errors'] else ""))
+    return stats
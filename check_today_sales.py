@@ -4,6 +4,8 @@ import sys
 from decimal import Decimal
 from datetime import datetime
 
+from onec_metadata import column
+
 # Configuration
 DB_CONFIG = {
     'host': os.getenv('POSTGRES_HOST'),
@@ -14,10 +16,10 @@ DB_CONFIG = {
 }
 
 # Verified Columns
-WAREHOUSE_REF = '_Fld53725RRef'
-NOMENCLATURE_REF = '_Fld53716RRef' # From sales_daily_groups.py
-REVENUE_COL = '_Fld53732'
-QUANTITY_COL = '_Fld53731'
+WAREHOUSE_REF = column('sales', 'warehouse')
+NOMENCLATURE_REF = column('sales', 'nomenclature')
+REVENUE_COL = column('sales', 'revenue')
+QUANTITY_COL = column('sales', 'quantity')
 
 def check_sales():
     print(f"Checking sales for TODAY: {datetime.now().strftime('%Y-%m-%d')}")
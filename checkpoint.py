@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+Checkpoints: resume an interrupted full sync where it stopped
+═══════════════════════════════════════════════════════════════════════════════
+
+A tunnel drop in the middle of a full scan used to throw the whole run away.
+The full scan is keyset-paged, so "how far we got" is one key: the keyset
+position of the last page whose rows Supabase has acknowledged.
+
+Pages may be acknowledged out of order (concurrent uploaders), so the saved
+position only advances over the contiguous prefix of fully uploaded pages;
+a page with failed rows stops it. Anything after the checkpoint is simply
+re-read and re-upserted on resume (upserts are idempotent).
+
+Saved in SYNC_STATE_DIR as `checkpoint_<job>.json`:
+
+  {"after": [period, recorder_hex, line], "acked_rows": 120000,
+   "pages": 6, "started_at": "...", "updated_at": "...", ...job extras}
+
+Checkpoints older than CHECKPOINT_MAX_AGE_HOURS are ignored.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+import os
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from sync_state import load_state, save_state, clear_state
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONFIGURATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+CHECKPOINT_MAX_AGE_HOURS = float(os.getenv('CHECKPOINT_MAX_AGE_HOURS', 48))
+
+log = logging.getLogger(__name__)
+
+
+def _name(job):
+    return f"checkpoint_{job}"
+
+
+def load_checkpoint(job):
+    """Return the saved checkpoint of `job`, or None if missing or too old."""
+    checkpoint = load_state(_name(job))
+    if not checkpoint:
+        return None
+    age = datetime.now() - datetime.fromisoformat(checkpoint['started_at'])
+    if age > timedelta(hours=CHECKPOINT_MAX_AGE_HOURS):
+        log.info(f"Ignoring {job} checkpoint from {checkpoint['started_at']} (older than "
+                 f"{CHECKPOINT_MAX_AGE_HOURS:.0f}h)")
+        return None
+    return checkpoint
+
+
+def new_checkpoint(job, **extra):
+    checkpoint = {'after': None, 'acked_rows': 0, 'pages': 0,
+                  'started_at': datetime.now().isoformat(timespec='seconds'), **extra}
+    save_checkpoint(job, checkpoint)
+    return checkpoint
+
+
+def save_checkpoint(job, checkpoint):
+    checkpoint['updated_at'] = datetime.now().isoformat(timespec='seconds')
+    save_state(_name(job), checkpoint)
+
+
+def clear_checkpoint(job):
+    clear_state(_name(job))
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ACK TRACKING
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class CheckpointTracker:
+    """
+    Advance a checkpoint as pages are acknowledged.
+
+    Pages are numbered in extraction order by the caller; ack() may be called
+    from any thread and in any order.
+    """
+
+    def __init__(self, job, checkpoint):
+        self.job = job
+        self.checkpoint = checkpoint
+        self.failed = False
+        self._next = 0
+        self._acked = {}
+        self._lock = threading.Lock()
+
+    def ack(self, seq, key, rows, ok=True):
+        with self._lock:
+            self._acked[seq] = (key, rows, ok)
+            advanced = False
+            while self._next in self._acked and self._acked[self._next][2]:
+                key, rows, _ = self._acked.pop(self._next)
+                self.checkpoint['after'] = list(key)
+                self.checkpoint['acked_rows'] += rows
+                self.checkpoint['pages'] += 1
+                self._next += 1
+                advanced = True
+            if not ok:
+                self.failed = True
+            if advanced:
+                save_checkpoint(self.job, self.checkpoint)
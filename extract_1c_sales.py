@@ -12,8 +12,10 @@ Key findings:
 """
 
 import pymssql
-from decimal import Decimal
-from typing import List, Tuple
+
+from onec_metadata import column
+from onec_source import Source
+from sales_rollup import SalesReport, run_report
 
 # Database connection parameters
 DB_CONFIG = {
@@ -23,10 +25,13 @@ DB_CONFIG = {
     'database': 'Roznica'
 }
 
+# MS SQL dialect and date offset (connection stays DB_CONFIG above)
+SOURCE = Source('mssql')
+
 # Key column mappings (verified)
-WAREHOUSE_REF_COLUMN = '_Fld53725RRef'  # Reference to warehouse/store
-REVENUE_COLUMN = '_Fld53732'            # Sum/Revenue
-QUANTITY_COLUMN = '_Fld53731'           # Quantity
+WAREHOUSE_REF_COLUMN = column('sales', 'warehouse')  # Reference to warehouse/store
+REVENUE_COLUMN = column('sales', 'revenue')          # Sum/Revenue
+QUANTITY_COLUMN = column('sales', 'quantity')        # Quantity
 
 
 def get_connection():
@@ -34,69 +39,25 @@ def get_connection():
     return pymssql.connect(**DB_CONFIG)
 
 
-def get_store_revenue(cursor, store_pattern: str, start_date: str, end_date: str) -> Tuple[str, Decimal, int]:
+def get_store_report(cursor, store_pattern: str, start_date: str, end_date: str) -> SalesReport:
     """
-    Calculate revenue for a store matching the pattern.
+    Store total and per-warehouse breakdown from a single register scan.
     
     Args:
         cursor: Database cursor
         store_pattern: SQL LIKE pattern for store name (e.g., '%Большевик%')
-        start_date: Start date in 1C format (e.g., '4025-12-01')
-        end_date: End date in 1C format (exclusive)
-    
-    Returns:
-        Tuple of (store_name, revenue, record_count)
-    """
-    query = f"""
-    SELECT 
-        SUM(s.{REVENUE_COLUMN}) AS Revenue,
-        COUNT(*) AS Records
-    FROM _AccumRg53715 s
-    INNER JOIN _Reference640 w ON s.{WAREHOUSE_REF_COLUMN} = w._IDRRef
-    WHERE s._Period >= %s AND s._Period < %s
-    AND (w._Description LIKE %s 
-         OR w._ParentIDRRef IN (
-             SELECT _IDRRef FROM _Reference640 
-             WHERE _Description LIKE %s
-         ))
-    """
-    
-    cursor.execute(query, (start_date, end_date, store_pattern, store_pattern))
-    row = cursor.fetchone()
-    
-    return (store_pattern.replace('%', ''), row[0] or Decimal(0), row[1] or 0)
-
-
-def get_store_breakdown(cursor, store_pattern: str, start_date: str, end_date: str) -> List[Tuple]:
-    """
-    Get revenue breakdown by individual warehouse.
+        start_date: Start date, real calendar date (e.g., '2025-12-01');
+                    the +2000 years offset is applied by the MS SQL source
+        end_date: End date (exclusive)
     
     Returns:
-        List of tuples: (warehouse_name, quantity, revenue, records)
+        SalesReport with .totals and .by('warehouse')
     """
-    query = f"""
-    SELECT 
-        w._Description AS Warehouse,
-        SUM(s.{QUANTITY_COLUMN}) AS Quantity,
-        SUM(s.{REVENUE_COLUMN}) AS Revenue,
-        COUNT(*) AS Records
-    FROM _AccumRg53715 s
-    INNER JOIN _Reference640 w ON s.{WAREHOUSE_REF_COLUMN} = w._IDRRef
-    WHERE s._Period >= %s AND s._Period < %s
-    AND (w._Description LIKE %s 
-         OR w._ParentIDRRef IN (
-             SELECT _IDRRef FROM _Reference640 
-             WHERE _Description LIKE %s
-         ))
-    GROUP BY w._Description
-    ORDER BY Revenue DESC
-    """
-    
-    cursor.execute(query, (start_date, end_date, store_pattern, store_pattern))
-    return cursor.fetchall()
+    return run_report(cursor, SOURCE, start_date, end_date,
+                      sets=[(), ('warehouse',)], store_pattern=store_pattern)
 
 
-def generate_report(store_name: str, revenue: Decimal, target: float = None):
+def generate_report(store_name: str, revenue: float, target: float = None):
     """Generate formatted report table."""
     print("\n")
     print("╔" + "═" * 50 + "╗")
@@ -131,8 +92,8 @@ def main():
     
     # Configuration
     STORE_PATTERN = '%Большевик%'
-    START_DATE = '4025-12-01'  # Dec 1, 2025 (+2000 years offset)
-    END_DATE = '4026-01-01'   # Jan 1, 2026
+    START_DATE = '2025-12-01'  # stored as 4025-12-01 (+2000 years offset)
+    END_DATE = '2026-01-01'
     TARGET_REVENUE = 776661.00
     
     print("\n🔌 Connecting to Roznica database...")
@@ -149,23 +110,16 @@ def main():
         print(f"{'Warehouse':<45} {'Quantity':<12} {'Revenue':<15}")
         print("-" * 70)
         
-        breakdown = get_store_breakdown(cursor, '%Большевик%', START_DATE, END_DATE)
-        
-        total_qty = Decimal(0)
-        total_rev = Decimal(0)
+        report = get_store_report(cursor, STORE_PATTERN, START_DATE, END_DATE)
+        breakdown = sorted(report.by('warehouse').items(), key=lambda kv: kv[1].revenue, reverse=True)
         
-        for row in breakdown:
-            wh_name, qty, rev, recs = row
-            qty = qty or Decimal(0)
-            rev = rev or Decimal(0)
-            total_qty += qty
-            total_rev += rev
-            
+        for wh_name, m in breakdown:
             wh_display = wh_name[:44] if wh_name else "N/A"
-            print(f"{wh_display:<45} {float(qty):>10,.2f} {float(rev):>13,.2f}")
+            print(f"{wh_display:<45} {m.quantity:>10,.2f} {m.revenue:>13,.2f}")
         
+        total_qty, total_rev = report.totals.quantity, report.totals.revenue
         print("-" * 70)
-        print(f"{'TOTAL':<45} {float(total_qty):>10,.2f} {float(total_rev):>13,.2f}")
+        print(f"{'TOTAL':<45} {total_qty:>10,.2f} {total_rev:>13,.2f}")
         
         # Generate final report
         generate_report("Большевиков", total_rev, TARGET_REVENUE)
@@ -7,7 +7,10 @@ December 2025 - All stores with product breakdown
 
 import psycopg2
 import os
-from decimal import Decimal
+
+from onec_metadata import column
+from onec_source import get_source
+from sales_rollup import run_report
 
 DB_CONFIG = {
     'host': os.getenv('POSTGRES_HOST'),
@@ -17,135 +20,57 @@ DB_CONFIG = {
     'port': os.getenv('POSTGRES_PORT', 5432)
 }
 
-# Verified column mappings
-WAREHOUSE_REF = '_Fld53725RRef'  # Reference to warehouse (Reference640)
-REVENUE_COL = '_Fld53732'        # Revenue
-QUANTITY_COL = '_Fld53731'       # Quantity
+# Verified column mappings (onec_metadata.REGISTRY)
+NOMENCLATURE_REF = column('sales', 'nomenclature')  # Reference to nomenclature (Reference387)
+
+# Postgres dialect (the connection itself is DB_CONFIG above)
+SOURCE = get_source('postgres')
+PERIOD_START = '2025-12-01'
+PERIOD_END = '2026-01-01'
 
 
 def get_connection():
     return psycopg2.connect(**DB_CONFIG)
 
 
-def find_nomenclature_ref_column(cursor):
-    """Find which column references nomenclature."""
-    print("=" * 70)
-    print("Finding nomenclature reference column...")
-    print("=" * 70)
-    
-    # Get all RRef columns
-    query = """
-    SELECT COLUMN_NAME
-    FROM INFORMATION_SCHEMA.COLUMNS
-    WHERE TABLE_NAME = '_AccumRg53715'
-    AND COLUMN_NAME LIKE '%RRef'
-    ORDER BY COLUMN_NAME
-    """
-    cursor.execute(query)
-    ref_cols = [r[0] for r in cursor.fetchall()]
-    
-    # Get sample nomenclature IDs
-    query = """
-    SELECT _IDRRef FROM _Reference387 LIMIT 5
-    """
-    cursor.execute(query)
-    nomen_ids = [r[0] for r in cursor.fetchall()]
-    
-    if not nomen_ids:
-        print("No nomenclature found!")
-        return None
-    
-    placeholders = ', '.join(['%s'] * len(nomen_ids))
-    
-    for col in ref_cols:
-        if col in [WAREHOUSE_REF, '_RecorderRRef']:
-            continue
-            
-        query = f"""
-        SELECT COUNT(*) 
-        FROM _AccumRg53715
-        WHERE {col} IN ({placeholders})
-        AND _Period >= '2025-12-01' AND _Period < '2026-01-01'
-        """
-        try:
-            cursor.execute(query, nomen_ids)
-            count = cursor.fetchone()[0]
-            if count > 0:
-                print(f"✅ {col}: {count} records match nomenclature")
-                return col
-        except:
-            pass
-    
-    return None
+def load_report(cursor):
+    """All views of the report (totals, per warehouse, per product,
+    warehouse × product) from one scan of the sales register."""
+    return run_report(cursor, SOURCE, PERIOD_START, PERIOD_END,
+                      sets=[(), ('warehouse',), ('product',), ('warehouse', 'product')])
 
 
-def test_nomenclature_join(cursor, nomen_col):
-    """Test join with nomenclature and show sample data."""
+def test_nomenclature_join(report):
     print(f"\n" + "=" * 70)
-    print(f"Testing nomenclature join with column: {nomen_col}")
+    print(f"Testing nomenclature join with column: {NOMENCLATURE_REF}")
     print("=" * 70)
     
-    query = f"""
-    SELECT
-        n._Description AS Product,
-        SUM(s.{QUANTITY_COL}) AS Qty,
-        SUM(s.{REVENUE_COL}) AS Revenue
-    FROM _AccumRg53715 s
-    LEFT JOIN _Reference387 n ON s.{nomen_col} = n._IDRRef
-    WHERE s._Period >= '2025-12-01' AND s._Period < '2026-01-01'
-    GROUP BY n._Description
-    ORDER BY Revenue DESC
-    LIMIT 10
-    """
-    
-    cursor.execute(query)
-    rows = cursor.fetchall()
+    rows = sorted(report.by('product').items(), key=lambda kv: kv[1].revenue, reverse=True)[:10]
     
     print(f"\nTop 10 products by revenue:")
-    for row in rows:
-        prod = row[0][:50] if row[0] else "(NULL)"
-        qty = row[1] or 0
-        rev = row[2] or 0
-        print(f"  {prod:<50} {float(qty):>10,.2f} {float(rev):>12,.2f}")
+    for product, m in rows:
+        prod = product[:50] if product else "(NULL)"
+        print(f"  {prod:<50} {m.quantity:>10,.2f} {m.revenue:>12,.2f}")
 
 
-def generate_full_report(cursor, nomen_col):
+def generate_full_report(report):
     """Generate full report: Store → Nomenclature breakdown."""
     print("\n" + "=" * 70)
     print("FULL SALES REPORT - DECEMBER 2025")
     print("=" * 70)
     
-    # Main query with warehouse and nomenclature joins
-    query = f"""
-    SELECT 
-        w._Description AS Warehouse,
-        n._Description AS Product,
-        SUM(s.{QUANTITY_COL}) AS Quantity,
-        SUM(s.{REVENUE_COL}) AS Revenue
-    FROM _AccumRg53715 s
-    INNER JOIN _Reference640 w ON s.{WAREHOUSE_REF} = w._IDRRef
-    LEFT JOIN _Reference387 n ON s.{nomen_col} = n._IDRRef
-    WHERE s._Period >= '2025-12-01' AND s._Period < '2026-01-01'
-    GROUP BY w._Description, n._Description
-    ORDER BY w._Description, Revenue DESC
-    """
-    
-    cursor.execute(query)
-    rows = cursor.fetchall()
+    rows = sorted(report.by('warehouse', 'product').items(),
+                  key=lambda kv: (kv[0][0] or '', -kv[1].revenue))
     
     # Process and display results
     current_store = None
-    store_qty = Decimal(0)
-    store_rev = Decimal(0)
-    grand_qty = Decimal(0)
-    grand_rev = Decimal(0)
+    store_qty = 0.0
+    store_rev = 0.0
     
     output_lines = []
     
-    for row in rows:
-        warehouse, product, qty, rev = row
-        qty = qty or Decimal(0)
-        rev = rev or Decimal(0)
+    for (warehouse, product), m in rows:
+        qty, rev = m.quantity, m.revenue
         
         if warehouse != current_store:
             # Print previous store total if exists
@@ -155,8 +80,8 @@ def generate_full_report(cursor, nomen_col):
                 output_lines.append("")
             
             current_store = warehouse
-            store_qty = Decimal(0)
-            store_rev = Decimal(0)
+            store_qty = 0.0
+            store_rev = 0.0
             
             output_lines.append(f"{'═' * 80}")
             output_lines.append(f"📍 {warehouse}")
@@ -166,8 +91,6 @@ def generate_full_report(cursor, nomen_col):
         
         store_qty += qty
         store_rev += rev
-        grand_qty += qty
-        grand_rev += rev
         
         prod_name = product[:45] if product else "(Не указано)"
         output_lines.append(f"  {prod_name:<45} {float(qty):>10,.3f} {float(rev):>12,.2f}")
@@ -178,6 +101,7 @@ def generate_full_report(cursor, nomen_col):
         output_lines.append(f"  {'ИТОГО по магазину:':<45} {float(store_qty):>10,.3f} {float(store_rev):>12,.2f}")
     
     # Grand total
+    grand_qty, grand_rev = report.totals.quantity, report.totals.revenue
     output_lines.append("")
     output_lines.append("═" * 80)
     output_lines.append(f"{'ИТОГО ПО ВСЕМ МАГАЗИНАМ:':<50} {float(grand_qty):>10,.3f} {float(grand_rev):>12,.2f}")
@@ -190,7 +114,7 @@ def generate_full_report(cursor, nomen_col):
     return grand_qty, grand_rev
 
 
-def verify_totals(cursor, nomen_col):
+def verify_totals(report):
     """Verify totals match 1C report."""
     print("\n" + "=" * 70)
     print("VERIFICATION: Comparing with 1C data")
@@ -211,35 +135,15 @@ def verify_totals(cursor, nomen_col):
     
     expected_total = (26792.0, 7720207.0)
     
-    # Query actual totals by store
-    query = f"""
-    SELECT 
-        w._Description AS Warehouse,
-        SUM(s.{QUANTITY_COL}) AS Quantity,
-        SUM(s.{REVENUE_COL}) AS Revenue
-    FROM _AccumRg53715 s
-    INNER JOIN _Reference640 w ON s.{WAREHOUSE_REF} = w._IDRRef
-    WHERE s._Period >= '2025-12-01' AND s._Period < '2026-01-01'
-    GROUP BY w._Description
-    ORDER BY w._Description
-    """
-    
-    cursor.execute(query)
-    rows = cursor.fetchall()
+    rows = sorted(report.by('warehouse').items(), key=lambda kv: kv[0] or '')
     
     print(f"\n{'Магазин':<45} {'Кол-во (факт)':>12} {'Кол-во (1C)':>12} {'✓':>3}")
     print("-" * 75)
     
-    actual_total_qty = Decimal(0)
-    actual_total_rev = Decimal(0)
+    actual_total_qty, actual_total_rev = report.totals.quantity, report.totals.revenue
     
-    for row in rows:
-        warehouse, qty, rev = row
-        qty = qty or Decimal(0)
-        rev = rev or Decimal(0)
-        
-        actual_total_qty += qty
-        actual_total_rev += rev
+    for warehouse, m in rows:
+        qty, rev = m.quantity, m.revenue
         
         # Find matching expected
         for store_key, (exp_qty, exp_rev) in expected_stores.items():
@@ -267,46 +171,17 @@ def main():
     cursor = conn.cursor()
     print("✅ Connection established!\n")
     
-    # Step 1: Find nomenclature column
-    nomen_col = find_nomenclature_ref_column(cursor)
-    
-    if not nomen_col:
-        # Try common columns
-        print("\nTrying known columns...")
-        for col in ['_Fld53718RRef', '_Fld53719_RRRef', '_Fld53720RRef', '_Fld53716RRef']:
-            try:
-                query = f"""
-                SELECT
-                    n._Description AS Product,
-                    SUM(s.{QUANTITY_COL}) AS Qty
-                FROM _AccumRg53715 s
-                LEFT JOIN _Reference387 n ON s.{col} = n._IDRRef
-                WHERE s._Period >= '2025-12-01' AND s._Period < '2026-01-01'
-                AND n._Description IS NOT NULL
-                GROUP BY n._Description
-                LIMIT 5
-                """
-                cursor.execute(query)
-                rows = cursor.fetchall()
-                if rows and rows[0][0]:
-                    print(f"✅ Found nomenclature in {col}")
-                    nomen_col = col
-                    break
-            except Exception as e:
-                continue
-    
-    if not nomen_col:
-        print("❌ Could not find nomenclature reference column!")
-        return
+    # Step 1: One rollup scan of the register for every view below
+    report = load_report(cursor)
     
     # Step 2: Test nomenclature join
-    test_nomenclature_join(cursor, nomen_col)
+    test_nomenclature_join(report)
     
     # Step 3: Generate full report
-    grand_qty, grand_rev = generate_full_report(cursor, nomen_col)
+    grand_qty, grand_rev = generate_full_report(report)
     
     # Step 4: Verify totals
-    verify_totals(cursor, nomen_col)
+    verify_totals(report)
     
     cursor.close()
     conn.close()
@@ -0,0 +1,34 @@
+-- Distinct check counts per day × store × product group (check_counts.py).
+--
+-- product_group = '' is the all-groups row of the store: distinct counts
+-- cannot be summed across groups. Days add up (a check has one date).
+
+create table if not exists sales_checks_daily (
+  sale_date date not null,
+  store text not null,
+  product_group text not null,
+  checks integer not null,
+  updated_at timestamp with time zone default timezone('utc'::text, now()) not null,
+  primary key (sale_date, store, product_group)
+);
+
+create index if not exists sales_checks_daily_store_idx on sales_checks_daily (store, sale_date);
+
+-- Rewrite whole days: groups/stores that lost all checks must disappear too
+create or replace function replace_sales_checks(p_days date[], p_rows jsonb)
+returns integer
+language plpgsql as $$
+declare
+  inserted integer;
+begin
+  delete from sales_checks_daily where sale_date = any(p_days);
+
+  insert into sales_checks_daily (sale_date, store, product_group, checks)
+  select (r->>'sale_date')::date, r->>'store', r->>'product_group', (r->>'checks')::integer
+  from jsonb_array_elements(p_rows) as r
+  where (r->>'sale_date')::date = any(p_days);
+
+  get diagnostics inserted = row_count;
+  return inserted;
+end;
+$$;
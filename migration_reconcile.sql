@@ -0,0 +1,44 @@
+-- Aggregate fingerprints of sales_analytics for reconcile.py.
+--
+-- Each fingerprint is (row_count, revenue, quantity, key_hash) where key_hash
+-- is an order-independent hash of the row keys: the sum of the first 32 bits
+-- of md5(recorder_id). reconcile.py computes the exact same expression on the
+-- 1C side over encode(_RecorderRRef, 'hex') || '_' || _LineNo, so equal
+-- fingerprints mean equal key sets and totals without shipping any rows.
+
+create index if not exists sales_analytics_sale_date_store_idx
+  on sales_analytics (sale_date, store);
+
+-- Level 1: store × day
+create or replace function sales_fingerprint_store_day(p_start date, p_end date)
+returns table (store text, day date, row_count bigint, revenue numeric, quantity numeric, key_hash numeric)
+language sql stable as $$
+  select
+    store,
+    sale_date::date as day,
+    count(*) as row_count,
+    round(sum(revenue), 2) as revenue,
+    round(sum(quantity), 3) as quantity,
+    sum(('x' || substr(md5(recorder_id), 1, 8))::bit(32)::bigint) as key_hash
+  from sales_analytics
+  where sale_date >= p_start and sale_date < p_end
+  group by store, sale_date::date
+$$;
+
+-- Level 2: product within one store-day
+create or replace function sales_fingerprint_product(p_store text, p_day date)
+returns table (product text, row_count bigint, revenue numeric, quantity numeric, key_hash numeric)
+language sql stable as $$
+  select
+    coalesce(product, '') as product,
+    count(*) as row_count,
+    round(sum(revenue), 2) as revenue,
+    round(sum(quantity), 3) as quantity,
+    sum(('x' || substr(md5(recorder_id), 1, 8))::bit(32)::bigint) as key_hash
+  from sales_analytics
+  where store = p_store and sale_date >= p_day and sale_date < p_day + 1
+  group by coalesce(product, '')
+$$;
+
+grant execute on function sales_fingerprint_store_day(date, date) to anon;
+grant execute on function sales_fingerprint_product(text, date) to anon;
@@ -0,0 +1,63 @@
+-- Slim sales_analytics wire format: derived columns are computed by Postgres.
+--
+-- sync_to_supabase now sends only source facts:
+--   sale_date, warehouse, store, product, product_group, unit,
+--   quantity, revenue, recorder_id
+--
+-- Everything below used to be computed per row in Python (transform_row) and
+-- shipped over the wire. They are re-created as STORED generated columns so
+-- the dashboard's SalesRecord fields (select '*') stay exactly the same.
+--
+-- Assumes sale_date is `timestamp without time zone` (generated columns need
+-- immutable expressions; extract() on timestamptz is not).
+
+begin;
+
+alter table sales_analytics
+  drop column if exists day_of_month,
+  drop column if exists week_number,
+  drop column if exists month,
+  drop column if exists quarter,
+  drop column if exists year,
+  drop column if exists weekday,
+  drop column if exists unit_type,
+  drop column if exists quantity_pcs,
+  drop column if exists quantity_kg;
+
+alter table sales_analytics
+  add column day_of_month smallint generated always as (extract(day from sale_date)::smallint) stored,
+  add column week_number smallint generated always as (extract(week from sale_date)::smallint) stored,
+  add column month smallint generated always as (extract(month from sale_date)::smallint) stored,
+  add column quarter smallint generated always as (extract(quarter from sale_date)::smallint) stored,
+  add column year smallint generated always as (extract(year from sale_date)::smallint) stored,
+
+  -- Same values as Python's strftime('%A') (C locale); to_char() is not immutable
+  add column weekday text generated always as (
+    case extract(isodow from sale_date)::int
+      when 1 then 'Monday'
+      when 2 then 'Tuesday'
+      when 3 then 'Wednesday'
+      when 4 then 'Thursday'
+      when 5 then 'Friday'
+      when 6 then 'Saturday'
+      else 'Sunday'
+    end
+  ) stored,
+
+  -- Mirrors the old get_unit_type(): 'kg' if the unit name mentions кг/kg.
+  -- translate() folds Cyrillic case independently of the database locale.
+  add column unit_type text generated always as (
+    case when position('кг' in lower(translate(coalesce(unit, ''), 'КГ', 'кг'))) > 0
+           or position('kg' in lower(coalesce(unit, ''))) > 0
+         then 'kg' else 'pcs' end
+  ) stored,
+
+  -- Quantity is always pieces in 1C; quantity_kg counts pieces of by-weight items
+  add column quantity_pcs numeric generated always as (quantity) stored,
+  add column quantity_kg numeric generated always as (
+    case when position('кг' in lower(translate(coalesce(unit, ''), 'КГ', 'кг'))) > 0
+           or position('kg' in lower(coalesce(unit, ''))) > 0
+         then quantity else 0 end
+  ) stored;
+
+commit;
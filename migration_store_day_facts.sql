@@ -0,0 +1,81 @@
+-- Store × day facts: revenue and receipts from the sales sync, counter
+-- checks/buyers/visitors (_AccumRg53554) from the visitors sync
+-- (store_day_facts.py). The dashboard's Трафик / Конверсия columns read
+-- store_day_totals() instead of joining visitor rows to sales in the browser.
+--
+-- Each sync owns its columns: the visitors sync upserts checks, buyers and
+-- visitors; refresh_store_day_sales() rewrites revenue and sales_checks of
+-- whole days. Store names follow store_tree.py on both sides.
+
+create table if not exists store_day_facts (
+  sale_date date not null,
+  store text not null,
+  revenue numeric not null default 0,
+  sales_checks integer not null default 0,   -- distinct receipts (sales_checks_daily)
+  checks numeric not null default 0,         -- КоличествоЧеков (counters)
+  buyers numeric not null default 0,         -- КоличествоПокупателей
+  visitors numeric not null default 0,       -- КоличествоПосетителей
+  updated_at timestamp with time zone default timezone('utc'::text, now()) not null,
+  primary key (sale_date, store)
+);
+
+create index if not exists store_day_facts_store_idx on store_day_facts (store, sale_date);
+
+-- Sales side of whole days, from sales_analytics and the store-total rows of
+-- sales_checks_daily (run after replace_sales_checks for the same days)
+create or replace function refresh_store_day_sales(p_days date[])
+returns integer
+language plpgsql as $$
+declare
+  refreshed integer;
+begin
+  update store_day_facts set revenue = 0, sales_checks = 0, updated_at = now()
+  where sale_date = any(p_days);
+
+  insert into store_day_facts as f (sale_date, store, revenue, sales_checks)
+  select coalesce(s.sale_date, c.sale_date), coalesce(s.store, c.store),
+         coalesce(s.revenue, 0), coalesce(c.checks, 0)
+  from (
+    select sale_date::date as sale_date, store, sum(revenue) as revenue
+    from sales_analytics
+    where sale_date >= (select min(d) from unnest(p_days) d)
+      and sale_date < (select max(d) from unnest(p_days) d) + 1
+      and sale_date::date = any(p_days)
+    group by 1, 2
+  ) s
+  full join (
+    select sale_date, store, checks
+    from sales_checks_daily
+    where sale_date = any(p_days) and product_group = ''
+  ) c on c.sale_date = s.sale_date and c.store = s.store
+  on conflict (sale_date, store) do update
+    set revenue = excluded.revenue, sales_checks = excluded.sales_checks, updated_at = now();
+
+  get diagnostics refreshed = row_count;
+
+  delete from store_day_facts
+  where sale_date = any(p_days)
+    and revenue = 0 and sales_checks = 0 and checks = 0 and buyers = 0 and visitors = 0;
+
+  return refreshed;
+end;
+$$;
+
+-- Per-store totals of a period; conversion = receipts / visitors, %
+create or replace function store_day_totals(p_start date, p_end date, p_stores text[] default null)
+returns table (store text, revenue numeric, sales_checks bigint, checks numeric,
+               buyers numeric, visitors numeric, conversion numeric)
+language sql stable as $$
+  select store, sum(revenue), sum(sales_checks), sum(checks), sum(buyers), sum(visitors),
+         case when sum(visitors) > 0 then round(sum(sales_checks) * 100.0 / sum(visitors), 2) end
+  from store_day_facts
+  where sale_date between p_start and p_end
+    and (p_stores is null or store = any(p_stores))
+  group by store
+  order by store;
+$$;
+
+grant select on store_day_facts to anon;
+grant insert, update on store_day_facts to anon;
+grant execute on function refresh_store_day_sales(date[]) to anon;
+grant execute on function store_day_totals(date, date, text[]) to anon;
@@ -0,0 +1,46 @@
+-- Key-set digests of sales_analytics for tombstones.py.
+--
+-- A digest is (row_count, key_hash) with key_hash = sum of the first 32 bits
+-- of md5(recorder_id), the same expression as migration_reconcile.sql.
+-- Buckets split a day by the first byte of md5(recorder_id) so only a small
+-- slice of keys has to be listed when a day differs.
+
+-- Level 1: day
+create or replace function sales_key_digest_day(p_start date, p_end date)
+returns table (day date, row_count bigint, key_hash numeric)
+language sql stable as $$
+  select
+    sale_date::date as day,
+    count(*) as row_count,
+    sum(('x' || substr(md5(recorder_id), 1, 8))::bit(32)::bigint) as key_hash
+  from sales_analytics
+  where sale_date >= p_start and sale_date < p_end
+  group by sale_date::date
+$$;
+
+-- Level 2: bucket within one day
+create or replace function sales_key_digest_bucket(p_day date)
+returns table (bucket text, row_count bigint, key_hash numeric)
+language sql stable as $$
+  select
+    substr(md5(recorder_id), 1, 2) as bucket,
+    count(*) as row_count,
+    sum(('x' || substr(md5(recorder_id), 1, 8))::bit(32)::bigint) as key_hash
+  from sales_analytics
+  where sale_date >= p_day and sale_date < p_day + 1
+  group by 1
+$$;
+
+-- Level 3: keys of the given buckets
+create or replace function sales_keys_in_buckets(p_day date, p_buckets text[])
+returns table (recorder_id text)
+language sql stable as $$
+  select recorder_id
+  from sales_analytics
+  where sale_date >= p_day and sale_date < p_day + 1
+    and substr(md5(recorder_id), 1, 2) = any(p_buckets)
+$$;
+
+grant execute on function sales_key_digest_day(date, date) to anon;
+grant execute on function sales_key_digest_bucket(date) to anon;
+grant execute on function sales_keys_in_buckets(date, text[]) to anon;
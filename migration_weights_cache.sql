@@ -0,0 +1,22 @@
+-- Version column for product_weights caches (weights_cache.py, dashboard).
+--
+-- Clients revalidate with `select updated_at order by updated_at desc limit 1`
+-- plus an exact count, so updated_at must move on every edit, not only on insert.
+
+alter table product_weights
+  add column if not exists updated_at timestamp with time zone default timezone('utc'::text, now()) not null;
+
+create or replace function product_weights_touch()
+returns trigger language plpgsql as $$
+begin
+  new.updated_at := timezone('utc'::text, now());
+  return new;
+end;
+$$;
+
+drop trigger if exists product_weights_touch on product_weights;
+create trigger product_weights_touch
+  before update on product_weights
+  for each row execute function product_weights_touch();
+
+create index if not exists product_weights_updated_at_idx on product_weights (updated_at desc);
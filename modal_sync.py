@@ -3,19 +3,51 @@ import sys
 import logging
 import subprocess
 import os
+import socket
 import time
 
-# Define the image with dependencies
+# ═══════════════════════════════════════════════════════════════════════════════
+# IMAGE
+# ═══════════════════════════════════════════════════════════════════════════════
+# Layers are ordered from least to most frequently changed, so a code change
+# only rebuilds the last (cheap) layer:
+#   1. system packages + Tailscale + GOST
+#   2. pinned Python wheels (requirements-sync.txt)
+#   3. sync modules
+#
+# SyncRunner runs with memory snapshotting: everything imported at global
+# scope below (psycopg2, requests, orjson and all job modules) is captured in
+# the snapshot once, and later runs restore it instead of re-importing.
+# Module-level timers are frozen in the snapshot, so IMPORT_SECONDS is what
+# the snapshot paid (recorded as snapshot_import_s); the cost of a restored
+# start is measured from SyncRunner.restored() (@modal.enter(snap=False))
+# and from the scheduled trigger's dispatch time.
+
+SYNC_MODULES = [
+    "sync", "sync_to_supabase", "custom_inventory_sync", "sync_visitors",
+    "supabase_upload", "serialization", "run_metrics", "sync_state",
+    "change_capture", "change_probe", "reconcile", "tombstones",
+    "run_lock", "pipeline", "checkpoint", "weights_cache", "onec_metadata",
+    "onec_source", "check_counts", "store_tree", "store_day_facts", "sync_daemon",
+    "scheduler", "sync_plan",
+]
+
+STATE_DIR = "/state"
+
+# Anchored on this file: `modal deploy` may run from any working directory
+REQUIREMENTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "requirements-sync.txt")
+
+# One scheduler tick every 10 minutes; scheduler.JOBS decides what is due
+# (per-job cadence, business hours, nightly reconcile and tombstone passes)
+SCHEDULE_TICK = "*/10 * * * *"
+
 image = (
-    modal.Image.debian_slim()
+    modal.Image.debian_slim(python_version="3.11")
     # Install dependencies:
     # - curl, gnupg: for Tailscale install
     # - gzip: for gost install
     .apt_install("curl", "gnupg", "gzip")
     
-    # Python dependencies
-    .pip_install("psycopg2-binary", "requests", "pandas", "numpy")
-    
     # Install Tailscale
     .run_commands(
         "mkdir -p --mode=0755 /usr/share/keyrings",
@@ -29,30 +61,128 @@ image = (
         "curl -sL https://github.com/ginuerzh/gost/releases/download/v2.11.1/gost-linux-amd64-2.11.1.gz | gunzip > /usr/local/bin/gost",
         "chmod +x /usr/local/bin/gost"
     )
+    
+    # Python dependencies (pinned wheels, binary only)
+    .pip_install_from_requirements(REQUIREMENTS, extra_options="--only-binary=:all:")
+    
+    # Job configuration (read by the modules at import time)
+    .env({
+        'POSTGRES_HOST': '127.0.0.1',     # Local tunnel end
+        'POSTGRES_PORT': '5432',          # Local tunnel end
+        'POSTGRES_USER': 'ecostock',
+        'POSTGRES_PASSWORD': 'Kd*2m5Th',
+        'POSTGRES_DB': 'onec_ecostock_retail',
+        'SYNC_STATE_DIR': STATE_DIR,
+    })
 
     # Mount the verified sync scripts
-    .add_local_file("/Users/tunasruso/Documents/Antigravity/StasSales1CBackEnd/custom_inventory_sync.py", "/root/custom_inventory_sync.py")
-    .add_local_file("/Users/tunasruso/Documents/Antigravity/StasSales1CBackEnd/sync_to_supabase.py", "/root/sync_to_supabase.py")
-    .add_local_file("/Users/tunasruso/Documents/Antigravity/StasSales1CBackEnd/sync_visitors.py", "/root/sync_visitors.py")
+    .add_local_python_source(*SYNC_MODULES)
 )
 
+# Persistent state (run metrics, later checkpoints/caches) survives containers
+state_volume = modal.Volume.from_name("bonanza-sync-state", create_if_missing=True)
+
+# Imported at global scope so they are part of the memory snapshot
+_import_started = time.perf_counter()
+with image.imports():
+    import psycopg2
+    import requests
+    import sync
+    import sync_to_supabase
+    import custom_inventory_sync
+    import sync_visitors
+    import tombstones
+    import sync_daemon
+    import scheduler
+    import run_metrics
+    import run_lock
+IMPORT_SECONDS = round(time.perf_counter() - _import_started, 3)
+
 # App definition with Secret
 app = modal.App(
     "bonanza-sales-sync", 
     image=image, 
+    # tailscale-auth also carries ANALYTICS_DB_URL (Supabase Postgres DSN) for run_lock
     secrets=[modal.Secret.from_name("tailscale-auth")]
 )
 
-# Schedule: Every hour from 09:00 MSK to 21:00 MSK
-# MSK is UTC+3.
-# 09:00 MSK = 06:00 UTC
-# 21:00 MSK = 18:00 UTC
-# Cron range: 6-18
-@app.function(timeout=3600, schedule=modal.Cron("0 6-18 * * *"))
+
+def wait_until(check, timeout, interval=0.1):
+    """Poll `check()` until it returns truthy or `timeout` seconds pass."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if check():
+            return True
+        time.sleep(interval)
+    return False
+
+
+def port_open(host, port):
+    try:
+        with socket.create_connection((host, port), timeout=0.5):
+            return True
+    except OSError:
+        return False
+
+
+# Schedule: a scheduler tick every 10 minutes, around the clock. Jobs run
+# only when due (sales/visitors/inventory 09:00–21:00 MSK = 06–18 UTC, at
+# their own cadence); a tick with nothing due exits here, before the
+# snapshotted runner and the tunnel are started.
+@app.function(
+    timeout=60,
+    schedule=modal.Cron(SCHEDULE_TICK),
+    volumes={STATE_DIR: state_volume},
+)
 def run_sync_job():
     logging.basicConfig(level=logging.INFO)
     log = logging.getLogger("modal_runner")
-    
+
+    due = scheduler.due_jobs()
+    if not due:
+        log.info("💤 No job due on this tick")
+        return
+    log.info(f"🗓  Due: {', '.join(due)} — starting the runner")
+    SyncRunner().tick.spawn(dispatched_at=time.time())
+
+
+@app.cls(
+    timeout=3600,
+    enable_memory_snapshot=True,
+    volumes={STATE_DIR: state_volume},
+)
+class SyncRunner:
+    @modal.enter(snap=False)
+    def restored(self):
+        """Runs on every container start after the snapshot restore."""
+        self.restored_at = time.perf_counter()
+
+    @modal.method()
+    def tick(self, dispatched_at=None):
+        started = time.perf_counter()
+        timings = {
+            'snapshot_import_s': IMPORT_SECONDS,           # paid once, when the snapshot was taken
+            'restore_to_handler_s': round(started - self.restored_at, 3),
+        }
+        if dispatched_at:
+            # Trigger → handler: container start, snapshot restore and queueing
+            timings['dispatch_to_handler_s'] = round(time.time() - dispatched_at, 3)
+
+        logging.basicConfig(level=logging.INFO)
+        log = logging.getLogger("modal_runner")
+
+        # One run at a time: a slow previous run means this tick is skipped
+        # (bounded wait, contention recorded by run_lock) before Tailscale is up
+        with run_lock.hold('sync') as acquired:
+            if not acquired:
+                log.warning("⛔ Previous sync still running — skipping this tick")
+                state_volume.commit()
+                return
+            run_all_jobs(started, timings, log)
+
+
+def start_tunnels(timings, log):
+    """Bring up Tailscale and the GOST tunnel to 1C; returns the GOST process."""
     # ═══════════════════════════════════════════════════════════════════════════════
     # 1. START TAILSCALE
     # ═══════════════════════════════════════════════════════════════════════════════
@@ -60,12 +190,14 @@ def run_sync_job():
     auth_key = os.environ["TAILSCALE_AUTHKEY"]
     
     # Start tailscaled in background (userspace networking mode, with SOCKS5 on port 1055)
+    t0 = time.perf_counter()
     subprocess.Popen(
         ["tailscaled", "--tun=userspace-networking", "--socks5-server=localhost:1055"], 
         stdout=subprocess.DEVNULL, 
         stderr=subprocess.DEVNULL
     )
-    time.sleep(3) # Allow daemon to start
+    # Wait for the daemon socket instead of a fixed sleep
+    wait_until(lambda: os.path.exists("/var/run/tailscale/tailscaled.sock"), timeout=10)
     
     # Authenticate and bring interface up
     try:
@@ -76,7 +208,8 @@ def run_sync_job():
             "--ssh" 
         ]
         subprocess.run(cmd, check=True)
-        log.info("✅ Tailscale connected!")
+        timings['tailscale_s'] = round(time.perf_counter() - t0, 3)
+        log.info(f"✅ Tailscale connected! ({timings['tailscale_s']}s)")
     except subprocess.CalledProcessError as e:
         log.error(f"❌ Tailscale failed to start: {e}")
         raise e
@@ -94,57 +227,74 @@ def run_sync_job():
     ]
     
     # Let gost log to stdout
+    t0 = time.perf_counter()
     gost_proc = subprocess.Popen(gost_cmd, stdout=sys.stdout, stderr=sys.stderr)
-    time.sleep(3) # Stabilize
     
-    if gost_proc.poll() is not None:
+    # Ready as soon as the local end accepts connections (was a fixed 3s sleep)
+    if not wait_until(lambda: gost_proc.poll() is not None or port_open("127.0.0.1", 5432), timeout=10) \
+            or gost_proc.poll() is not None:
          log.error("❌ GOST process failed immediately")
          raise Exception("GOST failed")
-         
-    log.info("✅ GOST Tunnel running")
+    
+    timings['gost_s'] = round(time.perf_counter() - t0, 3)
+    log.info(f"✅ GOST Tunnel running ({timings['gost_s']}s)")
+    return gost_proc
+
+
+def run_all_jobs(started, timings, log):
+    gost_proc = start_tunnels(timings, log)
     
     # ═══════════════════════════════════════════════════════════════════════════════
     # 3. EXECUTE SYNC LOGIC
     # ═══════════════════════════════════════════════════════════════════════════════
     log.info("🚀 Launching sync logic...")
-    
-    # Add root to path
-    sys.path.append("/root")
-    
-    # INJECT CREDENTIALS
-    os.environ['POSTGRES_HOST'] = '127.0.0.1' # Local tunnel end
-    os.environ['POSTGRES_PORT'] = '5432'      # Local tunnel end
-    os.environ['POSTGRES_USER'] = 'ecostock'
-    os.environ['POSTGRES_PASSWORD'] = 'Kd*2m5Th'
-    os.environ['POSTGRES_DB'] = 'onec_ecostock_retail'
+    timings['ready_s'] = round(time.perf_counter() - started, 3)
     
     try:
-        import custom_inventory_sync
-        import sync_to_supabase
-        import sync_visitors
-        
-        # --- JOB 1: INVENTORY SYNC ---
-        log.info("📦 [1/3] Syncing INVENTORY...")
-        custom_inventory_sync.upload_to_supabase(custom_inventory_sync.extract_inventory())
-        log.info("✅ Inventory sync completed.")
-
-        # --- JOB 2: SALES SYNC ---
-        log.info("💰 [2/3] Syncing SALES...")
-        sync_to_supabase.main()
-        log.info("✅ Sales sync completed.")
-
-        # --- JOB 3: VISITORS (TRAFFIC) SYNC ---
-        log.info("🚶 [3/3] Syncing VISITORS...")
-        sync_visitors.main()
-        log.info("✅ Visitors sync completed.")
+        # Job modules are already imported (memory snapshot); the
+        # scheduler runs the due ones (sync.run per job) and skips the
+        # ones whose 1C register did not move
+        t0 = time.perf_counter()
+        timings['jobs'] = scheduler.tick()
+        timings['jobs_s'] = round(time.perf_counter() - t0, 3)
         
     except Exception as e:
         log.error(f"❌ Sync failed: {e}")
         raise e
     finally:
         gost_proc.terminate()
+        timings['total_s'] = round(time.perf_counter() - started, 3)
+        log.info(f"⏱  Handler to ready: {timings['ready_s']}s "
+                 f"(dispatch → handler {timings.get('dispatch_to_handler_s')}s, "
+                 f"restore → handler {timings['restore_to_handler_s']}s, "
+                 f"tailscale {timings.get('tailscale_s')}s, gost {timings.get('gost_s')}s)")
+        run_metrics.record_run('modal', **timings)
+        state_volume.commit()
+
+# Near-real-time mode (sync_daemon): polls 1C and runs sales/visitors
+# micro-batches for up to `max_runtime` seconds, committing state after
+# every job run. Start it with `modal run modal_sync.py::run_sync_daemon`.
+@app.function(
+    timeout=3600,
+    volumes={STATE_DIR: state_volume},
+)
+def run_sync_daemon(max_runtime: int = 3300):
+    logging.basicConfig(level=logging.INFO)
+    log = logging.getLogger("modal_runner")
+
+    with run_lock.hold('daemon') as acquired:
+        if not acquired:
+            log.warning("⛔ A sync daemon is already running")
+            return
+        gost_proc = start_tunnels({}, log)
+        try:
+            sync_daemon.run(max_runtime=max_runtime, after_run=state_volume.commit)
+        finally:
+            gost_proc.terminate()
+            state_volume.commit()
+
 
 @app.local_entrypoint()
 def main():
     print("🚀 Triggering remote sync job on Modal...")
-    run_sync_job.remote()
+    SyncRunner().tick.remote(dispatched_at=time.time())
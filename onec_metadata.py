@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+1C Metadata Registry: physical tables/columns ↔ 1C metadata names
+═══════════════════════════════════════════════════════════════════════════════
+
+Single source of the magic names (_AccumRg53715, _Fld53732, ...) used by the
+sync jobs and reports. Two layers:
+
+  REGISTRY   verified register/reference mappings used in production code:
+             physical table, 1C metadata name and column roles, e.g.
+             column('sales', 'revenue') → '_Fld53732'
+
+  catalog()  index of all ~11k tables from 1C_Table_Structure.csv
+             (SQL_Table_Name;1C_Metadata_Name;Table_Purpose), cached, with
+             lookups by physical name or by 1C name, plus the column lists
+             from an optional INFORMATION_SCHEMA snapshot (1C_Schema_Snapshot.json)
+
+Production code paths only read REGISTRY; nothing probes the live schema.
+The CSV and snapshot are used to look names up and to validate the registry:
+
+  python onec_metadata.py --check                       # registry vs CSV/snapshot
+  python onec_metadata.py --find РегистрНакопления.Продажи
+  python onec_metadata.py --snapshot                    # refresh snapshot from 1C (PG)
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+import os
+import sys
+import csv
+import json
+from functools import lru_cache
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONFIGURATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TABLE_STRUCTURE_CSV = os.path.join(BASE_DIR, '1C_Table_Structure.csv')
+SCHEMA_SNAPSHOT = os.path.join(BASE_DIR, '1C_Schema_Snapshot.json')
+
+PRIMARY_PURPOSE = 'Основная'
+
+# Verified mappings (see extract_1c_sales.py notes: the warehouse is
+# _Fld53725RRef, NOT _Fld53717RRef)
+REGISTRY = {
+    'sales': {
+        'table': '_AccumRg53715',
+        'metadata': 'РегистрНакопления.Продажи',
+        'columns': {
+            'period': '_Period',
+            'recorder_type': '_RecorderTRef',
+            'recorder': '_RecorderRRef',
+            'line': '_LineNo',
+            'nomenclature': '_Fld53716RRef',   # → _Reference387
+            'warehouse': '_Fld53725RRef',      # → _Reference640
+            'quantity': '_Fld53731',
+            'revenue': '_Fld53732',
+        },
+    },
+    'visitors': {
+        'table': '_AccumRg53554',
+        'metadata': 'РегистрНакопления.Посетители',
+        'columns': {
+            'period': '_Period',
+            'counter': '_Fld53555RRef',        # → _Reference648
+            'checks': '_Fld53556',             # КоличествоЧеков
+            'buyers': '_Fld53557',             # КоличествоПокупателей
+            'visitors': '_Fld53558',           # КоличествоПосетителей
+        },
+    },
+    'stock': {
+        'table': '_AccumRg52568',
+        'metadata': 'РегистрНакопления.ЗапасыНаСкладах',
+        'columns': {
+            'period': '_Period',
+            'record_kind': '_RecordKind',      # 0 = receipt, 1 = expense
+            'nomenclature': '_Fld52570RRef',   # → _Reference387
+            'warehouse': '_Fld52573RRef',      # → _Reference640
+            'quantity': '_Fld52575',
+        },
+    },
+    'nomenclature': {
+        'table': '_Reference387',
+        'metadata': 'Справочник.Номенклатура',
+        'columns': {
+            'unit': '_Fld9817RRef',            # → _Reference188
+        },
+    },
+    'units': {
+        'table': '_Reference188',
+        'metadata': 'Справочник.ЕдиницыИзмерения',
+        'columns': {},
+    },
+    'warehouses': {
+        'table': '_Reference640',
+        'metadata': 'Справочник.СтруктурныеЕдиницы',
+        'columns': {
+            'parent': '_ParentIDRRef',         # store of a sales floor/warehouse
+        },
+    },
+    'counters': {
+        'table': '_Reference648',
+        'metadata': 'Справочник.СчетчикиПодсчетаПосетителей',
+        'columns': {
+            'warehouse': '_Fld15930RRef',      # → _Reference640
+        },
+    },
+}
+
+
+def table(key):
+    """Physical table of a registry entry, e.g. table('sales') → '_AccumRg53715'."""
+    return REGISTRY[key]['table']
+
+
+def column(key, role):
+    """Physical column of a registry entry, e.g. column('sales', 'revenue') → '_Fld53732'."""
+    return REGISTRY[key]['columns'][role]
+
+
+def _norm(physical):
+    return physical.lstrip('_').lower()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CATALOG (CSV + optional INFORMATION_SCHEMA snapshot)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@lru_cache(maxsize=None)
+def catalog(csv_path=TABLE_STRUCTURE_CSV, snapshot_path=SCHEMA_SNAPSHOT):
+    """
+    Parse the table structure once and index it:
+
+      by_physical  'accumrg53715' → {'table', 'metadata', 'purpose'}
+      by_metadata  'РегистрНакопления.Продажи' → [entries, primary table first]
+      columns      'accumrg53715' → [column names]   (only with a snapshot)
+    """
+    by_physical, by_metadata = {}, {}
+    with open(csv_path, encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f, delimiter=';'):
+            entry = {
+                'table': f"_{row['SQL_Table_Name']}",
+                'metadata': row['1C_Metadata_Name'] or None,
+                'purpose': row['Table_Purpose'],
+            }
+            by_physical[_norm(entry['table'])] = entry
+            if entry['metadata']:
+                by_metadata.setdefault(entry['metadata'], []).append(entry)
+
+    for entries in by_metadata.values():
+        entries.sort(key=lambda e: e['purpose'] != PRIMARY_PURPOSE)
+
+    columns = {}
+    if snapshot_path and os.path.exists(snapshot_path):
+        with open(snapshot_path, encoding='utf-8') as f:
+            columns = {_norm(t): cols for t, cols in json.load(f).items()}
+
+    return {'by_physical': by_physical, 'by_metadata': by_metadata, 'columns': columns}
+
+
+def find_table(name, purpose=PRIMARY_PURPOSE):
+    """Look a table up by physical name (_AccumRg53715) or 1C name."""
+    index = catalog()
+    entry = index['by_physical'].get(_norm(name))
+    if entry:
+        return entry
+    for entry in index['by_metadata'].get(name, []):
+        if entry['purpose'] == purpose:
+            return entry
+    return None
+
+
+def metadata_name(physical):
+    """1C metadata name of a physical table, e.g. '_Document806' → 'Документ.ВозвратВОборотИСМП'."""
+    entry = catalog()['by_physical'].get(_norm(physical))
+    return entry['metadata'] if entry else None
+
+
+def table_columns(physical):
+    """Columns from the INFORMATION_SCHEMA snapshot (None without one)."""
+    return catalog()['columns'].get(_norm(physical))
+
+
+def check_registry():
+    """Return a list of problems: registry entries not matching the CSV/snapshot."""
+    problems = []
+    for key, entry in REGISTRY.items():
+        found = find_table(entry['table'])
+        if not found:
+            problems.append(f"{key}: {entry['table']} not in {os.path.basename(TABLE_STRUCTURE_CSV)}")
+        elif found['metadata'] != entry['metadata']:
+            problems.append(f"{key}: {entry['table']} is {found['metadata']}, registry says {entry['metadata']}")
+
+        known = table_columns(entry['table'])
+        if known is not None:
+            lowered = {c.lower() for c in known}
+            for role, col in entry['columns'].items():
+                if col.lower() not in lowered:
+                    problems.append(f"{key}.{role}: column {col} not in {entry['table']}")
+    return problems
+
+
+def snapshot_schema(cursor, tables=None, path=SCHEMA_SNAPSHOT):
+    """Write INFORMATION_SCHEMA column lists of `tables` (default: registry) to `path`."""
+    tables = tables or [e['table'] for e in REGISTRY.values()]
+    cursor.execute("""
+    SELECT table_name, column_name
+    FROM information_schema.columns
+    WHERE lower(table_name) = ANY(%s)
+    ORDER BY table_name, ordinal_position
+    """, ([t.lower() for t in tables],))
+    snapshot = {}
+    for table_name, column_name in cursor.fetchall():
+        snapshot.setdefault(table_name, []).append(column_name)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f, ensure_ascii=False, indent=1)
+    catalog.cache_clear()
+    return snapshot
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CLI
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+
+    if argv[:1] == ['--find'] and len(argv) > 1:
+        name = argv[1]
+        entries = catalog()['by_metadata'].get(name) or [find_table(name)]
+        for entry in filter(None, entries):
+            print(f"{entry['table']:<28} {entry['metadata'] or '':<55} {entry['purpose']}")
+        return 0
+
+    if argv[:1] == ['--snapshot']:
+        import psycopg2
+        from sync_to_supabase import DB_CONFIG
+        conn = psycopg2.connect(**DB_CONFIG)
+        try:
+            snapshot = snapshot_schema(conn.cursor())
+        finally:
+            conn.close()
+        print(f"Wrote {len(snapshot)} tables to {SCHEMA_SNAPSHOT}")
+        return 0
+
+    problems = check_registry()
+    for problem in problems:
+        print(f"❌ {problem}")
+    if not problems:
+        print(f"✅ Registry matches {os.path.basename(TABLE_STRUCTURE_CSV)}"
+              + (" and schema snapshot" if catalog()['columns'] else ""))
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
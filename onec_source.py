@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+1C Source Adapters: one extraction API over the Postgres and MS SQL chains
+═══════════════════════════════════════════════════════════════════════════════
+
+The same 1C:Retail base is reachable through two chains:
+
+  postgres   onec_ecostock_retail / Roznica on Postgres (psycopg2),
+             real dates; this is what the Modal sync reads
+  mssql      Roznica on MS SQL (pymssql), dates stored +2000 years
+             ('4025-12-01' is 2025-12-01)
+
+A Source hides the dialect differences so the sales pipeline
+(keyset pages → transform_row → upload) runs unchanged against either:
+
+  dialect            postgres                      mssql
+  ─────────────────  ────────────────────────────  ──────────────────────────────
+  row limit          ... LIMIT n                   SELECT TOP (n) ...
+  binary ref → hex   encode(ref, 'hex')            LOWER(CONVERT(varchar(32), ref, 2))
+  hex → binary ref   decode(hex, 'hex')            CONVERT(varbinary(16), hex, 2)
+  keyset compare     row value (a, b, c) > (...)   expanded OR/AND chain
+  numeric → float    connection typecaster         CAST(... AS float)
+
+The date offset is applied in SQL (DATEADD / interval on _Period), so rows
+arrive with real dates and no per-row Python conversion; bound parameters
+(window bounds, keyset position) are shifted back once per query.
+
+Connections come from a small per-source pool; extract_parallel() reads
+several sources (and optionally several date windows per source) at once:
+
+  python onec_source.py --start 2025-12-01 --end 2026-01-01 postgres mssql
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+import os
+import sys
+import time
+import queue
+import logging
+import argparse
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from onec_metadata import table, column
+
+try:
+    import pymssql
+except ImportError:  # pragma: no cover - only the MS SQL chain needs it
+    pymssql = None
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONFIGURATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+SOURCES = {
+    'postgres': {
+        'dialect': 'postgres',
+        'date_offset_years': int(os.getenv('ONEC_PG_DATE_OFFSET_YEARS', 0)),
+        'connect': {
+            'host': os.getenv('POSTGRES_HOST'),
+            'user': os.getenv('POSTGRES_USER'),
+            'password': os.getenv('POSTGRES_PASSWORD'),
+            'dbname': os.getenv('POSTGRES_DB', 'Roznica'),
+            'port': os.getenv('POSTGRES_PORT', 5432),
+        },
+    },
+    'mssql': {
+        'dialect': 'mssql',
+        'date_offset_years': int(os.getenv('ONEC_MSSQL_DATE_OFFSET_YEARS', 2000)),
+        'connect': {
+            'server': os.getenv('MSSQL_SERVER', '100.126.198.90'),
+            'user': os.getenv('MSSQL_USER', 'ai_bot'),
+            'password': os.getenv('MSSQL_PASSWORD'),
+            'database': os.getenv('MSSQL_DB', 'Roznica'),
+        },
+    },
+}
+
+POOL_SIZE = int(os.getenv('ONEC_POOL_SIZE', 4))
+PAGE_SIZE = int(os.getenv('SALES_PAGE_SIZE', 20000))
+
+SALES_TABLE = table('sales')
+RECORDER_REF = column('sales', 'recorder')
+KEYSET = f"s._Period, s.{RECORDER_REF}, s._LineNo"
+
+# Expression templates per dialect ({} = expression, {n} = years)
+DIALECTS = {
+    'postgres': {
+        'hex': "encode({}, 'hex')",
+        'int': "{}::int",
+        'float': "{}",                     # register_float_typecasters
+        'shift_years': "({} - make_interval(years => {n}))",
+        'page_head': f"DISTINCT ON ({KEYSET})",
+        'page_tail': "LIMIT %(limit)s",
+        'keyset': f"({KEYSET}) > (%(period)s::timestamp, decode(%(recorder)s, 'hex'), %(line)s)",
+    },
+    'mssql': {
+        'hex': "LOWER(CONVERT(varchar(32), {}, 2))",
+        'int': "CAST({} AS int)",
+        'float': "CAST({} AS float)",
+        'shift_years': "DATEADD(year, -{n}, {})",
+        'page_head': "TOP (%(limit)s)",
+        'page_tail': "",
+        # Register keys are unique per (recorder, line): no DISTINCT ON needed
+        'keyset': (f"(s._Period > %(period)s OR (s._Period = %(period)s AND "
+                   f"(s.{RECORDER_REF} > CONVERT(varbinary(16), %(recorder)s, 2) OR "
+                   f"(s.{RECORDER_REF} = CONVERT(varbinary(16), %(recorder)s, 2) AND "
+                   f"s._LineNo > %(line)s))))"),
+    },
+}
+
+log = logging.getLogger(__name__)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONNECTION POOL
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class ConnectionPool:
+    """
+    Minimal thread-safe pool (pymssql has none of its own).
+
+    Connections are opened lazily up to `size`; one that raised while
+    borrowed is closed instead of being returned.
+    """
+
+    def __init__(self, connect, size=POOL_SIZE):
+        self._connect = connect
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            except BaseException:
+                conn.close()
+                raise
+            else:
+                conn.rollback()   # end the read transaction, keep the session
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# SOURCE
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class Source:
+    """A 1C database reachable through one chain (see SOURCES)."""
+
+    def __init__(self, name, config=None):
+        config = config or SOURCES[name]
+        self.name = name
+        self.kind = config['dialect']
+        self.dialect = DIALECTS[self.kind]
+        self.date_offset_years = config['date_offset_years']
+        self.config = config['connect']
+        self.pool = ConnectionPool(self.connect)
+
+    def __repr__(self):
+        return f"Source({self.name!r})"
+
+    def connect(self):
+        if self.kind == 'mssql':
+            if pymssql is None:
+                raise RuntimeError("pymssql is not installed (pip install pymssql)")
+            return pymssql.connect(**self.config)
+        import psycopg2
+        from serialization import register_float_typecasters
+        return register_float_typecasters(psycopg2.connect(**self.config))
+
+    def connection(self):
+        return self.pool.connection()
+
+    # ── dialect ──────────────────────────────────────────────────────────────
+
+    def to_source_period(self, value):
+        """Real date/datetime (or ISO string) → the value stored in _Period."""
+        if not self.date_offset_years:
+            return value
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        elif not isinstance(value, datetime):
+            value = datetime.combine(value, datetime.min.time())
+        return value.replace(year=value.year + self.date_offset_years)
+
+    def period(self, expr='s._Period'):
+        """_Period as a real date (offset removed in SQL)."""
+        if not self.date_offset_years:
+            return expr
+        return self.dialect['shift_years'].format(expr, n=self.date_offset_years)
+
+    def sales_select(self):
+        """
+        Row shape consumed by sync_to_supabase.transform_row; callers add
+        WHERE / ORDER BY. The warehouse comes as its raw ref: store_tree maps
+        it to warehouse/store names without joining _Reference640.
+        """
+        d = self.dialect
+        return f"""
+        {self.period()} AS sale_date_1c,
+        s.{column('sales', 'warehouse')} AS warehouse_ref,
+        n._Description AS product,
+        u._Description AS unit,
+        {d['float'].format(f"s.{column('sales', 'quantity')}")} AS quantity,
+        {d['float'].format(f"s.{column('sales', 'revenue')}")} AS revenue,
+        {d['hex'].format(f"s.{RECORDER_REF}")} AS recorder_id_hex,
+        {d['int'].format('s._LineNo')} AS line_number
+    FROM {SALES_TABLE} s
+    LEFT JOIN {table('nomenclature')} n ON s.{column('sales', 'nomenclature')} = n._IDRRef
+    LEFT JOIN {table('units')} u ON n.{column('nomenclature', 'unit')} = u._IDRRef"""
+
+    def sales_page_query(self, until=False):
+        d = self.dialect
+        return f"""
+    SELECT {d['page_head']}
+{self.sales_select()}
+    WHERE {d['keyset']}{' AND s._Period < %(until)s' if until else ''}
+    ORDER BY {KEYSET}
+    {d['page_tail']}
+    """
+
+    # ── extraction ───────────────────────────────────────────────────────────
+
+    def iter_sales_pages(self, cursor, after, page_size=PAGE_SIZE, until=None):
+        """
+        Yield keyset pages of sales rows after `after` = (period, recorder hex,
+        line) and, if given, before `until`. Periods in keys and rows are real
+        dates; the last row of a page is the resume point.
+        """
+        query = self.sales_page_query(until is not None)
+        params = {'limit': page_size}
+        if until is not None:
+            params['until'] = self.to_source_period(until)
+        key = after
+        while True:
+            params.update(period=self.to_source_period(key[0]), recorder=key[1], line=key[2])
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            if not rows:
+                return
+            yield rows
+            last = rows[-1]
+            key = (last[0], last[6], last[7])
+            if len(rows) < page_size:
+                return
+
+    def extract_sales(self, start, end, page_size=PAGE_SIZE):
+        """All sales rows with start <= period < end, on a pooled connection."""
+        rows = []
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            for page in self.iter_sales_pages(cursor, (start, '', 0), page_size, until=end):
+                rows.extend(page)
+            cursor.close()
+        return rows
+
+
+_sources = {}
+_sources_lock = threading.Lock()
+
+
+def get_source(name):
+    """Shared Source (and pool) per name."""
+    with _sources_lock:
+        if name not in _sources:
+            _sources[name] = Source(name)
+        return _sources[name]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# PARALLEL EXTRACTION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def split_windows(start, end, windows):
+    """Split [start, end) into `windows` contiguous day-aligned ranges."""
+    start, end = date.fromisoformat(str(start)[:10]), date.fromisoformat(str(end)[:10])
+    days = (end - start).days
+    windows = max(1, min(windows, days))
+    bounds = [start + (end - start) * i // windows for i in range(windows)] + [end]
+    return [(bounds[i].isoformat(), bounds[i + 1].isoformat()) for i in range(windows)]
+
+
+def extract_parallel(names, start, end, windows=1, transform=None):
+    """
+    Extract sales from several sources at once.
+
+    Each source's [start, end) is split into `windows` date ranges read on
+    separate pooled connections. `transform` (e.g. transform_row) is applied
+    per row in the worker. Returns {name: (rows, seconds)}.
+    """
+    tasks = [(name, lo, hi) for name in names for lo, hi in split_windows(start, end, windows)]
+    started = time.time()
+
+    def work(task):
+        name, lo, hi = task
+        t0 = time.time()
+        rows = get_source(name).extract_sales(lo, hi)
+        if transform:
+            rows = [r for r in map(transform, rows) if r]
+        log.info(f"  [{name}] {lo} … {hi}: {len(rows):,} rows in {time.time() - t0:.1f}s")
+        return name, rows
+
+    results = {name: [] for name in names}
+    with ThreadPoolExecutor(max_workers=len(tasks)) as pool:
+        for name, rows in pool.map(work, tasks):
+            results[name].extend(rows)
+    elapsed = time.time() - started
+    return {name: (rows, elapsed) for name, rows in results.items()}
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CLI
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract sales from one or more 1C chains and compare totals")
+    parser.add_argument('sources', nargs='*', default=['postgres'], choices=sorted(SOURCES))
+    parser.add_argument('--start', required=True, help="first day (YYYY-MM-DD, real date)")
+    parser.add_argument('--end', required=True, help="day after the last one")
+    parser.add_argument('--windows', type=int, default=1, help="parallel date windows per source")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)s | %(message)s',
+                        datefmt='%H:%M:%S', stream=sys.stdout)
+
+    results = extract_parallel(args.sources, args.start, args.end, args.windows)
+    print(f"\n{'Source':<10} {'Rows':>10} {'Quantity':>14} {'Revenue':>16}")
+    for name, (rows, _) in results.items():
+        qty = sum(r[4] or 0 for r in rows)
+        rev = sum(r[5] or 0 for r in rows)
+        print(f"{name:<10} {len(rows):>10,} {qty:>14,.2f} {rev:>16,.2f}")
+    for source in _sources.values():
+        source.pool.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
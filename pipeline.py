@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+Extract → Upload Pipeline: overlap 1C reads with Supabase writes
+═══════════════════════════════════════════════════════════════════════════════
+
+Sequential syncs leave the Supabase link idle while 1C is read and the 1C
+link idle while uploading. Here one producer pulls pages from a (blocking)
+page iterator and PIPELINE_UPLOADERS consumers upload them concurrently:
+
+  1C pages ──► [bounded queue: PIPELINE_QUEUE_PAGES] ──► uploaders ──► Supabase
+
+psycopg2 and requests stay as they are; asyncio coordinates and the blocking
+calls run in worker threads (asyncio.to_thread). The queue is bounded, so when
+uploads fall behind the producer waits (back-pressure) and at most
+queue + uploaders + 1 pages are in memory at any time. If the producer or
+an uploader fails, the other tasks are cancelled and run() raises its error.
+
+Usage:
+  results, stats = run(pages, upload_page)
+
+`pages` is any iterator of non-empty lists, `upload_page(list)` returns the
+uploader's stats dict; run() returns those dicts in completion order plus
+pipeline timings (extract_s, upload_s, backpressure_s, wall_s).
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+import os
+import time
+import asyncio
+import logging
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONFIGURATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+PIPELINE_ENABLED = os.getenv('SYNC_PIPELINE', '1') != '0'
+PIPELINE_QUEUE_PAGES = int(os.getenv('PIPELINE_QUEUE_PAGES', 2))
+PIPELINE_UPLOADERS = int(os.getenv('PIPELINE_UPLOADERS', 2))
+
+log = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# PIPELINE
+# ═══════════════════════════════════════════════════════════════════════════════
+
+async def _produce(pages, queue, uploaders, stats):
+    it = iter(pages)
+    while True:
+        t0 = time.perf_counter()
+        page = await asyncio.to_thread(next, it, _DONE)
+        stats['extract_s'] += time.perf_counter() - t0
+        if page is _DONE:
+            break
+        if not page:
+            continue
+
+        t0 = time.perf_counter()
+        await queue.put(page)
+        stats['backpressure_s'] += time.perf_counter() - t0
+        stats['pages'] += 1
+
+    for _ in range(uploaders):
+        await queue.put(_DONE)
+
+
+async def _consume(queue, upload, results, stats):
+    while True:
+        page = await queue.get()
+        if page is _DONE:
+            return
+        t0 = time.perf_counter()
+        results.append(await asyncio.to_thread(upload, page))
+        stats['upload_s'] += time.perf_counter() - t0
+
+
+async def run_pipeline(pages, upload, queue_pages=PIPELINE_QUEUE_PAGES, uploaders=PIPELINE_UPLOADERS):
+    queue = asyncio.Queue(maxsize=max(1, queue_pages))
+    results = []
+    stats = {'pages': 0, 'extract_s': 0.0, 'upload_s': 0.0, 'backpressure_s': 0.0}
+    started = time.perf_counter()
+
+    consumers = [asyncio.create_task(_consume(queue, upload, results, stats))
+                 for _ in range(max(1, uploaders))]
+    producer = asyncio.create_task(_produce(pages, queue, len(consumers), stats))
+    tasks = [producer, *consumers]
+    try:
+        # A failed uploader stops the run at once: with fewer (or no) consumers
+        # left the producer would otherwise block on the full queue
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in tasks:
+            if task in done and not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+    finally:
+        pending = [task for task in tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    stats['wall_s'] = time.perf_counter() - started
+    stats = {k: round(v, 2) if isinstance(v, float) else v for k, v in stats.items()}
+    log.info(f"🔀 Pipeline: {stats['pages']} pages in {stats['wall_s']}s "
+             f"(extract {stats['extract_s']}s, upload {stats['upload_s']}s, "
+             f"back-pressure {stats['backpressure_s']}s)")
+    return results, stats
+
+
+def run(pages, upload, queue_pages=PIPELINE_QUEUE_PAGES, uploaders=PIPELINE_UPLOADERS):
+    """Blocking entry point: drive `pages` through `upload` concurrently."""
+    return asyncio.run(run_pipeline(pages, upload, queue_pages, uploaders))
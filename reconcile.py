@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+Hierarchical Reconciliation: 1C sales register ↔ Supabase sales_analytics
+═══════════════════════════════════════════════════════════════════════════════
+
+Replaces the one-off check_*_discrepancy scripts. Instead of pulling full
+row sets from both sides, both systems compute aggregate fingerprints:
+
+  (row_count, Σ revenue, Σ quantity, key_hash)
+
+where key_hash = Σ first 32 bits of md5("<recorder hex>_<line>"), an
+order-independent hash of the row keys (same expression on both sides, see
+migration_reconcile.sql).
+
+  Level 1  store × day            → all days in the range (one query each side)
+  Level 2  product in store-day   → only store-days whose fingerprints differ
+  Level 3  rows of a product      → only products whose fingerprints differ
+
+Only the documents found at level 3 are resynced: rows missing or different
+in Supabase are re-extracted from 1C and upserted, rows that no longer exist
+in 1C are deleted. --dry-run reports without touching Supabase.
+
+Usage:
+  python reconcile.py --start 2026-02-01 --end 2026-02-25 [--store Коломна] [--dry-run]
+  python sync.py reconcile ...
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+import sys
+import logging
+import argparse
+import requests
+from datetime import date, timedelta
+
+import sync_to_supabase
+from sync_to_supabase import (
+    SUPABASE_URL, SUPABASE_KEY, SALES_TABLE, WAREHOUSE_REF, NOMENCLATURE_REF,
+    REVENUE_COL, QUANTITY_COL, RECORDER_REF
+)
+from onec_metadata import table
+from run_metrics import record_run
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONFIGURATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+REVENUE_TOLERANCE = 0.01
+QUANTITY_TOLERANCE = 0.001
+RPC_WINDOW_DAYS = 31       # keeps level-1 RPC results under PostgREST max-rows
+PAGE_SIZE = 1000
+DELETE_CHUNK = 200         # recorder_ids per DELETE (URL length)
+
+HEADERS = {
+    'apikey': SUPABASE_KEY,
+    'Authorization': f'Bearer {SUPABASE_KEY}',
+}
+
+log = logging.getLogger(__name__)
+
+# Shared fingerprint expressions (must match migration_reconcile.sql)
+ONEC_ROW_KEY = f"encode(s.{RECORDER_REF}, 'hex') || '_' || s._LineNo::int"
+ONEC_TOTALS = f"""
+        COUNT(*) AS row_count,
+        SUM(s.{REVENUE_COL}) AS revenue,
+        SUM(s.{QUANTITY_COL}) AS quantity,
+        SUM(('x' || substr(md5({ONEC_ROW_KEY}), 1, 8))::bit(32)::bigint) AS key_hash"""
+ONEC_FINGERPRINT = f"""
+        COUNT(*) AS row_count,
+        ROUND(SUM(s.{REVENUE_COL}), 2) AS revenue,
+        ROUND(SUM(s.{QUANTITY_COL}), 3) AS quantity,
+        SUM(('x' || substr(md5({ONEC_ROW_KEY}), 1, 8))::bit(32)::bigint) AS key_hash"""
+ONEC_FROM = f"""
+    FROM {SALES_TABLE} s
+    LEFT JOIN {table('nomenclature')} n ON s.{NOMENCLATURE_REF} = n._IDRRef"""
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# FINGERPRINTS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def fingerprint(row_count, revenue, quantity, key_hash):
+    """Normalize one fingerprint tuple (both sides return numbers differently)."""
+    return (
+        int(row_count or 0),
+        round(float(revenue or 0), 2),
+        round(float(quantity or 0), 3),
+        int(key_hash or 0)
+    )
+
+
+def same_fingerprint(a, b):
+    if a is None or b is None:
+        return False
+    return (a[0] == b[0] and a[3] == b[3]
+            and abs(a[1] - b[1]) <= REVENUE_TOLERANCE
+            and abs(a[2] - b[2]) <= QUANTITY_TOLERANCE)
+
+
+def diff_fingerprints(left, right):
+    """Keys whose fingerprints differ or exist on one side only."""
+    return sorted(k for k in set(left) | set(right)
+                  if not same_fingerprint(left.get(k), right.get(k)))
+
+
+def _rpc(name, params, query=None):
+    """Call an RPC; `query` adds PostgREST order/limit/offset on its result set."""
+    r = requests.post(f"{SUPABASE_URL}/rest/v1/rpc/{name}", headers=HEADERS, json=params,
+                      params=query, timeout=60)
+    r.raise_for_status()
+    return r.json()
+
+
+def _date_windows(start, end, days=RPC_WINDOW_DAYS):
+    current = start
+    while current < end:
+        upper = min(current + timedelta(days=days), end)
+        yield current, upper
+        current = upper
+
+
+# --- Level 1: store × day --------------------------------------------------------
+
+def onec_store_days(cursor, tree, start, end, store=None):
+    """Totals per warehouse × day from 1C, added up per store of the store tree."""
+    query = f"""
+    SELECT s.{WAREHOUSE_REF}, s._Period::date AS day, {ONEC_TOTALS}
+    FROM {SALES_TABLE} s
+    WHERE s._Period >= %s AND s._Period < %s
+      AND s.{WAREHOUSE_REF} = ANY(%s)
+    GROUP BY 1, 2
+    """
+    cursor.execute(query, (start, end, tree.refs(store)))
+    totals = {}
+    for ref, day, *values in cursor.fetchall():
+        key = (tree.placements[bytes(ref)].store, day.isoformat())
+        totals[key] = [a + float(b or 0) for a, b in zip(totals.get(key, [0, 0.0, 0.0, 0]), values)]
+    return {key: fingerprint(*values) for key, values in totals.items()}
+
+
+def supabase_store_days(start, end, store=None):
+    result = {}
+    for lo, hi in _date_windows(start, end):
+        for r in _rpc('sales_fingerprint_store_day', {'p_start': lo.isoformat(), 'p_end': hi.isoformat()}):
+            if store is None or r['store'] == store:
+                result[(r['store'], r['day'])] = fingerprint(
+                    r['row_count'], r['revenue'], r['quantity'], r['key_hash'])
+    return result
+
+
+# --- Level 2: product within a store-day -----------------------------------------
+
+def onec_products(cursor, refs, day):
+    query = f"""
+    SELECT COALESCE(n._Description, '') AS product, {ONEC_FINGERPRINT}
+    {ONEC_FROM}
+    WHERE s._Period >= %s::date AND s._Period < %s::date + 1
+      AND s.{WAREHOUSE_REF} = ANY(%s)
+    GROUP BY 1
+    """
+    cursor.execute(query, (day, day, refs))
+    return {r[0]: fingerprint(*r[1:]) for r in cursor.fetchall()}
+
+
+def supabase_products(store, day):
+    return {r['product']: fingerprint(r['row_count'], r['revenue'], r['quantity'], r['key_hash'])
+            for r in _rpc('sales_fingerprint_product', {'p_store': store, 'p_day': day})}
+
+
+# --- Level 3: rows of one product in a store-day ---------------------------------
+
+def onec_rows(cursor, refs, day, product):
+    query = f"""
+    SELECT {ONEC_ROW_KEY} AS recorder_id, s.{REVENUE_COL}, s.{QUANTITY_COL}
+    {ONEC_FROM}
+    WHERE s._Period >= %s::date AND s._Period < %s::date + 1
+      AND s.{WAREHOUSE_REF} = ANY(%s)
+      AND COALESCE(n._Description, '') = %s
+    """
+    cursor.execute(query, (day, day, refs, product))
+    return {r[0]: (float(r[1] or 0), float(r[2] or 0)) for r in cursor.fetchall()}
+
+
+def supabase_rows(store, day, product):
+    next_day = (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+    params = {
+        'select': 'recorder_id,revenue,quantity',
+        'store': f'eq.{store}',
+        'and': f'(sale_date.gte.{day},sale_date.lt.{next_day})',
+        'order': 'id',
+    }
+    if product:
+        params['product'] = f'eq.{product}'
+    else:
+        params['or'] = '(product.is.null,product.eq.)'
+
+    rows = {}
+    offset = 0
+    while True:
+        r = requests.get(f"{SUPABASE_URL}/rest/v1/sales_analytics", headers=HEADERS,
+                         params={**params, 'offset': offset, 'limit': PAGE_SIZE}, timeout=60)
+        r.raise_for_status()
+        page = r.json()
+        for row in page:
+            rows[row['recorder_id']] = (float(row['revenue'] or 0), float(row['quantity'] or 0))
+        if len(page) < PAGE_SIZE:
+            return rows
+        offset += PAGE_SIZE
+
+
+def diff_rows(onec, supabase):
+    """Return (keys to upsert, keys to delete)."""
+    to_upsert = [k for k, v in onec.items()
+                 if k not in supabase
+                 or abs(v[0] - supabase[k][0]) > REVENUE_TOLERANCE
+                 or abs(v[1] - supabase[k][1]) > QUANTITY_TOLERANCE]
+    to_delete = [k for k in supabase if k not in onec]
+    return to_upsert, to_delete
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# RESYNC
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def resync_recorders(cursor, recorder_hexes):
+    """Re-extract whole documents from 1C and upsert them; returns (uploaded, failed) rows."""
+    rows = sync_to_supabase.extract_sales_for_recorders(cursor, sorted(recorder_hexes))
+    records = [r for r in map(sync_to_supabase.transform_row, rows) if r]
+    if not records:
+        return 0, 0
+    stats = sync_to_supabase.upload_to_supabase(records)
+    return stats['uploaded'], stats['failed_rows']
+
+
+def delete_rows(recorder_ids):
+    """Bulk-delete sales_analytics rows by recorder_id."""
+    deleted = 0
+    ids = sorted(recorder_ids)
+    for i in range(0, len(ids), DELETE_CHUNK):
+        chunk = ids[i:i + DELETE_CHUNK]
+        r = requests.delete(f"{SUPABASE_URL}/rest/v1/sales_analytics",
+                            headers={**HEADERS, 'Prefer': 'return=minimal'},
+                            params={'recorder_id': f"in.({','.join(chunk)})"}, timeout=60)
+        if r.status_code in (200, 204):
+            deleted += len(chunk)
+        else:
+            log.error(f"  Delete error: {r.status_code} - {r.text[:200]}")
+    return deleted
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ENGINE
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def reconcile(start, end, store=None, dry_run=False):
+    """Compare [start, end) top-down and resync only the differing slices."""
+    conn = sync_to_supabase.get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        # Stores as the sync attributes them (full hierarchy, see store_tree)
+        tree = sync_to_supabase.load_stores(cursor)
+
+        log.info(f"Level 1: store × day fingerprints {start} → {end}...")
+        left = onec_store_days(cursor, tree, start, end, store)
+        right = supabase_store_days(start, end, store)
+        bad_days = diff_fingerprints(left, right)
+        log.info(f"  {len(set(left) | set(right))} store-days, {len(bad_days)} differ")
+
+        to_upsert, to_delete = set(), set()
+        bad_products = 0
+        repaired_days = set()
+
+        for store_name, day in bad_days:
+            log.info(f"  ❌ {day} | {store_name}: 1C {left.get((store_name, day))} "
+                     f"vs Supabase {right.get((store_name, day))}")
+
+            refs = tree.refs(store_name)
+            products_1c = onec_products(cursor, refs, day)
+            products_sb = supabase_products(store_name, day)
+            for product in diff_fingerprints(products_1c, products_sb):
+                bad_products += 1
+                upsert, delete = diff_rows(onec_rows(cursor, refs, day, product),
+                                           supabase_rows(store_name, day, product))
+                log.info(f"     {product or '(без названия)'}: "
+                         f"{len(upsert)} to upsert, {len(delete)} to delete")
+                to_upsert.update(upsert)
+                to_delete.update(delete)
+                if upsert or delete:
+                    repaired_days.add(date.fromisoformat(str(day)[:10]))
+
+        summary = {
+            'start': start.isoformat(), 'end': end.isoformat(), 'store': store,
+            'store_days': len(set(left) | set(right)), 'store_days_differ': len(bad_days),
+            'products_differ': bad_products,
+            'rows_to_upsert': len(to_upsert), 'rows_to_delete': len(to_delete),
+            'upserted': 0, 'upsert_failed': 0, 'deleted': 0, 'aggregate_errors': 0,
+            'dry_run': dry_run,
+        }
+
+        aggregates = {}
+        if not dry_run:
+            recorders = {k.rsplit('_', 1)[0] for k in to_upsert}
+            if recorders:
+                log.info(f"Resyncing {len(recorders)} documents from 1C...")
+                summary['upserted'], summary['upsert_failed'] = resync_recorders(cursor, recorders)
+            if to_delete:
+                log.info(f"Deleting {len(to_delete)} rows missing in 1C...")
+                summary['deleted'] = delete_rows(to_delete)
+            # Check counts and store-day revenue of the repaired days
+            aggregates = sync_to_supabase.refresh_day_aggregates(cursor, repaired_days)
+            summary['aggregate_errors'] = sync_to_supabase.aggregate_errors(aggregates)
+    finally:
+        cursor.close()
+        conn.close()
+
+    record_run('reconcile', status='ok' if dry_run or complete(summary) else 'partial',
+               checks=aggregates.get('checks'), facts=aggregates.get('store_days'), **summary)
+    return summary
+
+
+def complete(summary):
+    """Whether a (non-dry) run repaired every row it found, aggregates included."""
+    return (not summary['upsert_failed'] and summary['deleted'] == summary['rows_to_delete']
+            and not (summary['rows_to_upsert'] and not summary['upserted'])
+            and not summary['aggregate_errors'])
+
+
+def exit_code(summary):
+    """1 if a dry run found differences or a real one left some unrepaired."""
+    if summary['dry_run']:
+        return 1 if summary['store_days_differ'] else 0
+    return 0 if complete(summary) else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Reconcile 1C sales with Supabase')
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    summary = reconcile(args.start, args.end, args.store, args.dry_run)
+    return exit_code(summary)
+
+
+def add_arguments(parser):
+    today = date.today()
+    parser.add_argument('--start', type=date.fromisoformat, default=today - timedelta(days=7),
+                        help='First day (default: 7 days ago)')
+    parser.add_argument('--end', type=date.fromisoformat, default=today + timedelta(days=1),
+                        help='Day after the last day (default: tomorrow)')
+    parser.add_argument('--store', default=None, help='Limit to one store')
+    parser.add_argument('--dry-run', action='store_true', help='Report differences only')
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s | %(levelname)s | %(message)s',
+        datefmt='%H:%M:%S',
+        stream=sys.stdout
+    )
+    sys.exit(main())
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+Run Lock: one sync run at a time
+═══════════════════════════════════════════════════════════════════════════════
+
+The Modal job fires hourly with timeout=3600, so a slow run can overlap the
+next one and both hammer 1C and Supabase. Every run takes a session-level
+Postgres advisory lock on the analytics database (SYNC_LOCK_DSN, falling back
+to ANALYTICS_DB_URL):
+
+  - the lock lives as long as the holding connection, so a crashed or killed
+    run releases it automatically (no stale leases to expire)
+  - a second run polls for at most SYNC_LOCK_WAIT seconds, then skips
+  - waits and contention are recorded in run metrics (job "lock") with the
+    holder's application_name and start time from pg_stat_activity
+  - re-entrant within a process, across threads: modal_sync holds it for
+    the whole run and each `sync.run()` inside (also the scheduler's job
+    threads) reuses it; the last one out closes the connection
+
+The DSN must be a direct connection (db.<ref>.supabase.co:5432) or the
+session-mode pooler (port 5432). The transaction-mode pooler on port 6543
+hands every statement to whichever server connection is free, so a session
+advisory lock is taken on a backend the run does not keep and is neither
+held nor released reliably.
+
+Without a DSN, or if the lock database is unreachable, runs proceed unlocked
+with a warning (a lock outage must not stop the syncs).
+
+Usage:
+  with hold('sync') as acquired:
+      if not acquired:
+          return
+      ...
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+import os
+import time
+import socket
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+
+from run_metrics import record_run
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONFIGURATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+LOCK_DSN = os.getenv('SYNC_LOCK_DSN') or os.getenv('ANALYTICS_DB_URL')
+LOCK_WAIT_SECONDS = float(os.getenv('SYNC_LOCK_WAIT', 60))
+LOCK_POLL_SECONDS = 1.0
+
+log = logging.getLogger(__name__)
+
+# name → [connection or None, depth]; _held_lock guards it and the first acquire
+_held = {}
+_held_lock = threading.Lock()
+
+
+def lock_key(name):
+    """Stable signed 64-bit advisory lock key for `name`."""
+    digest = hashlib.md5(f"bonanza-sync:{name}".encode()).digest()
+    return int.from_bytes(digest[:8], 'big', signed=True)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# LOCK
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def lock_holder(cursor, key):
+    """Who holds the lock (application_name, backend start), if visible."""
+    cursor.execute("""
+    SELECT a.application_name, a.backend_start, a.client_addr::text
+    FROM pg_locks l
+    JOIN pg_stat_activity a ON a.pid = l.pid
+    WHERE l.locktype = 'advisory' AND l.granted
+      AND l.classid = ((%s::bigint >> 32) & 4294967295)::oid
+      AND l.objid = (%s::bigint & 4294967295)::oid
+    """, (key, key))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return {'application': row[0], 'since': row[1].isoformat() if row[1] else None, 'client': row[2]}
+
+
+def acquire(name, wait=LOCK_WAIT_SECONDS, dsn=None):
+    """
+    Try to take the lock `name` for up to `wait` seconds.
+
+    Returns (acquired, connection): keep the connection open while running;
+    closing it releases the lock. The connection is None when locking is
+    disabled or unavailable (acquired is then True).
+    """
+    dsn = dsn or LOCK_DSN
+    if not dsn:
+        log.warning("🔓 No SYNC_LOCK_DSN / ANALYTICS_DB_URL: running without a run lock")
+        return True, None
+
+    import psycopg2
+
+    key = lock_key(name)
+    try:
+        conn = psycopg2.connect(dsn, application_name=f"bonanza-sync:{name}@{socket.gethostname()}",
+                                connect_timeout=10)
+        conn.autocommit = True
+    except Exception as e:
+        log.warning(f"🔓 Lock database unreachable, running without a run lock: {e}")
+        return True, None
+
+    cursor = conn.cursor()
+    started = time.monotonic()
+    while True:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", (key,))
+        if cursor.fetchone()[0]:
+            waited = round(time.monotonic() - started, 1)
+            if waited >= LOCK_POLL_SECONDS:
+                log.info(f"🔒 Lock '{name}' acquired after waiting {waited}s")
+                record_run('lock', status='waited', name=name, waited_s=waited)
+            else:
+                log.info(f"🔒 Lock '{name}' acquired")
+            return True, conn
+
+        if time.monotonic() - started >= wait:
+            holder = lock_holder(cursor, key)
+            waited = round(time.monotonic() - started, 1)
+            log.warning(f"⛔ Lock '{name}' is held by {holder}; gave up after {waited}s")
+            record_run('lock', status='contended', name=name, waited_s=waited, holder=holder)
+            conn.close()
+            return False, None
+
+        time.sleep(LOCK_POLL_SECONDS)
+
+
+@contextmanager
+def hold(name='sync', wait=LOCK_WAIT_SECONDS, dsn=None):
+    """Context manager around acquire(); yields whether the run may proceed."""
+    with _held_lock:
+        entry = _held.get(name)
+        if entry is not None:
+            entry[1] += 1
+        else:
+            acquired, conn = acquire(name, wait, dsn)
+            if acquired:
+                entry = _held[name] = [conn, 1]
+    if entry is None:
+        yield False
+        return
+
+    try:
+        yield True
+    finally:
+        with _held_lock:
+            entry[1] -= 1
+            last = entry[1] == 0
+            if last:
+                del _held[name]
+        if last and entry[0] is not None:
+            entry[0].close()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+Sync Run Metrics
+═══════════════════════════════════════════════════════════════════════════════
+
+Every sync job appends one JSON line per run to `run_metrics.jsonl` inside
+SYNC_STATE_DIR (default `.sync_state/`):
+
+  {"ts": "...", "job": "sales", "status": "ok", "rows": 1234, "upload": {...}}
+
+Used for the end-of-run summary in the logs and as history for later tuning.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+import os
+import json
+import logging
+from datetime import datetime
+
+from sync_state import STATE_DIR
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONFIGURATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+METRICS_FILE = os.path.join(STATE_DIR, 'run_metrics.jsonl')
+
+log = logging.getLogger(__name__)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# RECORD / READ
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def record_run(job, status='ok', **metrics):
+    """Append one run entry for `job` and log a one-line summary."""
+    entry = {
+        'ts': datetime.now().isoformat(timespec='seconds'),
+        'job': job,
+        'status': status,
+        **metrics
+    }
+
+    log.info(f"📊 Run metrics [{job}]: {json.dumps(entry, ensure_ascii=False, default=str)}")
+
+    try:
+        os.makedirs(STATE_DIR, exist_ok=True)
+        with open(METRICS_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
+    except OSError as e:
+        log.warning(f"Could not write run metrics to {METRICS_FILE}: {e}")
+
+    return entry
+
+
+def recent_runs(job=None, limit=20):
+    """Return the last `limit` entries (oldest first), optionally for one job."""
+    if not os.path.exists(METRICS_FILE):
+        return []
+
+    entries = []
+    with open(METRICS_FILE, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if job is None or entry.get('job') == job:
+                entries.append(entry)
+
+    return entries[-limit:]
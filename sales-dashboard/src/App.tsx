@@ -8,7 +8,7 @@ import {
   TrendingUp, Package, Weight, ShoppingCart, Receipt,
   Calendar, Store, Filter, ArrowUpDown, RefreshCw, ChevronDown, ChevronUp
 } from 'lucide-react';
-import { fetchSalesData, fetchDistinctValues, fetchKPIs, fetchInventory, calculateEstimatedWeight, getProductCategoryAndWeight, supabase, fetchShopDetailedKPIs, fetchVisitors, type SalesRecord, type InventoryRecord, type ShopDetailedKPI, type VisitorRecord } from './lib/supabase';
+import { fetchSalesData, fetchDistinctValues, fetchKPIs, fetchInventory, calculateEstimatedWeight, getProductCategoryAndWeight, fetchShopDetailedKPIs, fetchStoreDayTotals, fetchProductWeights, type SalesRecord, type InventoryRecord, type ShopDetailedKPI, type StoreDayTotals } from './lib/supabase';
 import Login from './components/Login';
 import './index.css';
 
@@ -88,7 +88,7 @@ export default function App() {
   const [inventoryData, setInventoryData] = useState<InventoryRecord[]>([]);
   const [kpis, setKpis] = useState<any>(null);
   const [shopKPIs, setShopKPIs] = useState<ShopDetailedKPI[]>([]);
-  const [visitorsData, setVisitorsData] = useState<VisitorRecord[]>([]);
+  const [storeTotals, setStoreTotals] = useState<StoreDayTotals[]>([]);
   const [productWeights, setProductWeights] = useState<any[]>([]);
   const [loading, setLoading] = useState(true);
   const [isAuthenticated, setIsAuthenticated] = useState(false);
@@ -106,12 +106,12 @@ export default function App() {
         fetchDistinctValues('store'),
         fetchDistinctValues('product_group'),
         fetchDistinctValues('product'),
-        supabase.from('product_weights').select('*')
+        fetchProductWeights(setProductWeights)
       ]);
       setStores(storeList);
       setProductGroups(groupList);
       setProductsList(prodList);
-      if (weightsList.data) setProductWeights(weightsList.data);
+      setProductWeights(weightsList);
     }
     loadDataAndFilters();
   }, []);
@@ -119,7 +119,7 @@ export default function App() {
   // Load sales and inventory data
   const loadData = async () => {
     setLoading(true);
-    const [data, kpiData, inventory, shopData, visitors] = await Promise.all([
+    const [data, kpiData, inventory, shopData, totals] = await Promise.all([
       fetchSalesData(startDate, endDate,
         selectedStores.length > 0 ? selectedStores : undefined,
         selectedGroups.length > 0 ? selectedGroups : undefined,
@@ -132,13 +132,13 @@ export default function App() {
       ),
       fetchInventory(endDate),
       fetchShopDetailedKPIs(startDate, endDate, selectedStores.length > 0 ? selectedStores : undefined),
-      fetchVisitors(startDate, endDate, selectedStores.length > 0 ? selectedStores : undefined)
+      fetchStoreDayTotals(startDate, endDate, selectedStores.length > 0 ? selectedStores : undefined)
     ]);
     setSalesData(data);
     setKpis(kpiData);
     setInventoryData(inventory);
     setShopKPIs(shopData as ShopDetailedKPI[]);
-    setVisitorsData(visitors);
+    setStoreTotals(totals);
     setLoading(false);
   };
 
@@ -149,6 +149,12 @@ export default function App() {
   // Tab state
   const [activeTab, setActiveTab] = useState<'dashboard' | 'inventory'>('dashboard');
 
+  // Трафик / Конверсия per store (store_day_facts totals)
+  const totalsByStore = useMemo(
+    () => new Map(storeTotals.map(t => [t.store, t])),
+    [storeTotals]
+  );
+
   // Filtered Inventory Data
   const filteredInventory = useMemo(() => {
     return inventoryData.filter(item => {
@@ -677,11 +683,11 @@ export default function App() {
                           <td className="number">{formatCurrency(row.aPlus.checks > 0 ? row.aPlus.revenue / row.aPlus.checks : 0)}</td>
                           <td className="number">{formatCurrency(row.bedding.checks > 0 ? row.bedding.revenue / row.bedding.checks : 0)}</td>
                           <td className="number highlight-red">{formatNumber(row.total.checks > 0 ? row.total.pcs / row.total.checks : 0, 1)}</td>
-                          {/* Трафик - from visitors_analytics */}
+                          {/* Трафик - from store_day_facts */}
                           {(() => {
-                            const storeVisitors = visitorsData.filter(v => v.store === row.store).reduce((sum, v) => sum + Number(v.visitor_count), 0);
-                            const checks = row.total.checks as unknown as number;
-                            const conv = storeVisitors > 0 ? (checks / storeVisitors) * 100 : 0;
+                            const traffic = totalsByStore.get(row.store);
+                            const storeVisitors = traffic?.visitors || 0;
+                            const conv = traffic?.conversion || 0;
                             const hasData = storeVisitors > 0;
                             return (
                               <>
@@ -802,8 +808,8 @@ export default function App() {
                           )}
                         </td>
                         {(() => {
-                          const totalVisitors = visitorsData.reduce((sum, v) => sum + Number(v.visitor_count), 0);
-                          const totalChecks = shopKPIs.reduce((acc, r) => acc + (r.total.checks as unknown as number), 0);
+                          const totalVisitors = storeTotals.reduce((sum, t) => sum + t.visitors, 0);
+                          const totalChecks = storeTotals.reduce((sum, t) => sum + t.sales_checks, 0);
                           const totalConv = totalVisitors > 0 ? (totalChecks / totalVisitors) * 100 : 0;
                           const hasData = totalVisitors > 0;
                           return (
@@ -121,6 +121,49 @@ export interface ProductWeight {
   avg_weight_kg: number;
   category: 'new' | 'second'; // Added category
   created_at: string;
+  updated_at?: string;
+}
+
+// Rule lookup index, compiled once per weights array (first match wins, in id order):
+// group + pattern, then group default, then '%' / 'АКЦИЯ' patterns
+interface WeightRuleIndex {
+  groups: Map<string, { patterns: ProductWeight[]; fallback?: ProductWeight }>;
+  wildcard: ProductWeight[];
+}
+
+const ruleIndexes = new WeakMap<ProductWeight[], WeightRuleIndex>();
+
+function getRuleIndex(weights: ProductWeight[]): WeightRuleIndex {
+  let index = ruleIndexes.get(weights);
+  if (!index) {
+    index = { groups: new Map(), wildcard: [] };
+    for (const w of weights) {
+      let entry = index.groups.get(w.product_group);
+      if (!entry) {
+        entry = { patterns: [] };
+        index.groups.set(w.product_group, entry);
+      }
+      if (w.product_name_pattern) {
+        entry.patterns.push(w);
+        if (w.product_group === '%' || w.product_group === 'АКЦИЯ') index.wildcard.push(w);
+      } else if (!entry.fallback) {
+        entry.fallback = w;
+      }
+    }
+    ruleIndexes.set(weights, index);
+  }
+  return index;
+}
+
+function matchWeightRule(weights: ProductWeight[], pGroup: string, pName: string): ProductWeight | undefined {
+  const index = getRuleIndex(weights);
+  const entry = index.groups.get(pGroup);
+  if (entry) {
+    const match = entry.patterns.find(w => pName.includes(w.product_name_pattern!)) || entry.fallback;
+    if (match) return match;
+  }
+  // Global pattern match (e.g. АКЦИЯ)
+  return index.wildcard.find(w => pName.includes(w.product_name_pattern!));
 }
 
 // Helper: Get weight AND category
@@ -139,27 +182,7 @@ export function getProductCategoryAndWeight(record: any, weights: ProductWeight[
   let avgWeight = 0;
 
   // Find matching rule
-  let match = weights.find(w =>
-    w.product_group === pGroup &&
-    w.product_name_pattern &&
-    pName.includes(w.product_name_pattern)
-  );
-
-  if (!match) {
-    match = weights.find(w =>
-      w.product_group === pGroup &&
-      !w.product_name_pattern
-    );
-  }
-
-  // Global pattern match (e.g. АКЦИЯ)
-  if (!match) {
-    match = weights.find(w =>
-      w.product_name_pattern &&
-      (w.product_group === '%' || w.product_group === 'АКЦИЯ') &&
-      pName.includes(w.product_name_pattern)
-    );
-  }
+  const match = matchWeightRule(weights, pGroup, pName);
 
   if (match) {
     category = match.category || 'second';
@@ -565,16 +588,78 @@ export async function fetchInventory(reportDate?: string): Promise<InventoryReco
   }
 }
 
-export async function fetchProductWeights(): Promise<ProductWeight[]> {
+// product_weights changes a few times a month: keep it in localStorage and
+// revalidate with a count + max(updated_at) probe instead of a full download
+const WEIGHTS_CACHE_KEY = 'product_weights_cache_v1';
+
+interface WeightsCache {
+  version: string;
+  rows: ProductWeight[];
+}
+
+let weightsRequest: Promise<ProductWeight[] | null> | null = null;
+
+function readWeightsCache(): WeightsCache | null {
+  try {
+    const raw = localStorage.getItem(WEIGHTS_CACHE_KEY);
+    return raw ? JSON.parse(raw) as WeightsCache : null;
+  } catch {
+    return null;
+  }
+}
+
+function writeWeightsCache(cache: WeightsCache) {
+  try {
+    localStorage.setItem(WEIGHTS_CACHE_KEY, JSON.stringify(cache));
+  } catch {
+    // Storage full or disabled: the in-memory result is still used
+  }
+}
+
+async function fetchWeightsVersion(): Promise<string | null> {
+  const { data, count, error } = await supabase
+    .from('product_weights')
+    .select('updated_at', { count: 'exact' })
+    .order('updated_at', { ascending: false })
+    .limit(1);
+
+  if (error) return null;
+  return `${count ?? 0}:${data?.[0]?.updated_at ?? ''}`;
+}
+
+// Resolves to fresh rules, or null when the cached version is still current
+async function revalidateProductWeights(cached: WeightsCache | null): Promise<ProductWeight[] | null> {
+  const version = await fetchWeightsVersion();
+  if (cached && version === cached.version) return null;
+
   const { data, error } = await supabase
     .from('product_weights')
-    .select('*');
+    .select('*')
+    .order('id', { ascending: true });
 
   if (error) {
     console.error('Error fetching weights:', error);
-    return [];
+    return cached ? null : [];
   }
-  return data as ProductWeight[];
+  const rows = data as ProductWeight[];
+  if (version) writeWeightsCache({ version, rows });
+  return rows;
+}
+
+/**
+ * Weight rules, served from the local cache without waiting for the network.
+ * The cache is revalidated once per page load; `onUpdate` receives the new
+ * rules if they changed. Without a cache the first download is awaited.
+ */
+export async function fetchProductWeights(onUpdate?: (rows: ProductWeight[]) => void): Promise<ProductWeight[]> {
+  const cached = readWeightsCache();
+  if (!weightsRequest) weightsRequest = revalidateProductWeights(cached);
+
+  if (cached) {
+    weightsRequest.then(rows => { if (rows && onUpdate) onUpdate(rows); });
+    return cached.rows;
+  }
+  return (await weightsRequest) ?? [];
 }
 
 export async function checkUser(username: string, password: string): Promise<boolean> {
@@ -591,33 +676,40 @@ export async function checkUser(username: string, password: string): Promise<boo
   return true;
 }
 
-export interface VisitorRecord {
-  visit_date: string;
+export interface StoreDayTotals {
   store: string;
-  visitor_count: number;
+  revenue: number;
+  sales_checks: number;
+  checks: number;
+  buyers: number;
+  visitors: number;
+  conversion: number | null; // sales_checks / visitors, %
 }
 
-export async function fetchVisitors(
+// Per-store totals of store_day_facts (filled by the sync), one row per store
+export async function fetchStoreDayTotals(
   startDate: string,
   endDate: string,
   stores?: string[]
-): Promise<VisitorRecord[]> {
-  let query = supabase
-    .from('visitors_analytics')
-    .select('visit_date, store, visitor_count')
-    .gte('visit_date', startDate)
-    .lte('visit_date', endDate)
-    .order('visit_date', { ascending: true });
-
-  if (stores && stores.length > 0) {
-    query = query.in('store', stores);
-  }
+): Promise<StoreDayTotals[]> {
+  const { data, error } = await supabase.rpc('store_day_totals', {
+    p_start: startDate,
+    p_end: endDate,
+    p_stores: stores && stores.length > 0 ? stores : null
+  });
 
-  try {
-    const data = await fetchAll(query);
-    return data || [];
-  } catch (error) {
-    console.error('Error fetching visitors:', error);
+  if (error) {
+    console.error('Error fetching store-day totals:', error);
     return [];
   }
+
+  return (data || []).map((r: any) => ({
+    store: r.store,
+    revenue: Number(r.revenue),
+    sales_checks: Number(r.sales_checks),
+    checks: Number(r.checks),
+    buyers: Number(r.buyers),
+    visitors: Number(r.visitors),
+    conversion: r.conversion === null ? null : Number(r.conversion)
+  }));
 }
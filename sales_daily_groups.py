@@ -13,13 +13,14 @@ Output: LeaderTex_Sales_Dec2025.xlsx
 
 import psycopg2
 import pandas as pd
-import numpy as np
 from decimal import Decimal
 from datetime import datetime, timedelta
 import logging
 import sys
 import os
 
+from onec_metadata import table, column
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # CONFIGURATION
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -33,15 +34,30 @@ DB_CONFIG = {
 }
 
 # Column mappings (verified)
-WAREHOUSE_REF = '_Fld53725RRef'  # Warehouse reference
-NOMENCLATURE_REF = '_Fld53716RRef'  # Nomenclature reference (CORRECT!)
-REVENUE_COL = '_Fld53732'  # Revenue
-QUANTITY_COL = '_Fld53731'  # Quantity
-RECORDER_REF = '_RecorderRRef'  # Document reference (for check count)
+SALES_TABLE = table('sales')
+WAREHOUSE_REF = column('sales', 'warehouse')  # Warehouse reference
+NOMENCLATURE_REF = column('sales', 'nomenclature')  # Nomenclature reference (CORRECT!)
+REVENUE_COL = column('sales', 'revenue')  # Revenue
+QUANTITY_COL = column('sales', 'quantity')  # Quantity
+RECORDER_REF = column('sales', 'recorder')  # Document reference (for check count)
+UNIT_REF = column('nomenclature', 'unit')  # Nomenclature → unit of measure
 
 # Date offset for 1C (Postgres uses standard dates)
 DATE_OFFSET_YEARS = 0
 
+# Typed frame schema: categoricals for dimensions, compact numerics
+SCHEMA = {
+    'sale_date': 'datetime64[ns]',
+    'warehouse': 'category',
+    'store': 'category',
+    'product': 'category',
+    'unit': 'category',
+    'quantity': 'float32',
+    'revenue': 'float64',      # money: float32 would round kopecks on large sums
+    'recorder': 'int32',
+}
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
 # Validation constants
 VALIDATION_STORE = 'Большевиков'
 VALIDATION_REVENUE = 776661.00
@@ -79,19 +95,39 @@ def get_connection():
 # DATA EXTRACTION
 # ═══════════════════════════════════════════════════════════════════════════════
 
+def log_memory(stage: str, *frames: pd.DataFrame):
+    """Log the deep memory footprint of the frames after a pipeline stage."""
+    total = sum(f.memory_usage(deep=True).sum() for f in frames)
+    rows = sum(len(f) for f in frames)
+    log.info(f"💾 {stage}: {total / 2**20:,.1f} MB ({rows:,} rows, "
+             f"{total / max(rows, 1):,.0f} B/row)")
+
+
+def map_categories(values: pd.Series, func, missing) -> pd.Categorical:
+    """
+    Apply `func` once per distinct category instead of once per row and
+    return the result as a categorical (`missing` for NULL values).
+    """
+    codes = values.cat.codes.to_numpy()
+    mapped = pd.Index([func(c) for c in values.cat.categories] + [missing])
+    # NULL has code -1, which indexes the trailing `missing` entry
+    result = mapped[codes]
+    return pd.Categorical(result)
+
+
 def extract_sales_data(cursor) -> pd.DataFrame:
     """
-    Extract raw sales data with all required dimensions.
+    Extract raw sales data straight into the typed schema (SCHEMA).
     
     Returns DataFrame with columns:
-    - sale_date: Date (with -2000 years offset applied)
-    - warehouse: Warehouse name
-    - store: Store name (parent of warehouse)
-    - product: Product name
-    - product_group: Product group (extracted from product name)
-    - quantity: Quantity sold
-    - revenue: Revenue amount
-    - recorder: Document reference (for check counting)
+    - sale_date: datetime64
+    - warehouse: Warehouse name (category)
+    - store: Store name, parent of warehouse or the warehouse itself (category)
+    - product: Product name (category)
+    - unit: Unit of measure (category)
+    - quantity: Quantity sold (float32; quantities are whole pieces)
+    - revenue: Revenue amount (float64, money)
+    - recorder: Dense integer code of the document (int32, for check counting)
     """
     log.info("Extracting sales data from database...")
     
@@ -105,11 +141,11 @@ def extract_sales_data(cursor) -> pd.DataFrame:
         s.{QUANTITY_COL} AS quantity,
         s.{REVENUE_COL} AS revenue,
         s.{RECORDER_REF} AS recorder
-    FROM _AccumRg53715 s
+    FROM {SALES_TABLE} s
     INNER JOIN _Reference640 w ON s.{WAREHOUSE_REF} = w._IDRRef
     LEFT JOIN _Reference640 m ON w._ParentIDRRef = m._IDRRef
     LEFT JOIN _Reference387 n ON s.{NOMENCLATURE_REF} = n._IDRRef
-    LEFT JOIN _Reference188 u ON n._Fld9817RRef = u._IDRRef
+    LEFT JOIN _Reference188 u ON n.{UNIT_REF} = u._IDRRef
     WHERE s._Period >= %s AND s._Period < %s
     """
     
@@ -118,12 +154,27 @@ def extract_sales_data(cursor) -> pd.DataFrame:
     
     log.info(f"Fetched {len(rows):,} raw records")
     
-    # Convert to DataFrame
-    df = pd.DataFrame(rows, columns=[
-        'sale_date_1c', 'warehouse', 'store', 'product', 'unit',
-        'quantity', 'revenue', 'recorder'
-    ])
-    
+    # Column-wise into the typed schema: no intermediate all-object frame
+    sale_date, warehouse, store, product, unit, quantity, revenue, recorder = (
+        zip(*rows) if rows else [()] * 8
+    )
+    del rows
+    
+    df = pd.DataFrame({
+        'sale_date': pd.to_datetime(pd.Series(sale_date, dtype='object')),
+        'warehouse': pd.Categorical(warehouse),
+        # Missing stores fall back to the warehouse name
+        'store': pd.Categorical([s or w for s, w in zip(store, warehouse)]),
+        'product': pd.Categorical(product),
+        'unit': pd.Categorical(unit),
+        'quantity': pd.to_numeric(pd.Series(quantity, dtype='object'), errors='coerce').fillna(0),
+        'revenue': pd.to_numeric(pd.Series(revenue, dtype='object'), errors='coerce').fillna(0),
+        # Factorize document refs once into int32 codes: every distinct-check
+        # count below then hashes small ints instead of 16-byte refs
+        'recorder': pd.factorize(pd.Series([bytes(r) for r in recorder], dtype='object'))[0],
+    }).astype(SCHEMA)
+    
+    log_memory("Extract (typed)", df)
     return df
 
 
@@ -131,102 +182,91 @@ def extract_sales_data(cursor) -> pd.DataFrame:
 # DATA TRANSFORMATION
 # ═══════════════════════════════════════════════════════════════════════════════
 
+# Pattern: "Group.Season" or "Group Season" or just "Group"
+GROUP_PATTERNS = [
+    'Аксессуары', 'Брюки', 'Дети', 'Джемпер', 'Куртки', 
+    'Обувь', 'Платье', 'Рубашки', 'Сопутка', 'Спорт',
+    'Текстиль', 'Трикотаж', 'АКЦИЯ', 'Наволочка', 'Пододеяльник',
+    'Простыня', 'Полотенце'
+]
+
+
+def extract_group(product_name):
+    """Product group from a product name."""
+    name = str(product_name).strip()
+    
+    for pattern in GROUP_PATTERNS:
+        if pattern.lower() in name.lower():
+            # Return full category including season if present
+            if '.' in name:
+                parts = name.split('.')
+                return parts[0].strip()
+            elif ' ' in name:
+                # Check for known season suffixes
+                for season in ['Зима', 'Лето', 'Всесезон']:
+                    if season in name:
+                        idx = name.find(season)
+                        return name[:idx].strip().rstrip('.')
+            return pattern
+    
+    # If no pattern matches, use first word or full name
+    if len(name) > 30:
+        return name.split()[0] if ' ' in name else name[:30]
+    return name
+
+
+def get_unit_type(unit):
+    """'kg' for weight units, else 'pcs'."""
+    unit_str = str(unit).lower().strip()
+    if 'кг' in unit_str or 'kg' in unit_str:
+        return 'kg'
+    return 'pcs'
+
+
 def transform_data(df: pd.DataFrame) -> pd.DataFrame:
     """
     Apply business logic transformations:
-    - Convert dates (subtract 2000 years)
-    - Extract product groups
     - Calculate date dimensions (week, month, quarter, year)
+    - Extract product groups
     - Handle unit types (pcs vs kg)
+    
+    Dates already arrive as datetime64 (Postgres stores real dates, no
+    2000-year offset) and missing stores are filled at extraction.
+    Per-name logic runs once per category, not once per row.
     """
     log.info("Transforming data...")
     
-    # 1. Convert dates (subtract 2000 years)
-    # Handle 1C dates manually since they're in year 4025
-    def convert_1c_date(dt_1c):
-        return pd.to_datetime(dt_1c)
-    
-    df['sale_date'] = df['sale_date_1c'].apply(convert_1c_date)
-    
-    # 2. Extract date dimensions
-    df['date'] = df['sale_date'].dt.date
-    df['day'] = df['sale_date'].dt.day
-    df['week'] = df['sale_date'].dt.isocalendar().week.astype(int)
-    df['month'] = df['sale_date'].dt.month
-    df['quarter'] = df['sale_date'].dt.quarter
-    df['year'] = df['sale_date'].dt.year
-    df['weekday'] = df['sale_date'].dt.day_name()
-    
-    # 3. Handle missing stores (use warehouse name)
-    df['store'] = df['store'].fillna(df['warehouse'])
-    
-    # 4. Extract product group from product name
-    # Pattern: "Group.Season" or "Group Season" or just "Group"
-    def extract_group(product_name):
-        if pd.isna(product_name):
-            return 'Без группы'
-        
-        name = str(product_name).strip()
-        
-        # Common patterns
-        patterns = [
-            'Аксессуары', 'Брюки', 'Дети', 'Джемпер', 'Куртки', 
-            'Обувь', 'Платье', 'Рубашки', 'Сопутка', 'Спорт',
-            'Текстиль', 'Трикотаж', 'АКЦИЯ', 'Наволочка', 'Пододеяльник',
-            'Простыня', 'Полотенце'
-        ]
-        
-        for pattern in patterns:
-            if pattern.lower() in name.lower():
-                # Return full category including season if present
-                if '.' in name:
-                    parts = name.split('.')
-                    return parts[0].strip()
-                elif ' ' in name:
-                    # Check for known season suffixes
-                    for season in ['Зима', 'Лето', 'Всесезон']:
-                        if season in name:
-                            idx = name.find(season)
-                            return name[:idx].strip().rstrip('.')
-                return pattern
-        
-        # If no pattern matches, use first word or full name
-        if len(name) > 30:
-            return name.split()[0] if ' ' in name else name[:30]
-        return name
-    
-    df['product_group'] = df['product'].apply(extract_group)
-    
-    # 5. Convert numeric columns
-    df['quantity'] = pd.to_numeric(df['quantity'], errors='coerce').fillna(0)
-    df['revenue'] = pd.to_numeric(df['revenue'], errors='coerce').fillna(0)
-    
-    # 6. Determine unit type (pcs vs kg) based on ACTUAL unit from database
-    def get_unit_type(unit):
-        if pd.isna(unit):
-            return 'pcs'  # Default to pcs if no unit specified
-        unit_str = str(unit).lower().strip()
-        if 'кг' in unit_str or 'kg' in unit_str:
-            return 'kg'
-        return 'pcs'
-    
-    df['unit_type'] = df['unit'].apply(get_unit_type)
+    # 1. Date dimensions: day ordinal as datetime64, small ints, ordered weekday
+    sale_date = df['sale_date'].dt
+    df['date'] = sale_date.normalize()
+    df['day'] = sale_date.day.astype('int8')
+    df['week'] = sale_date.isocalendar().week.astype('int8')
+    df['month'] = sale_date.month.astype('int8')
+    df['quarter'] = sale_date.quarter.astype('int8')
+    df['year'] = sale_date.year.astype('int16')
+    df['weekday'] = pd.Categorical(sale_date.day_name(), categories=WEEKDAYS, ordered=True)
+    
+    # 2. Extract product group from product name
+    df['product_group'] = map_categories(df['product'], extract_group, 'Без группы')
+    
+    # 3. Determine unit type (pcs vs kg) based on ACTUAL unit from database
+    #    (no unit specified → pcs)
+    df['unit_type'] = map_categories(df['unit'], get_unit_type, 'pcs')
     
     # Log unit distribution
     unit_counts = df['unit_type'].value_counts()
     log.info(f"Unit distribution: kg={unit_counts.get('kg', 0):,}, pcs={unit_counts.get('pcs', 0):,}")
     
-    # 7. Split quantity into pcs and kg
+    # 4. Split quantity into pcs and kg
     # VERIFIED: All distinct quantities in DB are integers. Quantity is ALWAYS pieces.
     # Unit 'kg' just implies 'priced by weight items' or 'category'.
     df['quantity_pcs'] = df['quantity']
     
     # Keep kg separate if needed for specific weight reporting, but it implies count of weight-items
-    df['quantity_kg'] = df.apply(
-        lambda x: x['quantity'] if x['unit_type'] == 'kg' else 0, axis=1
-    )
+    df['quantity_kg'] = df['quantity'].where(df['unit_type'] == 'kg', 0).astype('float32')
     
     log.info(f"Transformation complete. Records: {len(df):,}")
+    log_memory("Transform", df)
     
     return df
 
@@ -235,6 +275,11 @@ def transform_data(df: pd.DataFrame) -> pd.DataFrame:
 # AGGREGATION
 # ═══════════════════════════════════════════════════════════════════════════════
 
+def average_check(frame: pd.DataFrame) -> pd.Series:
+    """revenue / checks, 0 where there are no checks."""
+    return (frame['revenue'] / frame['checks'].where(frame['checks'] > 0)).fillna(0)
+
+
 def aggregate_data(df: pd.DataFrame) -> dict:
     """
     Aggregate data into various views for reporting.
@@ -250,25 +295,23 @@ def aggregate_data(df: pd.DataFrame) -> dict:
     results = {}
     
     # 1. Daily Groups (main granularity)
-    daily_groups = df.groupby(['date', 'store', 'product_group']).agg({
+    daily_groups = df.groupby(['date', 'store', 'product_group'], observed=True).agg({
         'revenue': 'sum',
         'quantity_pcs': 'sum',
         'quantity_kg': 'sum',
-        'recorder': 'nunique'  # Unique checks
+        'recorder': 'nunique'  # Unique checks (integer codes)
     }).reset_index()
     
     daily_groups.columns = ['date', 'store', 'product_group', 'revenue', 
                            'quantity_pcs', 'quantity_kg', 'checks']
     
     # Calculate average check (handle division by zero)
-    daily_groups['avg_check'] = daily_groups.apply(
-        lambda x: x['revenue'] / x['checks'] if x['checks'] > 0 else 0, axis=1
-    )
+    daily_groups['avg_check'] = average_check(daily_groups)
     
     results['daily_groups'] = daily_groups
     
     # 2. By Store
-    by_store = df.groupby('store').agg({
+    by_store = df.groupby('store', observed=True).agg({
         'revenue': 'sum',
         'quantity_pcs': 'sum',
         'quantity_kg': 'sum',
@@ -276,15 +319,13 @@ def aggregate_data(df: pd.DataFrame) -> dict:
     }).reset_index()
     
     by_store.columns = ['store', 'revenue', 'quantity_pcs', 'quantity_kg', 'checks']
-    by_store['avg_check'] = by_store.apply(
-        lambda x: x['revenue'] / x['checks'] if x['checks'] > 0 else 0, axis=1
-    )
+    by_store['avg_check'] = average_check(by_store)
     by_store = by_store.sort_values('revenue', ascending=False)
     
     results['by_store'] = by_store
     
     # 3. By Product Group
-    by_group = df.groupby('product_group').agg({
+    by_group = df.groupby('product_group', observed=True).agg({
         'revenue': 'sum',
         'quantity_pcs': 'sum',
         'quantity_kg': 'sum',
@@ -301,7 +342,7 @@ def aggregate_data(df: pd.DataFrame) -> dict:
     results['by_group'] = by_group
     
     # 4. Store × Group
-    by_store_group = df.groupby(['store', 'product_group']).agg({
+    by_store_group = df.groupby(['store', 'product_group'], observed=True).agg({
         'revenue': 'sum',
         'quantity_pcs': 'sum',
         'quantity_kg': 'sum'
@@ -313,6 +354,7 @@ def aggregate_data(df: pd.DataFrame) -> dict:
     results['by_store_group'] = by_store_group
     
     log.info(f"Aggregation complete. Store count: {len(by_store)}, Group count: {len(by_group)}")
+    log_memory("Aggregate", *results.values())
     
     return results
 
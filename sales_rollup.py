@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+Sales Rollup: every aggregate of an ad-hoc report from ONE register scan
+═══════════════════════════════════════════════════════════════════════════════
+
+Reports used to run one GROUP BY per view (grand total, per warehouse, per
+product, warehouse × product, ...), each a full pass over _AccumRg53715 for
+the period. build_query() puts all requested views into one
+GROUP BY GROUPING SETS query; GROUPING() flags tell which set a result row
+belongs to, so a real NULL (e.g. a product without a name) is not confused
+with a rolled-up one.
+
+  report = run_report(cursor, source, '2025-12-01', '2026-01-01',
+                      sets=[(), ('warehouse',), ('warehouse', 'product')])
+  report.totals                          → Measures(quantity, revenue, records)
+  report.by('warehouse')                 → {warehouse: Measures}
+  report.by('warehouse', 'product')      → {(warehouse, product): Measures}
+
+Dates are real dates on both chains; the Source (see onec_source) handles
+the dialect and the MS SQL +2000 year offset. GROUPING SETS and GROUPING()
+exist in Postgres and MS SQL alike.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+from collections import namedtuple
+
+from onec_metadata import table, column
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONFIGURATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+DIMENSIONS = {
+    'store': "COALESCE(m._Description, w._Description)",
+    'warehouse': "w._Description",
+    'product': "n._Description",
+}
+
+# Grand total, one level per dimension, and the warehouse × product detail
+DEFAULT_SETS = [(), ('store',), ('warehouse',), ('product',), ('warehouse', 'product')]
+
+QUANTITY_COL = column('sales', 'quantity')
+REVENUE_COL = column('sales', 'revenue')
+
+Measures = namedtuple('Measures', 'quantity revenue records')
+
+
+class SalesReport:
+    """Aggregates of one rollup scan, keyed by grouping set."""
+
+    def __init__(self, sets):
+        self.sets = [_ordered(s) for s in sets]
+        self.groups = {s: {} for s in self.sets}
+
+    @property
+    def totals(self):
+        return self.groups[()].get((), Measures(0.0, 0.0, 0))
+
+    def by(self, *dims):
+        """{value: Measures} for one dimension, {(v1, v2, ...): Measures} for several."""
+        rows = self.groups[_ordered(dims)]
+        if len(dims) == 1:
+            return {k[0]: v for k, v in rows.items()}
+        # keys follow the order the caller asked for
+        order = [_ordered(dims).index(x) for x in dims]
+        return {tuple(k[i] for i in order): v for k, v in rows.items()}
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# QUERY
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _ordered(dims):
+    """Dimensions in DIMENSIONS order (the column order of the query)."""
+    return tuple(d for d in DIMENSIONS if d in dims)
+
+
+def _dims_of(sets):
+    return [d for d in DIMENSIONS if any(d in s for s in sets)]
+
+
+def build_query(source, sets=DEFAULT_SETS, store_pattern=None):
+    """
+    One GROUPING SETS query over the period [%(start)s, %(end)s).
+
+    `store_pattern` (LIKE, bound as %(store)s) keeps warehouses whose own or
+    parent store name matches, e.g. '%Большевик%'.
+    """
+    dims = _dims_of(sets)
+    to_float = source.dialect['float'].format
+    grouping_sets = ", ".join(
+        f"({', '.join(DIMENSIONS[x] for x in s)})" for s in sets)
+
+    select = [f"{DIMENSIONS[x]} AS {x}" for x in dims]
+    select += [f"GROUPING({DIMENSIONS[x]}) AS g_{x}" for x in dims]
+    select += [
+        f"{to_float(f'SUM(s.{QUANTITY_COL})')} AS quantity",
+        f"{to_float(f'SUM(s.{REVENUE_COL})')} AS revenue",
+        "COUNT(*) AS records",
+    ]
+    columns = ",\n        ".join(select)
+    store_filter = ("\n      AND (w._Description LIKE %(store)s OR m._Description LIKE %(store)s)"
+                    if store_pattern else "")
+
+    return f"""
+    SELECT
+        {columns}
+    FROM {table('sales')} s
+    INNER JOIN {table('warehouses')} w ON s.{column('sales', 'warehouse')} = w._IDRRef
+    LEFT JOIN {table('warehouses')} m ON w._ParentIDRRef = m._IDRRef
+    LEFT JOIN {table('nomenclature')} n ON s.{column('sales', 'nomenclature')} = n._IDRRef
+    WHERE s._Period >= %(start)s AND s._Period < %(end)s{store_filter}
+    GROUP BY GROUPING SETS ({grouping_sets})
+    """
+
+
+def run_report(cursor, source, start, end, sets=DEFAULT_SETS, store_pattern=None):
+    """Run the rollup for real dates [start, end) and return a SalesReport."""
+    dims = _dims_of(sets)
+    report = SalesReport(sets)
+    cursor.execute(build_query(source, sets, store_pattern), {
+        'start': source.to_source_period(start),
+        'end': source.to_source_period(end),
+        'store': store_pattern,
+    })
+    n = len(dims)
+    for row in cursor.fetchall():
+        values, flags, (qty, rev, records) = row[:n], row[n:2 * n], row[2 * n:]
+        grouped = tuple(x for x, g in zip(dims, flags) if not g)
+        key = tuple(v for v, g in zip(values, flags) if not g)
+        report.groups[grouped][key] = Measures(float(qty or 0), float(rev or 0), int(records))
+    return report
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+Scheduler: per-job cadence, dependencies and skip hooks from one tick
+═══════════════════════════════════════════════════════════════════════════════
+
+modal_sync used to run inventory, sales and visitors together on one cron
+(`0 6-18 * * *`), plus the tombstone pass on the 06:00 tick. Inventory
+changes slowly, sales constantly, and visitors arrive in bursts. Now one
+frequent Modal tick calls tick(), and the job table below decides what runs:
+
+  every       minimum minutes between runs
+  daily_at    once per UTC day, on the first tick at or after this hour
+  hours       UTC hours in which the job may run
+  after       jobs that must finish first when due in the same tick; the
+              job waits for them and is blocked if one of them fails
+  unchanged   skip hook: cursor → fingerprint. A due job whose fingerprint
+              equals the one of its last run is skipped (and checked again
+              on the next tick) until `max_skip` minutes have passed
+  pool        concurrency pool (POOLS gives the number of slots)
+
+Due jobs are decided from the state alone (due_jobs()), so a tick with
+nothing due never opens the tunnel to 1C. A job's `every` counts from the
+tick that ran it, so the cadence does not drift with job duration. A failed
+job stays due and is retried on the next tick.
+
+The check counts and store × day rollups are part of the sales job itself
+(see sync_to_supabase); the nightly reconciliation runs after it.
+
+  python sync.py schedule            # one tick (what Modal runs)
+  python sync.py schedule --dry-run  # print what is due, run nothing
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import date, datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from run_metrics import record_run
+from sync_state import load_state, save_state
+from onec_metadata import table
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONFIGURATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+BUDGET_SECONDS = float(os.getenv('SCHEDULER_BUDGET', 3000))      # no new job starts after this
+TICK_SLACK_SECONDS = 60                                          # cron jitter when comparing cadence
+
+# Concurrent jobs per pool (each 1C job holds one 1C connection at a time)
+POOLS = {
+    'onec': int(os.getenv('SCHEDULER_ONEC_SLOTS', 2)),
+}
+
+STATE_NAME = 'scheduler'
+
+BUSINESS_HOURS = range(6, 19)        # 09:00–21:00 MSK (UTC+3)
+
+log = logging.getLogger(__name__)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# SKIP HOOKS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def register_watermark(name):
+    """Skip hook: (max _Period, rows since midnight) of a 1C register."""
+    register = table(name)
+
+    def hook(cursor):
+        since = datetime.combine(date.today(), datetime.min.time())
+        cursor.execute(f"SELECT max(_Period), count(*) FROM {register} WHERE _Period >= %s", (since,))
+        max_period, rows = cursor.fetchone()
+        return [max_period.isoformat() if max_period else None, int(rows)]
+
+    return hook
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# JOB TABLE
+# ═══════════════════════════════════════════════════════════════════════════════
+# name: spec; `command` is the sync.py argv of the job
+
+JOBS = {
+    'inventory': {
+        'command': ['inventory'],
+        'every': 120, 'hours': BUSINESS_HOURS,
+        'unchanged': register_watermark('stock'), 'max_skip': 360,
+        'pool': 'onec',
+    },
+    'sales': {
+        'command': ['sales'],
+        'every': 20, 'hours': BUSINESS_HOURS,
+        'unchanged': register_watermark('sales'), 'max_skip': 180,
+        'pool': 'onec',
+    },
+    'visitors': {
+        'command': ['visitors'],
+        'every': 10, 'hours': BUSINESS_HOURS,
+        'unchanged': register_watermark('visitors'), 'max_skip': 180,
+        'pool': 'onec',
+    },
+    'tombstones': {
+        'command': ['tombstones'],
+        'daily_at': 6, 'after': ['sales'],
+        'pool': 'onec',
+    },
+    'reconcile': {
+        'command': ['reconcile'],
+        'daily_at': 0, 'after': ['sales', 'tombstones'],
+        'pool': 'onec',
+    },
+}
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# PLANNING
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _utc_now():
+    return datetime.now(timezone.utc)
+
+
+def _since(state, key, now):
+    """Seconds since the ISO timestamp state[key] (None if never)."""
+    value = state.get(key)
+    return (now - datetime.fromisoformat(value)).total_seconds() if value else None
+
+
+def is_due(spec, state, now):
+    """Whether the cadence of `spec` asks for a run at `now` (UTC)."""
+    hours = spec.get('hours')
+    if hours is not None and now.hour not in hours:
+        return False
+    if 'daily_at' in spec:
+        last = state.get('last_run')
+        return now.hour >= spec['daily_at'] and (not last or datetime.fromisoformat(last).date() < now.date())
+    elapsed = _since(state, 'last_run', now)
+    return elapsed is None or elapsed >= spec['every'] * 60 - TICK_SLACK_SECONDS
+
+
+def due_jobs(now=None, jobs=None):
+    """Names of due jobs, in job-table order; needs no 1C connection."""
+    now = now or _utc_now()
+    state = load_state(STATE_NAME) or {}
+    return [name for name, spec in JOBS.items()
+            if (jobs is None or name in jobs) and is_due(spec, state.get(name, {}), now)]
+
+
+def _dependencies(name, due):
+    return [dep for dep in JOBS[name].get('after', []) if dep in due]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# TICK
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class _Tick:
+    """State of one tick: results, pool slots and the scheduler state file."""
+
+    def __init__(self, now):
+        self.now = now
+        self.state = load_state(STATE_NAME) or {}
+        self.results = {}
+        self.busy = {pool: 0 for pool in POOLS}
+        self.lock = threading.Lock()
+
+    def job_state(self, name):
+        return self.state.setdefault(name, {})
+
+    def finish(self, name, status, **fields):
+        with self.lock:
+            self.results[name] = status
+            self.job_state(name).update(fields, status=status)
+            save_state(STATE_NAME, self.state)
+
+
+def check_unchanged(name, cursor, tick):
+    """Run the skip hook of `name`; returns (skip, fingerprint)."""
+    spec, state = JOBS[name], tick.job_state(name)
+    hook = spec.get('unchanged')
+    if hook is None or cursor is None:
+        return False, None
+    try:
+        fingerprint = hook(cursor)
+    except Exception as e:
+        log.warning(f"[{name}] skip hook failed, running anyway: {e}")
+        return False, None
+    if fingerprint != state.get('fingerprint'):
+        return False, fingerprint
+    ran = _since(state, 'last_run', tick.now)
+    if ran is not None and ran >= spec.get('max_skip', 0) * 60:
+        log.info(f"🔎 [{name}] Unchanged, but last run was {ran / 60:.0f} min ago — running anyway")
+        return False, fingerprint
+    return True, fingerprint
+
+
+def tick(now=None, jobs=None, run_job=None, connect=None, dry_run=False):
+    """
+    Run the due jobs of this tick (optionally only `jobs`) and return
+    {job: status}, status being ok / failed / unchanged / blocked / deferred.
+
+    `run_job(command) → exit code` and `connect() → 1C connection` default
+    to sync.run and the Postgres source. Only exit code 0 counts as ok: the
+    jobs return 1 for partial runs (failed rows or deletes), which are then
+    retried on the next tick. With `dry_run`, only log what is due.
+    """
+    started = time.monotonic()
+    now = now or _utc_now()
+    due = due_jobs(now, jobs)
+    if not due:
+        log.info("💤 Scheduler: nothing due")
+        return {}
+    log.info(f"🗓  Scheduler tick {now:%H:%M} UTC: due {', '.join(due)}")
+    if dry_run:
+        for name in due:
+            deps = _dependencies(name, due)
+            log.info(f"    {name:<11} {' '.join(JOBS[name]['command'])}"
+                     + (f"  (after {', '.join(deps)})" if deps else ""))
+        return {name: 'due' for name in due}
+
+    if run_job is None:
+        import sync
+        run_job = sync.run
+    if connect is None:
+        import onec_source
+        connect = onec_source.get_source('postgres').connect
+
+    t = _Tick(now)
+    conn = None
+    try:
+        conn = connect()
+        conn.autocommit = True
+    except Exception as e:
+        log.warning(f"Scheduler: no 1C connection for the skip hooks ({e}), running all due jobs")
+
+    def execute(name, fingerprint):
+        t0 = time.perf_counter()
+        try:
+            ok = run_job(list(JOBS[name]['command'])) == 0
+        except Exception as e:
+            log.error(f"[{name}] failed: {e}")
+            ok = False
+        seconds = round(time.perf_counter() - t0, 1)
+        if ok:
+            t.finish(name, 'ok', last_run=now.isoformat(), fingerprint=fingerprint, seconds=seconds, failures=0)
+        else:
+            t.finish(name, 'failed', seconds=seconds, failures=t.job_state(name).get('failures', 0) + 1)
+        log.info(f"{'✅' if ok else '❌'} [{name}] {seconds}s")
+
+    pending = list(due)
+    running = {}
+    try:
+        with ThreadPoolExecutor(max_workers=sum(POOLS.values())) as pool:
+            while pending or running:
+                for name in list(pending):
+                    deps = _dependencies(name, due)
+                    if any(t.results.get(dep) in ('failed', 'blocked', 'deferred') for dep in deps):
+                        pending.remove(name)
+                        t.finish(name, 'blocked')
+                        log.warning(f"⛔ [{name}] blocked: {', '.join(d for d in deps if t.results.get(d) != 'ok')}")
+                        continue
+                    if any(dep not in t.results for dep in deps):
+                        continue
+                    if time.monotonic() - started > BUDGET_SECONDS:
+                        pending.remove(name)
+                        t.finish(name, 'deferred')
+                        log.warning(f"⏳ [{name}] deferred to the next tick (budget {BUDGET_SECONDS:.0f}s spent)")
+                        continue
+                    slot = JOBS[name].get('pool', 'onec')
+                    if t.busy[slot] >= POOLS[slot]:
+                        continue
+
+                    skip, fingerprint = check_unchanged(name, conn.cursor() if conn else None, t)
+                    pending.remove(name)
+                    if skip:
+                        t.finish(name, 'unchanged')
+                        log.info(f"⏭  [{name}] unchanged since its last run")
+                        continue
+                    t.busy[slot] += 1
+                    log.info(f"▶️  [{name}] {' '.join(JOBS[name]['command'])}")
+                    running[pool.submit(execute, name, fingerprint)] = (name, slot)
+
+                if not running:
+                    if pending:
+                        # Only jobs waiting on each other are left (a cycle in `after`)
+                        for name in pending:
+                            t.finish(name, 'blocked')
+                        log.error(f"Scheduler: dependency cycle among {', '.join(pending)}")
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    _, slot = running.pop(future)
+                    t.busy[slot] -= 1
+    finally:
+        if conn is not None:
+            conn.close()
+
+    seconds = round(time.monotonic() - started, 1)
+    failed = [name for name, status in t.results.items() if status in ('failed', 'blocked')]
+    log.info(f"🗓  Tick done in {seconds}s: " + ", ".join(f"{n} {s}" for n, s in t.results.items()))
+    record_run('scheduler', status='partial' if failed else 'ok', seconds=seconds, jobs=t.results)
+    return t.results
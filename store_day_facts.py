@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+Store × Day Facts: revenue, receipts and counter traffic in one table
+═══════════════════════════════════════════════════════════════════════════════
+
+The dashboard computed Трафик / Конверсия by filtering every visitor row per
+store row on each render and took receipts from a separate raw-row query.
+Supabase `store_day_facts` (migration_store_day_facts.sql) now holds one row
+per store and day, kept current by the two syncs that own its columns:
+
+  sales sync      refresh_sales(days)    revenue + sales_checks of the days
+                                         it touched, rebuilt inside Supabase
+                                         from sales_analytics and
+                                         sales_checks_daily
+  visitors sync   ship_visitors(facts)   checks / buyers / visitors from
+                                         _AccumRg53554, only store-days whose
+                                         values changed since the last run
+
+store_day_totals(p_start, p_end) sums a period per store, so the dashboard
+does a lookup by store.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+import logging
+
+import requests
+
+from sync_state import load_state, save_state
+from supabase_upload import upload_records
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONFIGURATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+RPC_DAYS = 31                        # days per refresh_store_day_sales call
+STATE_NAME = 'store_day_visitors'    # last shipped counter values per store-day
+VISITOR_COLUMNS = ('checks', 'buyers', 'visitors')
+
+log = logging.getLogger(__name__)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# SALES SIDE
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def refresh_sales(days, base_url, headers):
+    """Rebuild revenue and receipts of `days` (dates) in store_day_facts."""
+    days = sorted(days)
+    stats = {'days': len(days), 'rows': 0, 'errors': 0}
+    for i in range(0, len(days), RPC_DAYS):
+        chunk = days[i:i + RPC_DAYS]
+        try:
+            r = requests.post(f"{base_url}/rest/v1/rpc/refresh_store_day_sales", headers=headers,
+                              json={'p_days': [d.isoformat() for d in chunk]}, timeout=120)
+            r.raise_for_status()
+            stats['rows'] += int(r.json() or 0)
+        except requests.RequestException as e:
+            stats['errors'] += 1
+            log.error(f"  Store-day facts for {chunk[0]} … {chunk[-1]} failed: {e}")
+    log.info(f"🏪 Store-day facts: {stats['rows']:,} store-days refreshed for {stats['days']} days"
+             + (f", {stats['errors']} errors" if stats['errors'] else ""))
+    return stats
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# VISITORS SIDE
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _key(day, store):
+    return f"{day.isoformat()}|{store}"
+
+
+def changed_visitors(facts, since=None):
+    """
+    Rows of `facts` ({(date, store): (checks, buyers, visitors)}) that differ
+    from the last shipped state, plus zero rows for store-days that vanished.
+    `facts` covers the days from `since` (ISO date) on; earlier shipped days
+    are kept as they are. Returns (rows, new state).
+    """
+    shipped = load_state(STATE_NAME) or {}
+    current = {_key(day, store): [float(v or 0) for v in values]
+               for (day, store), values in facts.items()}
+
+    rows = []
+    for key, values in current.items():
+        if shipped.get(key) != values:
+            day, store = key.split('|', 1)
+            rows.append({'sale_date': day, 'store': store, **dict(zip(VISITOR_COLUMNS, values))})
+    for key in shipped.keys() - current.keys():
+        day, store = key.split('|', 1)
+        if since is None or day >= since:
+            rows.append({'sale_date': day, 'store': store, **dict.fromkeys(VISITOR_COLUMNS, 0)})
+    if since is not None:
+        current = {**{k: v for k, v in shipped.items() if k.split('|', 1)[0] < since}, **current}
+    return rows, current
+
+
+def ship_visitors(facts, base_url, headers, since=None):
+    """Upsert the counter columns of changed store-days (revenue is left alone)."""
+    rows, state = changed_visitors(facts, since)
+    if not rows:
+        log.info("🏪 Store-day facts: counter values unchanged")
+        return None
+
+    log.info(f"🏪 Store-day facts: {len(rows):,} changed store-days")
+    stats = upload_records(f"{base_url}/rest/v1/store_day_facts?on_conflict=sale_date,store", rows,
+                           {**headers, 'Prefer': 'resolution=merge-duplicates'}, label='store_days',
+                           idempotent=True)
+    if not stats['failed_rows']:
+        save_state(STATE_NAME, state)
+    return stats
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+Store Tree: warehouse → store → region from the full _Reference640 hierarchy
+═══════════════════════════════════════════════════════════════════════════════
+
+Every sales query used to resolve the store as
+COALESCE(m._Description, w._Description), i.e. ONE _ParentIDRRef hop,
+repeated that double join for every fact row and knew nothing of the
+region above the store.
+
+The reference is small (hundreds of rows), so it is read once and every
+parent chain is resolved in Python:
+
+  chain (root first)   Санкт-Петербург → Озерки → Магазин (Озерки) Торговый зал
+                       region            store    warehouse  (STORE_HOPS = 1)
+                                         Коломна  → Коломна ТЗ
+
+The store is picked per chain, counted from the warehouse end: warehouses
+are the leaves, and their store is the node STORE_HOPS levels above them
+(the root when the chain is shorter), its region the node above the store.
+The tree may mix depths (regional branches next to stores at the root),
+so there is no single absolute store depth. A group node that holds
+warehouses d levels below it is placed the same way (STORE_HOPS - d above
+itself); groups above the store level get no placement. STORE_HOPS = 2
+attributes warehouses kept in sub-groups of their store.
+
+The resolved nodes are cached in sync state `store_tree` together with a
+change probe (row count + checksum of ref:_Version): an unchanged reference is not read
+again. Extraction selects the raw warehouse ref and maps it through
+StoreTree.placements (ref bytes → Placement), with no join at all.
+StoreTree.digest changes only when the (warehouse, store) names a sales
+row carries change (a renamed or moved store), which the sales sync takes
+as a reason for a full rescan.
+
+  python store_tree.py            # print region → store → warehouses
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+import os
+import sys
+import hashlib
+import logging
+from collections import namedtuple
+
+from sync_state import load_state, save_state
+from onec_metadata import table, column
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONFIGURATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Levels between a warehouse (leaf) and its store
+STORE_HOPS = int(os.getenv('STORE_HOPS', 1))
+
+STATE_NAME = 'store_tree'
+WAREHOUSES = table('warehouses')
+PARENT_REF = column('warehouses', 'parent')
+
+Placement = namedtuple('Placement', 'warehouse store region')
+
+log = logging.getLogger(__name__)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# TREE
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class StoreTree:
+    """Resolved _Reference640 hierarchy: ref bytes → Placement."""
+
+    def __init__(self, nodes, hops=STORE_HOPS):
+        self.nodes = nodes                 # ref → (parent ref, description)
+        self.hops = hops
+        self.leaf_distance = leaf_distances(nodes)
+        self.placements = {}
+        for ref in nodes:
+            placement = self._place(ref)
+            if placement and placement.store:
+                self.placements[ref] = placement
+        # What the sales rows carry: (warehouse, store) per ref
+        self.digest = hashlib.md5(repr(sorted(
+            (ref.hex(), p.warehouse, p.store) for ref, p in self.placements.items())).encode()).hexdigest()[:16]
+
+    def chain(self, ref):
+        """Refs from the root down to `ref` (cycles and dangling parents end it)."""
+        chain, seen = [], set()
+        while ref in self.nodes and ref not in seen:
+            seen.add(ref)
+            chain.append(ref)
+            ref = self.nodes[ref][0]
+        return chain[::-1]
+
+    def _place(self, ref):
+        up = self.hops - self.leaf_distance.get(ref, 0)
+        if up < 0:
+            return None                    # a group above the store level
+        names = [self.nodes[r][1] for r in self.chain(ref)]
+        i = max(len(names) - 1 - up, 0)
+        return Placement(names[-1], names[i] or names[-1], names[i - 1] if i > 0 else None)
+
+    def refs(self, store=None):
+        """Warehouse refs that have a store (or belong to `store`)."""
+        return [ref for ref, p in self.placements.items() if store is None or p.store == store]
+
+    def stores(self):
+        return sorted({p.store for p in self.placements.values()})
+
+
+def leaf_distances(nodes):
+    """ref → levels down to its nearest leaf (0 for warehouses, 1 for their groups, ...)."""
+    children = {}
+    for ref, (parent, _) in nodes.items():
+        if parent in nodes and parent != ref:
+            children.setdefault(parent, []).append(ref)
+    distance = {ref: 0 for ref in nodes if ref not in children}
+    frontier, level = list(distance), 0
+    while frontier:
+        level += 1
+        parents = {nodes[ref][0] for ref in frontier} & children.keys()
+        frontier = [ref for ref in parents if ref not in distance]
+        distance.update((ref, level) for ref in frontier)
+    return distance
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# LOADING (cached behind a change probe)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def probe(cursor):
+    """(row count, Σ hash of ref:_Version): any added, edited or removed node changes it."""
+    cursor.execute(f"""
+    SELECT COUNT(*),
+           COALESCE(SUM(('x' || substr(md5(encode(_IDRRef, 'hex') || ':' || _Version::text), 1, 8))::bit(32)::bigint), 0)
+    FROM {WAREHOUSES}
+    """)
+    count, checksum = cursor.fetchone()
+    return [int(count), int(checksum)]
+
+
+def read_nodes(cursor):
+    cursor.execute(f"SELECT _IDRRef, {PARENT_REF}, _Description FROM {WAREHOUSES}")
+    return {bytes(ref): (bytes(parent) if parent else None, name)
+            for ref, parent, name in cursor.fetchall()}
+
+
+def load_tree(cursor, hops=STORE_HOPS, save=True):
+    """
+    StoreTree from the cache if the reference did not change, else from 1C
+    (and cached, unless `save` is false, e.g. for --plan).
+    """
+    fingerprint = probe(cursor)
+    cached = load_state(STATE_NAME)
+    if cached and cached.get('probe') == fingerprint:
+        nodes = {bytes.fromhex(ref): (bytes.fromhex(parent) if parent else None, name)
+                 for ref, (parent, name) in cached['nodes'].items()}
+        source = "cache"
+    else:
+        nodes = read_nodes(cursor)
+        if save:
+            save_state(STATE_NAME, {
+                'probe': fingerprint,
+                'nodes': {ref.hex(): [parent.hex() if parent else None, name]
+                          for ref, (parent, name) in nodes.items()},
+            })
+        source = "1C"
+
+    tree = StoreTree(nodes, hops)
+    log.info(f"🏬 Store tree ({source}): {len(tree.nodes)} nodes, "
+             f"{len(tree.stores())} stores {tree.hops} level(s) above their warehouses")
+    return tree
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CLI
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def main(argv=None):
+    import psycopg2
+    from sync_to_supabase import DB_CONFIG
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        tree = load_tree(conn.cursor())
+    finally:
+        conn.close()
+
+    by_store = {}
+    for p in tree.placements.values():
+        by_store.setdefault((p.region or '', p.store), []).append(p.warehouse)
+    for (region, store), warehouses in sorted(by_store.items()):
+        print(f"{region + ' → ' if region else ''}{store}")
+        for warehouse in sorted(warehouses):
+            print(f"    {warehouse}")
+    print(f"\n{len(by_store)} stores, {len(tree.placements)} warehouses, "
+          f"STORE_HOPS {tree.hops}, digest {tree.digest}")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)s | %(message)s',
+                        datefmt='%H:%M:%S', stream=sys.stdout)
+    sys.exit(main())
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+Supabase REST Uploader with Adaptive Batching
+═══════════════════════════════════════════════════════════════════════════════
+
+Shared by sync_to_supabase, sync_visitors and custom_inventory_sync.
+
+Batches are cut by serialized size in bytes, not by row count, so wide sales
+rows and tiny visitor rows both land near the same request size. The byte
+target is then tuned after every request:
+  - error / timeout        → halve the target and retry the batch
+  - latency > target       → shrink proportionally
+  - latency < target / 2   → grow by 1.5x
+always clamped to [UPLOAD_MIN_BATCH_BYTES, UPLOAD_MAX_BATCH_BYTES].
+
+Bounds are configurable via environment variables (see CONFIGURATION).
+
+Bodies are encoded and gzip-compressed by `serialization`. If a host
+rejects a compressed request (400/415) before any gzip body was accepted,
+the same body is resent uncompressed; only if that succeeds is gzip
+switched off for the host, for the rest of the process (all later
+upload_records() calls, e.g. every pipeline page). A genuine 400 fails
+both ways and leaves gzip on.
+
+A batch is only resent after an outcome that may have been committed (read
+timeout, dropped connection, 502/504 from the gateway) when the caller
+declares the write `idempotent` (an upsert on a key). A plain INSERT would
+store such a batch twice, so its rows are counted as failed instead.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+import os
+import time
+import logging
+import threading
+from urllib.parse import urlsplit
+
+import requests
+
+from serialization import encode_row, compress_body, GZIP_ENABLED
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONFIGURATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+MIN_BATCH_BYTES = int(os.getenv('UPLOAD_MIN_BATCH_BYTES', 32 * 1024))
+MAX_BATCH_BYTES = int(os.getenv('UPLOAD_MAX_BATCH_BYTES', 4 * 1024 * 1024))
+START_BATCH_BYTES = int(os.getenv('UPLOAD_START_BATCH_BYTES', 256 * 1024))
+MAX_BATCH_ROWS = int(os.getenv('UPLOAD_MAX_BATCH_ROWS', 5000))
+TARGET_LATENCY = float(os.getenv('UPLOAD_TARGET_LATENCY', 2.0))  # seconds per request
+MAX_RETRIES = int(os.getenv('UPLOAD_MAX_RETRIES', 2))            # per batch
+REQUEST_TIMEOUT = float(os.getenv('UPLOAD_REQUEST_TIMEOUT', 60))
+
+log = logging.getLogger(__name__)
+
+# host → True (a gzip body was accepted) / False (gzip rejected, sent plain)
+_gzip_hosts = {}
+_gzip_lock = threading.Lock()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# BATCH SIZING
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class AdaptiveBatcher:
+    """Holds the current batch byte target and adjusts it from request feedback."""
+
+    def __init__(self, min_bytes=MIN_BATCH_BYTES, max_bytes=MAX_BATCH_BYTES,
+                 start_bytes=START_BATCH_BYTES, max_rows=MAX_BATCH_ROWS,
+                 target_latency=TARGET_LATENCY):
+        self.min_bytes = min_bytes
+        self.max_bytes = max(max_bytes, min_bytes)
+        self.max_rows = max_rows
+        self.target_latency = target_latency
+        self.target_bytes = self._clamp(start_bytes)
+        self._lock = threading.Lock()     # shared by the pipeline's uploader threads
+
+    def _clamp(self, value):
+        return int(min(self.max_bytes, max(self.min_bytes, value)))
+
+    def observe(self, latency, ok):
+        """Update the byte target after one request."""
+        with self._lock:
+            if not ok:
+                self.target_bytes = self._clamp(self.target_bytes / 2)
+            elif latency > self.target_latency:
+                self.target_bytes = self._clamp(self.target_bytes * self.target_latency / latency)
+            elif latency < self.target_latency / 2:
+                self.target_bytes = self._clamp(self.target_bytes * 1.5)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# GZIP NEGOTIATION (per host, process-wide)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def gzip_enabled(host):
+    return GZIP_ENABLED and _gzip_hosts.get(host) is not False
+
+
+def _gzip_result(host, accepted):
+    with _gzip_lock:
+        if _gzip_hosts.get(host) is None:
+            _gzip_hosts[host] = accepted
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# UPLOAD
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def upload_records(url, records, headers, label='records', batcher=None, log_summary=True,
+                   idempotent=False):
+    """
+    POST `records` to a Supabase REST endpoint in adaptively sized batches.
+
+    Returns a stats dict suitable for run_metrics.record_run(upload=...):
+    rows, uploaded, failed_rows, errors, batches, bytes, seconds and the
+    chosen batch sizes (rows/bytes min/avg/max, final byte target).
+    Pass a shared `batcher` when uploading several chunks (e.g. pipeline
+    pages) so the tuned target carries over. Pass `idempotent=True` for
+    upserts, so batches with an unknown outcome are retried.
+    """
+    batcher = batcher or AdaptiveBatcher()
+    headers = {**headers, 'Content-Type': 'application/json'}
+
+    total = len(records)
+    stats = {
+        'rows': total, 'uploaded': 0, 'failed_rows': 0, 'errors': 0,
+        'batches': 0, 'bytes': 0, 'wire_bytes': 0, 'seconds': 0.0,
+    }
+    host = urlsplit(url).netloc
+    batch_rows = []
+    batch_bytes = []
+
+    started = time.perf_counter()
+    pos = 0
+    attempt = 0
+    pending = None  # encoded row that did not fit into the previous batch
+
+    while pos < total:
+        batch_start = pos
+        parts = []
+        size = 2  # brackets
+
+        while pos < total and len(parts) < batcher.max_rows:
+            part = pending if pending is not None else encode_row(records[pos])
+            pending = None
+            if parts and size + len(part) + 1 > batcher.target_bytes:
+                pending = part
+                break
+            parts.append(part)
+            size += len(part) + 1
+            pos += 1
+
+        body = b'[' + b','.join(parts) + b']'
+        wire_body, encoding_headers = compress_body(body, gzip_enabled(host))
+
+        t0 = time.perf_counter()
+        ok = False
+        uncertain = False   # the batch may have been committed anyway
+        try:
+            response = requests.post(url, headers={**headers, **encoding_headers},
+                                     data=wire_body, timeout=REQUEST_TIMEOUT)
+            ok = response.status_code in (200, 201, 204)
+            if not ok and encoding_headers and _gzip_hosts.get(host) is None \
+                    and response.status_code in (400, 415):
+                # Gzip unsupported, or a bad batch? The plain body decides
+                response = requests.post(url, headers=headers, data=body, timeout=REQUEST_TIMEOUT)
+                ok = response.status_code in (200, 201, 204)
+                if ok:
+                    log.warning(f"  [{label}] {host} rejected the gzip body, accepted it uncompressed: "
+                                f"sending uncompressed from now on")
+                    _gzip_result(host, False)
+                    wire_body, encoding_headers = body, {}
+            elif ok and encoding_headers:
+                _gzip_result(host, True)
+            if not ok:
+                uncertain = response.status_code in (502, 504)
+                log.error(f"  [{label}] Batch error: {response.status_code} - {response.text[:200]}")
+        except requests.RequestException as e:
+            uncertain = not isinstance(e, requests.ConnectTimeout)
+            log.error(f"  [{label}] Upload exception: {e}")
+        latency = time.perf_counter() - t0
+
+        batcher.observe(latency, ok)
+        stats['batches'] += 1
+
+        if ok:
+            attempt = 0
+            stats['uploaded'] += len(parts)
+            stats['bytes'] += len(body)
+            stats['wire_bytes'] += len(wire_body)
+            batch_rows.append(len(parts))
+            batch_bytes.append(len(body))
+            if stats['batches'] % 10 == 0:
+                log.info(f"  [{label}] Uploaded {stats['uploaded']:,} / {total:,} "
+                         f"(batch {len(parts)} rows, {len(body) / 1024:.0f} KB, {latency:.2f}s)")
+            continue
+
+        stats['errors'] += 1
+        if uncertain and not idempotent:
+            attempt = 0
+            stats['failed_rows'] += len(parts)
+            log.error(f"  [{label}] Not retrying {len(parts)} rows: the batch may have been stored "
+                      f"and a resent INSERT would duplicate it")
+        elif attempt < MAX_RETRIES:
+            attempt += 1
+            pos = batch_start
+            pending = None
+            log.warning(f"  [{label}] Retrying {len(parts)} rows with target "
+                        f"{batcher.target_bytes / 1024:.0f} KB (attempt {attempt}/{MAX_RETRIES})")
+        else:
+            attempt = 0
+            stats['failed_rows'] += len(parts)
+
+    stats['seconds'] = round(time.perf_counter() - started, 2)
+    if batch_rows:
+        stats['batch_rows_min'] = min(batch_rows)
+        stats['batch_rows_avg'] = round(sum(batch_rows) / len(batch_rows), 1)
+        stats['batch_rows_max'] = max(batch_rows)
+        stats['batch_bytes_avg'] = int(sum(batch_bytes) / len(batch_bytes))
+    stats['final_batch_bytes'] = batcher.target_bytes
+    stats['gzip'] = gzip_enabled(host)
+
+    if log_summary:
+        log.info(f"✅ [{label}] Upload complete: {stats['uploaded']:,} records, "
+                 f"{stats['errors']} errors, {stats['batches']} requests in {stats['seconds']}s")
+    return stats
+
+
+def merge_upload_stats(parts, label='records'):
+    """Combine the stats of several upload_records() calls into one dict."""
+    parts = [p for p in parts if p]
+    if not parts:
+        return None
+
+    merged = {k: sum(p[k] for p in parts)
+              for k in ('rows', 'uploaded', 'failed_rows', 'errors', 'batches', 'bytes', 'wire_bytes')}
+    merged['seconds'] = round(sum(p['seconds'] for p in parts), 2)  # upload busy time
+    sized = [p for p in parts if 'batch_rows_min' in p]
+    if sized:
+        merged['batch_rows_min'] = min(p['batch_rows_min'] for p in sized)
+        merged['batch_rows_avg'] = round(merged['uploaded'] / max(1, merged['batches'] - merged['errors']), 1)
+        merged['batch_rows_max'] = max(p['batch_rows_max'] for p in sized)
+        merged['batch_bytes_avg'] = int(merged['bytes'] / max(1, merged['batches'] - merged['errors']))
+    merged['final_batch_bytes'] = parts[-1]['final_batch_bytes']
+    merged['gzip'] = all(p['gzip'] for p in parts)
+
+    log.info(f"✅ [{label}] Upload complete: {merged['uploaded']:,} records, "
+             f"{merged['errors']} errors, {merged['batches']} requests")
+    return merged
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+Bonanza Sync CLI: one entry point for all 1C → Supabase jobs
+═══════════════════════════════════════════════════════════════════════════════
+
+Usage:
+  python sync.py sales [--full] [--restart] [--plan]
+  python sync.py inventory [YYYY-MM-DD] [--plan]
+  python sync.py visitors [--since YYYY-MM-DD] [--plan]
+  python sync.py report
+  python sync.py reconcile [--start D] [--end D] [--store S] [--dry-run]
+  python sync.py tombstones [--start D] [--end D] [--dry-run]
+  python sync.py daemon [--jobs sales visitors] [--poll S] [--max-runtime S]
+  python sync.py schedule [--jobs J ...] [--dry-run]
+
+Nothing heavy is imported at module level: psycopg2, requests and pandas are
+loaded only by the subcommand that needs them (e.g. pandas only for
+`report`). Logging is configured once here, and CLI startup plus job-module
+import time are logged and recorded in run metrics (job "startup"). CLI
+startup is only measured for a `python sync.py` process: when run() is
+called from an already running (or snapshot-restored) process such as the
+Modal job, the module-level start time is meaningless and is left out, and
+a job module that is already imported is recorded as `preloaded`.
+Every command runs under the shared run lock (run_lock.py), so a manual run
+cannot overlap the scheduled one; a busy lock exits with code 1. The daemon
+holds its own lock instead and takes the shared one per job run; `schedule`
+holds the shared lock for the whole tick and its jobs re-enter it.
+`--plan` only estimates the run (sync_plan.py) and takes no lock.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+import time
+
+_STARTED = time.perf_counter()
+
+import sys
+import logging
+import argparse
+import importlib
+from datetime import date, timedelta
+
+log = logging.getLogger("sync")
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# SUBCOMMANDS
+# ═══════════════════════════════════════════════════════════════════════════════
+# Each handler receives the lazily imported job module and the parsed args.
+
+def run_plan(job, **options):
+    import sync_plan
+    sync_plan.plan(job, **options)
+    return 0
+
+
+def run_sales(module, args):
+    if args.plan:
+        return run_plan('sales', full=args.full, resume=not args.restart)
+    return module.main(full=args.full, resume=not args.restart)
+
+
+def run_inventory(module, args):
+    if args.plan:
+        return run_plan('inventory', report_date=args.date)
+    return module.main(args.date)
+
+
+def run_visitors(module, args):
+    if args.plan:
+        return run_plan('visitors', start_date=args.since)
+    return module.main(args.since)
+
+
+def run_report(module, args):
+    return module.main()
+
+
+def run_reconcile(module, args):
+    summary = module.reconcile(args.start, args.end, args.store, args.dry_run)
+    return module.exit_code(summary)
+
+
+def run_tombstones(module, args):
+    summary = module.sweep(args.start, args.end, args.dry_run)
+    return module.exit_code(summary)
+
+
+def run_daemon(module, args):
+    options = {k: v for k, v in (('poll', args.poll), ('refresh', args.refresh),
+                                 ('max_runtime', args.max_runtime)) if v is not None}
+    summary = module.run(args.jobs, **options)
+    return 1 if summary['failing'] else 0
+
+
+def run_schedule(module, args):
+    results = module.tick(jobs=args.jobs, dry_run=args.dry_run)
+    return 1 if any(status in ('failed', 'blocked') for status in results.values()) else 0
+
+
+COMMANDS = {
+    # name: (job module, handler, help)
+    'sales':     ('sync_to_supabase', run_sales, 'Sync sales register → sales_analytics'),
+    'inventory': ('custom_inventory_sync', run_inventory, 'Sync stock balances → inventory_analytics'),
+    'visitors':  ('sync_visitors', run_visitors, 'Sync traffic counters → visitors_analytics, store_day_facts'),
+    'report':    ('sales_daily_groups', run_report, 'Build the daily groups Excel report (pandas)'),
+    'reconcile': ('reconcile', run_reconcile, 'Compare 1C and Supabase sales, resync differences'),
+    'tombstones': ('tombstones', run_tombstones, 'Delete sales rows removed or unposted in 1C'),
+    'daemon':    ('sync_daemon', run_daemon, 'Poll 1C and run sales/visitors micro-batches continuously'),
+    'schedule':  ('scheduler', run_schedule, 'Run the jobs that are due (per-job cadence, one tick)'),
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='sync', description='Bonanza 1C → Supabase sync jobs')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    for name, (_, _, help_text) in COMMANDS.items():
+        p = sub.add_parser(name, help=help_text)
+        if name in ('sales', 'inventory', 'visitors'):
+            p.add_argument('--plan', action='store_true',
+                           help='Estimate rows, batches, bytes and duration, then exit')
+        if name == 'sales':
+            p.add_argument('--full', action='store_true',
+                           help='Rescan the whole period instead of changed documents only')
+            p.add_argument('--restart', action='store_true',
+                           help='Ignore the checkpoint of an interrupted full scan')
+        elif name == 'inventory':
+            p.add_argument('date', nargs='?', default=None, help='Snapshot date (default: today)')
+        elif name == 'visitors':
+            p.add_argument('--since', default=None,
+                           help='Re-aggregate all days from this date (default: incremental window)')
+        elif name == 'reconcile':
+            p.add_argument('--start', type=date.fromisoformat, default=date.today() - timedelta(days=7),
+                           help='First day (default: 7 days ago)')
+            p.add_argument('--end', type=date.fromisoformat, default=date.today() + timedelta(days=1),
+                           help='Day after the last day (default: tomorrow)')
+            p.add_argument('--store', default=None, help='Limit to one store')
+            p.add_argument('--dry-run', action='store_true', help='Report differences only')
+        elif name == 'tombstones':
+            p.add_argument('--start', type=date.fromisoformat, default=None,
+                           help='First day (default: start of the sales sync window)')
+            p.add_argument('--end', type=date.fromisoformat, default=None,
+                           help='Day after the last day (default: tomorrow)')
+            p.add_argument('--dry-run', action='store_true', help='Report orphans only')
+        elif name == 'daemon':
+            p.add_argument('--jobs', nargs='+', choices=['sales', 'visitors'], default=None,
+                           help='Jobs to keep fresh (default: all)')
+            p.add_argument('--poll', type=float, default=None, help='Seconds between watermark polls')
+            p.add_argument('--refresh', type=float, default=None,
+                           help='Run each job at least this often (seconds)')
+            p.add_argument('--max-runtime', type=float, default=None,
+                           help='Stop after this many seconds (default: DAEMON_MAX_RUNTIME, 0 = forever)')
+        elif name == 'schedule':
+            p.add_argument('--jobs', nargs='+', default=None,
+                           help='Only consider these jobs of the scheduler job table')
+            p.add_argument('--dry-run', action='store_true', help='Print the due jobs only')
+
+    return parser
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# MAIN
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def setup_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s | %(levelname)s | %(message)s',
+        datefmt='%H:%M:%S',
+        stream=sys.stdout
+    )
+
+
+def run(argv=None, cli=False):
+    """
+    Parse `argv`, import only the selected job module and run it. `cli` is
+    set by the `python sync.py` entry point only: CLI startup is measured
+    from this module's import, which is only the process start there.
+    """
+    setup_logging()
+    args = build_parser().parse_args(argv)
+    module_name, handler, _ = COMMANDS[args.command]
+
+    cli_ms = (time.perf_counter() - _STARTED) * 1000 if cli else None
+    preloaded = module_name in sys.modules
+    t0 = time.perf_counter()
+    module = importlib.import_module(module_name)
+    import_ms = (time.perf_counter() - t0) * 1000
+
+    log.info(f"⏱  Startup: {f'cli {cli_ms:.0f} ms, ' if cli else ''}import {module_name} "
+             + ("preloaded" if preloaded else f"{import_ms:.0f} ms"))
+
+    # A plan writes nothing, not even its startup metrics
+    if getattr(args, 'plan', False):
+        return handler(module, args) or 0
+
+    from run_metrics import record_run
+    record_run('startup', command=args.command, module=module_name, preloaded=preloaded,
+               cli_ms=round(cli_ms, 1) if cli else None, import_ms=round(import_ms, 1))
+
+    from run_lock import hold
+    with hold('daemon' if args.command == 'daemon' else 'sync') as acquired:
+        if not acquired:
+            log.warning(f"Another sync run holds the lock — skipping '{args.command}'")
+            return 1
+        return handler(module, args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(run(cli=True))
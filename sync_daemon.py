@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+Sync Daemon: near-real-time micro-batches instead of hourly runs
+═══════════════════════════════════════════════════════════════════════════════
+
+The hourly cron leaves sales up to an hour behind 1C. The daemon stays
+connected and polls a watermark per register every DAEMON_POLL_SECONDS:
+
+  (max _Period, row count since the start of today)
+
+one index range scan over today's rows. When it moves, the job runs right
+away; it is incremental (sales: changed documents only, plus check counts
+and store-day facts of the touched days; visitors: the days since its
+last watermark, upserting changed store-days only), so each run ships a
+small micro-batch. Edits the watermark cannot
+see (re-posting an older document) are picked up by a refresh run at least
+every DAEMON_REFRESH_SECONDS, which the jobs' own change probes keep cheap.
+
+Bounded:
+  - jobs run one at a time through sync.run (same run lock as the cron)
+  - a failing job backs off exponentially, up to DAEMON_MAX_BACKOFF seconds
+  - DAEMON_MAX_RUNTIME (seconds, 0 = forever) and DAEMON_MAX_RSS_MB end the
+    loop cleanly, so a supervisor/scheduler can start a fresh process
+  - only one daemon runs at a time (run lock 'daemon')
+
+SIGTERM / SIGINT finish the job in progress and stop; a second signal
+aborts immediately.
+
+  python sync.py daemon [--poll 30] [--max-runtime 3300] [--jobs sales visitors]
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+import os
+import time
+import signal
+import logging
+import resource
+import threading
+from datetime import datetime, date
+
+from onec_metadata import table
+from run_metrics import record_run
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONFIGURATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+POLL_SECONDS = float(os.getenv('DAEMON_POLL_SECONDS', 30))
+REFRESH_SECONDS = float(os.getenv('DAEMON_REFRESH_SECONDS', 900))
+MAX_BACKOFF_SECONDS = float(os.getenv('DAEMON_MAX_BACKOFF', 900))
+MAX_RUNTIME_SECONDS = float(os.getenv('DAEMON_MAX_RUNTIME', 0))
+MAX_RSS_MB = float(os.getenv('DAEMON_MAX_RSS_MB', 1024))
+MIN_POLL_SECONDS = 5
+
+# job (sync.py command) → register whose watermark triggers it
+WATERMARKS = {
+    'sales': table('sales'),
+    'visitors': table('visitors'),
+}
+
+log = logging.getLogger(__name__)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# WATERMARKS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def watermark(cursor, register, since):
+    """(max _Period, rows since `since`) of a register."""
+    cursor.execute(f"SELECT max(_Period), count(*) FROM {register} WHERE _Period >= %s", (since,))
+    max_period, rows = cursor.fetchone()
+    return (max_period.isoformat() if max_period else None, int(rows))
+
+
+class Watermarks:
+    """One autocommit 1C connection for the polls, reopened after errors."""
+
+    def __init__(self, connect):
+        self._connect = connect
+        self._conn = None
+
+    def poll(self, jobs):
+        """{job: watermark}; jobs whose query failed are missing."""
+        since = datetime.combine(date.today(), datetime.min.time())
+        marks = {}
+        try:
+            if self._conn is None:
+                self._conn = self._connect()
+                self._conn.autocommit = True
+            cursor = self._conn.cursor()
+            for job in jobs:
+                marks[job] = watermark(cursor, WATERMARKS[job], since)
+            cursor.close()
+        except Exception as e:
+            log.warning(f"Watermark poll failed: {e}")
+            self.close()
+        return marks
+
+    def close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# LOOP
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class JobState:
+    __slots__ = ('mark', 'last_run', 'failures', 'retry_at', 'runs')
+
+    def __init__(self):
+        self.mark = None
+        self.last_run = 0.0
+        self.failures = 0
+        self.retry_at = 0.0
+        self.runs = 0
+
+
+def rss_mb():
+    """Peak resident set size of this process (Linux reports KiB)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def install_signal_handlers(stop):
+    """First SIGTERM/SIGINT sets `stop`; a second one restores the default and re-raises."""
+    def handler(signum, frame):
+        if stop.is_set():
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
+            return
+        log.info(f"🛑 {signal.Signals(signum).name}: stopping after the current job")
+        stop.set()
+
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, handler)
+        signal.signal(signal.SIGINT, handler)
+
+
+def run(jobs=None, poll=POLL_SECONDS, refresh=REFRESH_SECONDS, max_runtime=MAX_RUNTIME_SECONDS,
+        run_job=None, connect=None, after_run=None, stop=None):
+    """
+    Poll and run `jobs` (default: all with a watermark) until stopped.
+
+    `run_job(job)` returns an exit code (default: sync.run([job])); `connect`
+    opens the 1C connection for the polls; `after_run()` is called after
+    every job run (e.g. to commit a Modal volume). Returns a summary dict.
+    """
+    jobs = list(jobs or WATERMARKS)
+    poll = max(poll, MIN_POLL_SECONDS)
+    if run_job is None:
+        import sync
+        run_job = lambda job: sync.run([job])
+    if connect is None:
+        import onec_source
+        connect = onec_source.get_source('postgres').connect
+
+    stop = stop or threading.Event()
+    install_signal_handlers(stop)
+
+    states = {job: JobState() for job in jobs}
+    marks = Watermarks(connect)
+    started = time.monotonic()
+    cycles = 0
+    reason = 'stopped'
+    log.info(f"👀 Daemon: {', '.join(jobs)} every {poll:.0f}s "
+             f"(refresh {refresh:.0f}s, max runtime {max_runtime or '∞'}s)")
+
+    try:
+        while not stop.is_set():
+            cycle_started = time.monotonic()
+            cycles += 1
+            current = marks.poll(jobs)
+
+            for job in jobs:
+                if stop.is_set():
+                    break
+                state, now = states[job], time.monotonic()
+                mark = current.get(job)
+                moved = mark is not None and mark != state.mark
+                stale = now - state.last_run >= refresh
+                if not (moved or stale) or now < state.retry_at:
+                    continue
+
+                log.info(f"⚡ [{job}] {'watermark ' + str(mark) if moved else 'refresh'}")
+                try:
+                    ok = run_job(job) == 0   # partial runs exit 1 and are retried
+                except Exception as e:
+                    log.error(f"[{job}] failed: {e}")
+                    ok = False
+                state.runs += 1
+                state.last_run = time.monotonic()
+                if ok:
+                    state.mark, state.failures, state.retry_at = mark, 0, 0.0
+                else:
+                    state.failures += 1
+                    backoff = min(poll * 2 ** state.failures, MAX_BACKOFF_SECONDS)
+                    state.retry_at = state.last_run + backoff
+                    log.warning(f"[{job}] failure #{state.failures}, next try in {backoff:.0f}s")
+                if after_run:
+                    after_run()
+
+            if max_runtime and time.monotonic() - started >= max_runtime:
+                reason = 'max_runtime'
+                break
+            if rss_mb() > MAX_RSS_MB:
+                log.warning(f"Peak RSS {rss_mb():.0f} MB > {MAX_RSS_MB:.0f} MB — exiting for a fresh process")
+                reason = 'max_rss'
+                break
+            stop.wait(max(0.0, poll - (time.monotonic() - cycle_started)))
+    finally:
+        marks.close()
+
+    summary = {
+        'reason': reason, 'cycles': cycles,
+        'seconds': round(time.monotonic() - started, 1),
+        'runs': {job: s.runs for job, s in states.items()},
+        'failing': {job: s.failures for job, s in states.items() if s.failures},
+        'peak_rss_mb': round(rss_mb(), 1),
+    }
+    record_run('daemon', status='ok' if not summary['failing'] else 'partial', **summary)
+    return summary
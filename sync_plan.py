@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+Sync Plan: what a sales / inventory / visitors run would cost, before it runs
+═══════════════════════════════════════════════════════════════════════════════
+
+`python sync.py sales --plan` (same for inventory and visitors) runs only
+the cheap part of the job against 1C and exits without extracting or
+uploading anything:
+
+  sales       change probe, store tree and change detection (as the run
+              itself would), then count(*) of the rows to re-extract: the
+              changed documents, or the whole window for a full scan
+              (minus a checkpoint's acknowledged rows)
+  inventory   change probe, then the row count of the last snapshot (the
+              register rows from pg_class.reltuples before the first run)
+  visitors    change probe, then the number of day × counter pairs in
+              the run's window (an upper bound of the store-days)
+
+Rows are turned into bytes, batches and duration with the recent run
+metrics of the same job (and sales mode): bytes per row and gzip ratio of
+the uploads, the average batch size the adaptive batcher settled on, and a
+least-squares fit of run seconds over rows (fixed overhead + per-row cost).
+Without history, DEFAULT_ROW_BYTES is used and the duration is unknown.
+A plan longer than the Modal timeout (3600 s) is flagged.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+import math
+import logging
+from datetime import date
+
+from run_metrics import recent_runs
+from supabase_upload import START_BATCH_BYTES, MAX_BATCH_ROWS
+from onec_metadata import table, column
+import change_probe
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONFIGURATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+HISTORY_RUNS = 20                  # recent runs per job used for the rates
+MODAL_TIMEOUT_SECONDS = 3600
+
+# Serialized bytes per row when a job has no upload history yet
+DEFAULT_ROW_BYTES = {'sales': 300, 'inventory': 150, 'visitors': 80}
+
+log = logging.getLogger(__name__)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# RATES FROM RUN METRICS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _seconds(run):
+    """Wall seconds of a run (older entries only have pipeline / upload timings)."""
+    return (run.get('seconds') or (run.get('pipeline') or {}).get('wall_s')
+            or (run.get('upload') or {}).get('seconds'))
+
+
+def history(job, mode=None):
+    """Recent runs of `job` that moved rows (of one sales `mode` if given)."""
+    return [run for run in recent_runs(job, HISTORY_RUNS * 5)
+            if run.get('status') in ('ok', 'partial') and run.get('rows')
+            and (mode is None or run.get('mode') == mode)][-HISTORY_RUNS:]
+
+
+def fit_duration(runs):
+    """(overhead s, s per row) from runs: least squares, else the mean rate."""
+    points = [(run['rows'], _seconds(run)) for run in runs if _seconds(run)]
+    if not points:
+        return None
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if var_x > 0:
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+        intercept = mean_y - slope * mean_x
+        if slope > 0 and intercept >= 0:
+            return intercept, slope
+    return 0.0, sum(y for _, y in points) / sum(x for x, _ in points)
+
+
+def estimate(job, rows, runs):
+    """Expected bytes, wire bytes, batches and seconds of uploading `rows`."""
+    uploads = [run['upload'] for run in runs if run.get('upload') and run['upload'].get('rows')]
+    up_rows = sum(u['rows'] for u in uploads)
+    row_bytes = sum(u.get('bytes', 0) for u in uploads) / up_rows if up_rows else DEFAULT_ROW_BYTES[job]
+    raw = sum(u.get('bytes', 0) for u in uploads)
+    wire_ratio = sum(u.get('wire_bytes', 0) for u in uploads) / raw if raw else 1.0
+    batch_bytes = (uploads[-1].get('final_batch_bytes') if uploads else None) or START_BATCH_BYTES
+
+    size = rows * row_bytes
+    duration = fit_duration(runs)
+    return {
+        'rows': rows,
+        'bytes': int(size),
+        'wire_bytes': int(size * wire_ratio),
+        'batches': max(math.ceil(size / batch_bytes), math.ceil(rows / MAX_BATCH_ROWS)) if rows else 0,
+        'seconds': round(duration[0] + duration[1] * rows, 1) if duration else None,
+        'history_runs': len(runs),
+    }
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# 1C ESTIMATES
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def plan_sales(cursor, full=False, resume=True):
+    import store_tree
+    from checkpoint import load_checkpoint
+    from change_capture import detect_changes, load_documents_state
+    from sync_to_supabase import SALES_START_DATE
+
+    requested_full = full
+    stores = store_tree.load_tree(cursor, save=False)
+    synced_stores = (change_probe.last_fingerprint('sales') or {}).get('stores')
+    if synced_stores and synced_stores != stores.digest and not full:
+        full, note = True, "store attribution changed"
+    else:
+        note = None
+
+    skip, _ = change_probe.check('sales', cursor, SALES_START_DATE, stores=stores.digest)
+    if skip and not full:
+        return {'mode': 'skip', 'rows': 0, 'note': "no changes in 1C"}
+
+    state = None if full else load_documents_state()
+    if state is not None:
+        changed, removed, _ = detect_changes(cursor, state, SALES_START_DATE)
+        cursor.execute(f"""
+        SELECT count(*) FROM {table('sales')}
+        WHERE {column('sales', 'recorder')} IN (SELECT decode(h, 'hex') FROM unnest(%s::text[]) AS h)
+        """, (list(changed),))
+        return {'mode': 'incremental', 'rows': int(cursor.fetchone()[0]),
+                'note': f"{len(changed):,} changed, {len(removed):,} removed documents"}
+
+    cursor.execute(f"SELECT count(*) FROM {table('sales')} WHERE _Period >= %s", (SALES_START_DATE,))
+    rows = int(cursor.fetchone()[0])
+    checkpoint = load_checkpoint('sales') if resume else None
+    if checkpoint and checkpoint.get('acked_rows'):
+        rows = max(rows - checkpoint['acked_rows'], 0)
+        note = f"resuming after {checkpoint['acked_rows']:,} uploaded rows"
+    return {'mode': 'full', 'rows': rows, 'note': note or ("--full" if requested_full else "no change-capture state yet")}
+
+
+def plan_inventory(cursor, report_date=None):
+    from custom_inventory_sync import weights_version
+
+    report_date = report_date or date.today().strftime('%Y-%m-%d')
+    until = f"{report_date}T23:59:59.999999"
+    rules_version = weights_version()
+    skip, _ = change_probe.check('inventory', cursor, until=until, snapshot_date=report_date,
+                                 weights=rules_version)
+    if skip and rules_version is not None:
+        return {'mode': 'skip', 'rows': 0, 'note': f"no changes up to {report_date}"}
+
+    # Grouping the register costs as much as the extraction: the snapshot
+    # size barely moves between runs, so take the last one's
+    runs = history('inventory')
+    if runs:
+        return {'mode': 'snapshot', 'rows': int(runs[-1]['rows']),
+                'note': f"rows of the last snapshot ({runs[-1].get('snapshot_date', '?')})"}
+    cursor.execute("SELECT greatest(reltuples, 0)::bigint FROM pg_class WHERE oid = %s::regclass",
+                   (table('stock'),))
+    return {'mode': 'snapshot', 'rows': int(cursor.fetchone()[0]),
+            'note': "≤ register rows (planner statistics, no run history yet)"}
+
+
+def plan_visitors(cursor, start_date=None):
+    from sync_visitors import sync_window, VISITORS_START_DATE
+
+    skip, _ = change_probe.check('visitors', cursor, start_date or VISITORS_START_DATE)
+    if skip:
+        return {'mode': 'skip', 'rows': 0, 'note': "no changes in 1C"}
+    since, mode = sync_window(start_date)
+    cursor.execute(f"""
+    SELECT count(DISTINCT (_Period::date, {column('visitors', 'counter')}))
+    FROM {table('visitors')}
+    WHERE _Period >= %s AND _Active = true
+    """, (since,))
+    return {'mode': mode, 'rows': int(cursor.fetchone()[0]),
+            'note': f"≤ day × counter pairs since {since}"}
+
+
+PLANNERS = {
+    'sales': plan_sales,
+    'inventory': plan_inventory,
+    'visitors': plan_visitors,
+}
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# REPORT
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _size(n):
+    for unit in ('B', 'KB', 'MB'):
+        if n < 1024:
+            return f"{n:,.{1 if unit == 'MB' else 0}f} {unit}"
+        n /= 1024
+    return f"{n:,.1f} GB"
+
+
+def print_plan(job, plan):
+    print(f"\n📋 Plan: {job} ({plan['mode']}{', ' + plan['note'] if plan.get('note') else ''})")
+    if plan['mode'] == 'skip':
+        print("   nothing to do: the run would exit after its change probe")
+        return
+    print(f"   rows       ~{plan['rows']:,}")
+    print(f"   batches    ~{plan['batches']:,}")
+    print(f"   bytes      ~{_size(plan['bytes'])} (~{_size(plan['wire_bytes'])} on the wire)")
+    if plan['seconds'] is None:
+        print("   duration   unknown (no run history with timings)")
+    else:
+        runs = plan['history_runs']
+        print(f"   duration   ~{plan['seconds']:,.0f} s (from {runs} recent run{'s' if runs != 1 else ''})")
+        if plan['seconds'] > MODAL_TIMEOUT_SECONDS:
+            print(f"   ⚠️  longer than the {MODAL_TIMEOUT_SECONDS} s Modal timeout"
+                  + (" — the scan is checkpointed and resumes on the next run" if job == 'sales' else ""))
+
+
+def plan(job, connect=None, **options):
+    """Estimate one run of `job` (options as for its main()); prints and returns the plan."""
+    if connect is None:
+        import onec_source
+        connect = onec_source.get_source('postgres').connect
+    conn = connect()
+    try:
+        result = PLANNERS[job](conn.cursor(), **options)
+    finally:
+        conn.close()
+    if result['mode'] != 'skip':
+        runs = history(job, result['mode'] if job == 'sales' else None)
+        result.update(estimate(job, result['rows'], runs))
+    print_plan(job, result)
+    return result
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+Sync State: small persistent JSON documents shared between runs
+═══════════════════════════════════════════════════════════════════════════════
+
+Stored as `<name>.json` (or `<name>.json.gz` for large ones) in
+SYNC_STATE_DIR (default `.sync_state/`; a Modal Volume in production).
+Writes are atomic (temp file + rename), so a run killed mid-write never
+leaves a half-written state behind.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+import os
+import threading
+import gzip
+import json
+import logging
+
+STATE_DIR = os.getenv('SYNC_STATE_DIR', '.sync_state')
+
+log = logging.getLogger(__name__)
+
+
+def state_path(name, compressed=False):
+    return os.path.join(STATE_DIR, f"{name}.json.gz" if compressed else f"{name}.json")
+
+
+def load_state(name, default=None, compressed=False):
+    """Return the stored document `name`, or `default` if missing/unreadable."""
+    path = state_path(name, compressed)
+    if not os.path.exists(path):
+        return default
+    try:
+        opener = gzip.open if compressed else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        log.warning(f"Could not read state {path}: {e}")
+        return default
+
+
+def save_state(name, value, compressed=False):
+    """Atomically replace the stored document `name`."""
+    os.makedirs(STATE_DIR, exist_ok=True)
+    path = state_path(name, compressed)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"   # parallel jobs (scheduler)
+    opener = gzip.open if compressed else open
+    with opener(tmp, 'wt', encoding='utf-8') as f:
+        json.dump(value, f, ensure_ascii=False, default=str)
+    os.replace(tmp, path)
+
+
+def clear_state(name, compressed=False):
+    path = state_path(name, compressed)
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,91 @@
+"""
+An interrupted pipeline run resumes from the checkpoint's contiguous prefix.
+
+  python -m pytest test_checkpoint_resume.py
+"""
+
+import time
+import threading
+
+import pytest
+
+import sync_state
+import pipeline
+from checkpoint import CheckpointTracker, new_checkpoint, load_checkpoint
+
+PAGES = 12
+ROWS_PER_PAGE = 5
+
+
+class TunnelDrop(Exception):
+    pass
+
+
+@pytest.fixture(autouse=True)
+def state_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(sync_state, 'STATE_DIR', str(tmp_path))
+
+
+def keyset_pages(after=None):
+    """(seq, key, rows) pages after the keyset position `after`, like iter_sales_pages."""
+    first = 0 if after is None else after[0] + 1
+    for n, page in enumerate(range(first, PAGES)):
+        yield n, [page], [f"{page}:{line}" for line in range(ROWS_PER_PAGE)]
+
+
+def sync(tracker, uploaded, drop=None):
+    """One run: upload pages through the pipeline, acking them on the tracker."""
+    lock = threading.Lock()
+
+    def upload_page(item):
+        seq, key, rows = item
+        if key[0] == drop:
+            # Slow, then lost: the other uploaders ack later pages meanwhile
+            time.sleep(0.2)
+            raise TunnelDrop(f"page {key[0]}")
+        with lock:
+            uploaded.append(key[0])
+        tracker.ack(seq, key, len(rows))
+        return {'rows': len(rows)}
+
+    after = tracker.checkpoint['after']
+    return pipeline.run(keyset_pages(after), upload_page, queue_pages=2, uploaders=3)
+
+
+def test_resume_skips_the_acked_prefix():
+    checkpoint = new_checkpoint('test')
+    first_run = []
+    with pytest.raises(TunnelDrop):
+        sync(CheckpointTracker('test', checkpoint), first_run, drop=4)
+
+    saved = load_checkpoint('test')
+    prefix = saved['pages']
+    assert prefix == 4
+    assert sorted(first_run)[:prefix] == list(range(prefix))
+    assert saved['after'] == [prefix - 1]
+    assert saved['acked_rows'] == prefix * ROWS_PER_PAGE
+    assert any(page >= prefix for page in first_run)    # acked out of order, beyond the prefix
+
+    second_run = []
+    results, stats = sync(CheckpointTracker('test', saved), second_run)
+
+    assert min(second_run) == prefix
+    assert not set(second_run) & set(range(prefix))
+    assert sorted(second_run) == list(range(prefix, PAGES))
+    assert stats['pages'] == PAGES - prefix
+    final = load_checkpoint('test')
+    assert final['after'] == [PAGES - 1]
+    assert final['acked_rows'] == PAGES * ROWS_PER_PAGE
+
+
+def test_failed_page_holds_the_checkpoint():
+    checkpoint = new_checkpoint('test')
+    tracker = CheckpointTracker('test', checkpoint)
+    tracker.ack(0, [0], ROWS_PER_PAGE)
+    tracker.ack(2, [2], ROWS_PER_PAGE)
+    tracker.ack(1, [1], ROWS_PER_PAGE, ok=False)
+    tracker.ack(3, [3], ROWS_PER_PAGE)
+
+    saved = load_checkpoint('test')
+    assert tracker.failed
+    assert saved['after'] == [0] and saved['pages'] == 1
@@ -0,0 +1,87 @@
+"""
+run_lock against a real Postgres (advisory locks cannot be faked).
+
+  SYNC_TEST_DSN=postgresql://postgres@127.0.0.1:5432/postgres python -m pytest test_run_lock.py
+
+Skipped without SYNC_TEST_DSN. Uses lock names of its own, never 'sync'.
+"""
+
+import os
+import tempfile
+import threading
+
+import pytest
+
+os.environ.setdefault('SYNC_STATE_DIR', tempfile.mkdtemp(prefix='sync_state_'))
+
+import run_lock
+
+DSN = os.getenv('SYNC_TEST_DSN')
+pytestmark = pytest.mark.skipif(not DSN, reason="SYNC_TEST_DSN not set")
+
+
+def advisory_holders(name):
+    """Backends holding the advisory lock `name`, seen from a third connection."""
+    import psycopg2
+    key = run_lock.lock_key(name)
+    conn = psycopg2.connect(DSN)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+        SELECT count(*) FROM pg_locks
+        WHERE locktype = 'advisory' AND granted
+          AND classid = ((%s::bigint >> 32) & 4294967295)::oid
+          AND objid = (%s::bigint & 4294967295)::oid
+        """, (key, key))
+        return cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_second_connection_is_blocked_while_held():
+    with run_lock.hold('test-blocked', dsn=DSN) as acquired:
+        assert acquired
+        assert advisory_holders('test-blocked') == 1
+
+        acquired, conn = run_lock.acquire('test-blocked', wait=0, dsn=DSN)
+        assert not acquired and conn is None
+
+    assert advisory_holders('test-blocked') == 0
+    acquired, conn = run_lock.acquire('test-blocked', wait=0, dsn=DSN)
+    assert acquired
+    conn.close()
+
+
+def test_reentrant_hold_reuses_the_connection():
+    with run_lock.hold('test-reentrant', dsn=DSN) as outer:
+        conn = run_lock._held['test-reentrant'][0]
+        with run_lock.hold('test-reentrant', wait=0, dsn=DSN) as inner:
+            assert outer and inner
+            assert run_lock._held['test-reentrant'] == [conn, 2]
+            assert advisory_holders('test-reentrant') == 1
+        assert not conn.closed
+    assert conn.closed
+    assert 'test-reentrant' not in run_lock._held
+    assert advisory_holders('test-reentrant') == 0
+
+
+def test_threads_share_one_lock():
+    entered = threading.Barrier(4)
+    acquired, holders = [], []
+
+    def worker():
+        with run_lock.hold('test-threads', wait=0, dsn=DSN) as ok:
+            acquired.append(ok)
+            entered.wait(timeout=10)
+            holders.append(advisory_holders('test-threads'))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert acquired == [True] * 4
+    assert holders == [1] * 4
+    assert 'test-threads' not in run_lock._held
+    assert advisory_holders('test-threads') == 0
@@ -0,0 +1,75 @@
+"""
+Store attribution of StoreTree on hand-built _Reference640 trees.
+
+  python -m pytest test_store_tree.py
+"""
+
+from store_tree import StoreTree
+
+
+def ref(n):
+    return bytes([n]) * 16
+
+
+# Mixed depths: region → store → warehouses next to a store at the root
+NAMES = {
+    1: 'Санкт-Петербург',
+    2: 'Озерки',
+    3: 'Магазин (Озерки) Торговый зал',
+    4: 'Магазин (Озерки) Склад',
+    5: 'Купчино',
+    6: 'Магазин (Купчино) Торговый зал',
+    7: 'Коломна',
+    8: 'Коломна ТЗ',
+    9: 'Коломна Склад',
+    10: 'Интернет-магазин',
+}
+PARENTS = {2: 1, 3: 2, 4: 2, 5: 1, 6: 5, 8: 7, 9: 7}
+
+MIXED = {ref(n): (ref(PARENTS[n]) if n in PARENTS else None, name) for n, name in NAMES.items()}
+
+
+def test_mixed_depth_tree_keeps_shallow_stores_whole():
+    tree = StoreTree(MIXED)
+
+    assert tree.placements[ref(3)] == ('Магазин (Озерки) Торговый зал', 'Озерки', 'Санкт-Петербург')
+    assert tree.placements[ref(6)].store == 'Купчино'
+    assert tree.placements[ref(8)] == ('Коломна ТЗ', 'Коломна', None)
+    assert tree.placements[ref(9)] == ('Коломна Склад', 'Коломна', None)
+    # A warehouse at the root is its own store
+    assert tree.placements[ref(10)] == ('Интернет-магазин', 'Интернет-магазин', None)
+
+    assert tree.stores() == ['Интернет-магазин', 'Коломна', 'Купчино', 'Озерки']
+    assert sorted(tree.refs('Коломна')) == [ref(7), ref(8), ref(9)]
+    assert ref(1) not in tree.placements            # a region is no store
+
+
+def test_store_hops_two_skips_subgroups():
+    nodes = dict(MIXED)
+    nodes[ref(11)] = (ref(2), 'Озерки: подсобка')
+    nodes[ref(12)] = (ref(11), 'Подсобка 1')
+    nodes[ref(13)] = (ref(7), 'Коломна: зал')
+    nodes[ref(14)] = (ref(13), 'Коломна ТЗ 2')
+    nodes[ref(3)] = (ref(11), nodes[ref(3)][1])
+
+    tree = StoreTree(nodes, hops=2)
+    assert tree.placements[ref(12)].store == 'Озерки'
+    assert tree.placements[ref(12)].region == 'Санкт-Петербург'
+    assert tree.placements[ref(14)].store == 'Коломна'
+    assert tree.placements[ref(11)].store == 'Озерки'
+
+
+def test_digest_moves_with_attribution_only():
+    renamed_region = dict(MIXED)
+    renamed_region[ref(1)] = (None, 'СПб')
+    moved = dict(MIXED)
+    moved[ref(6)] = (ref(2), moved[ref(6)][1])
+
+    assert StoreTree(renamed_region).digest == StoreTree(MIXED).digest
+    assert StoreTree(moved).digest != StoreTree(MIXED).digest
+
+
+def test_parent_cycle_ends_the_chain():
+    nodes = {ref(1): (ref(2), 'A'), ref(2): (ref(1), 'B'), ref(3): (ref(1), 'Склад')}
+    tree = StoreTree(nodes)
+    assert tree.placements[ref(3)].store == 'A'
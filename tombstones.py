@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+Tombstones: delete sales_analytics rows that no longer exist in 1C
+═══════════════════════════════════════════════════════════════════════════════
+
+Register rows disappear when a document is unposted or deleted, or when its
+line numbers shift. Upserts never remove them, so they stay in Supabase and
+inflate revenue. This pass finds them by comparing key sets, not rows:
+
+  1. Per day:     (count, Σ 32-bit md5 of recorder_id) on both sides
+  2. Per bucket:  the same digest split into 256 buckets by the first byte of
+                  md5(recorder_id), only for days whose digests differ
+  3. Keys:        recorder_ids of the differing buckets only
+
+Keys present in Supabase but not in 1C are deleted in bulk. Keys missing in
+Supabase are only counted (the sales sync / reconcile handles those).
+The Supabase side is in migration_tombstones.sql.
+
+Usage:
+  python tombstones.py [--start 2026-01-01] [--end 2026-03-01] [--dry-run]
+  python sync.py tombstones ...
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+import sys
+import logging
+import argparse
+from datetime import date, timedelta
+
+import sync_to_supabase
+from sync_to_supabase import SALES_START_DATE, SALES_TABLE, WAREHOUSE_REF
+from reconcile import ONEC_ROW_KEY, PAGE_SIZE, _rpc, _date_windows, delete_rows
+from run_metrics import record_run
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONFIGURATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+BUCKET_CHUNK = 32          # buckets per key listing call (each call is paged)
+
+log = logging.getLogger(__name__)
+
+# Same expressions as migration_tombstones.sql
+ONEC_KEY_HASH = f"('x' || substr(md5({ONEC_ROW_KEY}), 1, 8))::bit(32)::bigint"
+ONEC_BUCKET = f"substr(md5({ONEC_ROW_KEY}), 1, 2)"
+
+# Only rows transform_row keeps: warehouses the store tree places in a store
+ONEC_SALES = f"""
+    FROM {SALES_TABLE} s
+    WHERE s.{WAREHOUSE_REF} = ANY(%s)"""
+
+
+def _digest(row_count, key_hash):
+    return (int(row_count or 0), int(key_hash or 0))
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# DIGESTS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# --- Level 1: day ----------------------------------------------------------------
+
+def onec_day_digests(cursor, refs, start, end):
+    cursor.execute(f"""
+    SELECT s._Period::date, COUNT(*), SUM({ONEC_KEY_HASH})
+    {ONEC_SALES}
+      AND s._Period >= %s AND s._Period < %s
+    GROUP BY 1
+    """, (refs, start, end))
+    return {r[0].isoformat(): _digest(r[1], r[2]) for r in cursor.fetchall()}
+
+
+def supabase_day_digests(start, end):
+    result = {}
+    for lo, hi in _date_windows(start, end):
+        for r in _rpc('sales_key_digest_day', {'p_start': lo.isoformat(), 'p_end': hi.isoformat()}):
+            result[r['day']] = _digest(r['row_count'], r['key_hash'])
+    return result
+
+
+# --- Level 2: key bucket within a day --------------------------------------------
+
+def onec_bucket_digests(cursor, refs, day):
+    cursor.execute(f"""
+    SELECT {ONEC_BUCKET}, COUNT(*), SUM({ONEC_KEY_HASH})
+    {ONEC_SALES}
+      AND s._Period >= %s::date AND s._Period < %s::date + 1
+    GROUP BY 1
+    """, (refs, day, day))
+    return {r[0]: _digest(r[1], r[2]) for r in cursor.fetchall()}
+
+
+def supabase_bucket_digests(day):
+    return {r['bucket']: _digest(r['row_count'], r['key_hash'])
+            for r in _rpc('sales_key_digest_bucket', {'p_day': day})}
+
+
+# --- Level 3: keys of differing buckets ------------------------------------------
+
+def onec_keys(cursor, refs, day, buckets):
+    cursor.execute(f"""
+    SELECT {ONEC_ROW_KEY}
+    {ONEC_SALES}
+      AND s._Period >= %s::date AND s._Period < %s::date + 1
+      AND {ONEC_BUCKET} = ANY(%s)
+    """, (refs, day, day, list(buckets)))
+    return {r[0] for r in cursor.fetchall()}
+
+
+def supabase_keys(day, buckets):
+    """
+    recorder_ids of `buckets` on `day`. PostgREST truncates a result at its
+    max-rows without an error, so every listing is paged (ordered, offset)
+    until an empty page: a short page may just be a lower server max-rows.
+    """
+    keys = set()
+    for i in range(0, len(buckets), BUCKET_CHUNK):
+        chunk = list(buckets[i:i + BUCKET_CHUNK])
+        offset = 0
+        while True:
+            page = _rpc('sales_keys_in_buckets', {'p_day': day, 'p_buckets': chunk},
+                        {'order': 'recorder_id', 'offset': offset, 'limit': PAGE_SIZE})
+            if not page:
+                break
+            keys.update(r['recorder_id'] for r in page)
+            offset += len(page)
+    return keys
+
+
+def _differing(left, right):
+    return sorted(k for k in set(left) | set(right) if left.get(k) != right.get(k))
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ENGINE
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def find_orphans(cursor, start, end):
+    """Return ({orphan recorder_id: day}, count of keys missing in Supabase, days checked/differing)."""
+    refs = sync_to_supabase.load_stores(cursor).refs()
+    left = onec_day_digests(cursor, refs, start, end)
+    right = supabase_day_digests(start, end)
+    bad_days = _differing(left, right)
+    log.info(f"  {len(set(left) | set(right))} days, {len(bad_days)} differ")
+
+    orphans, missing = {}, 0
+    for day in bad_days:
+        buckets = _differing(onec_bucket_digests(cursor, refs, day), supabase_bucket_digests(day))
+        onec, supabase = onec_keys(cursor, refs, day, buckets), supabase_keys(day, buckets)
+        day_orphans = supabase - onec
+        missing += len(onec - supabase)
+        orphans.update(dict.fromkeys(day_orphans, day))
+        log.info(f"  {day}: {len(buckets)}/256 buckets differ, "
+                 f"{len(day_orphans)} orphans, {len(onec - supabase)} missing")
+
+    return orphans, missing, len(set(left) | set(right)), len(bad_days)
+
+
+def sweep(start=None, end=None, dry_run=False):
+    """Find and bulk-delete orphaned sales_analytics rows in [start, end)."""
+    start = start or date.fromisoformat(SALES_START_DATE[:10])
+    end = end or date.today() + timedelta(days=1)
+
+    conn = sync_to_supabase.get_db_connection()
+    cursor = conn.cursor()
+    deleted, aggregates = 0, {}
+    try:
+        log.info(f"🪦 Tombstone pass {start} → {end}...")
+        orphans, missing, days, bad_days = find_orphans(cursor, start, end)
+
+        if orphans and not dry_run:
+            log.info(f"Deleting {len(orphans):,} orphaned rows...")
+            deleted = delete_rows(orphans)
+            # Check counts and store-day revenue of those days still include them
+            aggregates = sync_to_supabase.refresh_day_aggregates(
+                cursor, {date.fromisoformat(str(day)[:10]) for day in orphans.values()})
+    finally:
+        cursor.close()
+        conn.close()
+
+    summary = {
+        'start': start.isoformat(), 'end': end.isoformat(),
+        'days': days, 'days_differ': bad_days,
+        'orphans': len(orphans), 'deleted': deleted, 'missing': missing,
+        'aggregate_errors': sync_to_supabase.aggregate_errors(aggregates) if aggregates else 0,
+        'dry_run': dry_run,
+    }
+    complete = dry_run or (deleted == len(orphans) and not summary['aggregate_errors'])
+    record_run('tombstones', status='ok' if complete else 'partial', checks=aggregates.get('checks'),
+               facts=aggregates.get('store_days'), **summary)
+    return summary
+
+
+def exit_code(summary):
+    """1 if a dry run found orphans or a real one left rows or aggregates behind."""
+    if summary['dry_run']:
+        return 1 if summary['orphans'] else 0
+    return 1 if summary['deleted'] < summary['orphans'] or summary['aggregate_errors'] else 0
+
+
+def add_arguments(parser):
+    parser.add_argument('--start', type=date.fromisoformat, default=None,
+                        help=f'First day (default: {SALES_START_DATE[:10]})')
+    parser.add_argument('--end', type=date.fromisoformat, default=None,
+                        help='Day after the last day (default: tomorrow)')
+    parser.add_argument('--dry-run', action='store_true', help='Report orphans only')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Delete sales rows removed in 1C')
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    summary = sweep(args.start, args.end, args.dry_run)
+    return exit_code(summary)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s | %(levelname)s | %(message)s',
+        datefmt='%H:%M:%S',
+        stream=sys.stdout
+    )
+    sys.exit(main())
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+product_weights: local cache with conditional revalidation
+═══════════════════════════════════════════════════════════════════════════════
+
+The weight rules change a few times a month but were downloaded on every
+inventory run. They are now cached in SYNC_STATE_DIR (`product_weights.json`)
+together with a version and a precompiled rule index:
+
+  version = "<row count>:<max(updated_at)>"
+
+Each run revalidates with one tiny request (the newest updated_at plus an
+exact count from Content-Range); the table is only downloaded again when the
+version moved. If Supabase is unreachable the cached rules are used.
+updated_at is maintained by a trigger (migration_weights_cache.sql), so
+in-place edits bump the version too; a deleted rule changes the count.
+The inventory change probe includes the version (current_version()) in its
+fingerprint, so a rule edit alone re-runs the snapshot.
+
+Rule matching (first match wins, in id order):
+  1. same product_group, product_name_pattern contained in the product name
+  2. same product_group, no pattern
+  3. product_group '%' or 'АКЦИЯ', pattern contained in the product name
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+import logging
+import requests
+
+from sync_state import load_state, save_state
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONFIGURATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+STATE_NAME = 'product_weights'
+WILDCARD_GROUPS = ('%', 'АКЦИЯ')
+
+log = logging.getLogger(__name__)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# RULE INDEX
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def compile_rules(rules):
+    """
+    Index rules for lookup by product group.
+
+    {"groups": {group: {"patterns": [[pattern, i], ...], "default": i}},
+     "wildcard": [[pattern, i], ...], "rules": [...]}  (i = position in rules)
+    """
+    groups, wildcard = {}, []
+    for i, rule in enumerate(rules):
+        group, pattern = rule.get('product_group'), rule.get('product_name_pattern')
+        entry = groups.setdefault(group, {'patterns': [], 'default': None})
+        if pattern:
+            entry['patterns'].append([pattern, i])
+            if group in WILDCARD_GROUPS:
+                wildcard.append([pattern, i])
+        elif entry['default'] is None:
+            entry['default'] = i
+    return {'groups': groups, 'wildcard': wildcard, 'rules': rules}
+
+
+def match_rule(index, product_group, product_name):
+    """Return the first matching rule dict, or None."""
+    name = product_name or ''
+    entry = index['groups'].get(product_group)
+    if entry:
+        for pattern, i in entry['patterns']:
+            if pattern in name:
+                return index['rules'][i]
+        if entry['default'] is not None:
+            return index['rules'][entry['default']]
+    for pattern, i in index['wildcard']:
+        if pattern in name:
+            return index['rules'][i]
+    return None
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CACHE
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def remote_version(base_url, headers):
+    """Cheap probe: '<count>:<max updated_at>' without downloading rules."""
+    r = requests.get(f"{base_url}/rest/v1/product_weights",
+                     headers={**headers, 'Prefer': 'count=exact'},
+                     params={'select': 'updated_at', 'order': 'updated_at.desc.nullslast', 'limit': 1},
+                     timeout=30)
+    r.raise_for_status()
+    count = r.headers.get('Content-Range', '*/0').rsplit('/', 1)[-1]
+    rows = r.json()
+    return f"{count}:{rows[0]['updated_at'] if rows else ''}"
+
+
+def fetch_rules(base_url, headers):
+    r = requests.get(f"{base_url}/rest/v1/product_weights",
+                     headers=headers, params={'select': '*', 'order': 'id'}, timeout=30)
+    r.raise_for_status()
+    return r.json()
+
+
+def current_version(base_url, headers):
+    """
+    Version of the rules a run would use: the remote one, or the cached one
+    if Supabase is unreachable (None if neither is known).
+    """
+    try:
+        return remote_version(base_url, headers)
+    except requests.RequestException as e:
+        cached = load_state(STATE_NAME)
+        if cached:
+            log.warning(f"product_weights probe failed, using cached rules {cached['version']}: {e}")
+            return cached['version']
+        return None  # e.g. updated_at not migrated yet: plain download
+
+
+def load_weight_index(base_url, headers, version=None):
+    """
+    Return the compiled rule index, downloading rules only if they changed.
+
+    `version` is a result of current_version() taken earlier in the run
+    (it is probed here otherwise).
+    """
+    cached = load_state(STATE_NAME)
+    if version is None:
+        version = current_version(base_url, headers)
+
+    if cached and version and cached['version'] == version:
+        log.info(f"⚖️  product_weights unchanged ({version}), using local cache")
+        return cached['index']
+
+    rules = fetch_rules(base_url, headers)
+    index = compile_rules(rules)
+    if version:
+        save_state(STATE_NAME, {'version': version, 'index': index})
+    log.info(f"⚖️  Downloaded {len(rules)} product_weights rules (version {version})")
+    return index